@@ -0,0 +1,199 @@
+# analytics.py
+"""Số liệu bán hàng tổng hợp sẵn (rollup) theo giờ và theo ngày cho từng nhà hàng và từng món.
+
+Mỗi đơn mới được cộng dồn vào các dòng rollup bởi việc nền RECORD_ORDER_TASK
+(xếp hàng trong giao dịch tạo đơn, worker chạy sau; chạy ngay khi JOBS_EAGER=1)
+bằng lệnh upsert (INSERT ... ON DUPLICATE KEY UPDATE trên MySQL, ON CONFLICT DO
+UPDATE trên SQLite/PostgreSQL), nên trang thống kê chỉ đọc một số dòng rollup cố
+định bất kể lịch sử đơn dài bao nhiêu. `flask analytics-backfill` tính lại từ dữ
+liệu cũ.
+Mốc giờ/ngày tính theo giờ địa phương (ANALYTICS_UTC_OFFSET_HOURS), còn
+Order.created_at lưu theo UTC.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from models import Job, MenuItem, MenuItemSales, Order, OrderItem, VenueSales
+
+GRANULARITIES = ('hour', 'day')
+# Việc nền cộng một đơn vào rollup (đăng ký trong orders.py)
+RECORD_ORDER_TASK = 'analytics.record_order'
+
+
+def utc_offset():
+    return timedelta(hours=current_app.config.get('ANALYTICS_UTC_OFFSET_HOURS', 0))
+
+
+def local_now():
+    return datetime.utcnow() + utc_offset()
+
+
+def bucket_start(local_time, granularity):
+    """Đầu giờ hoặc đầu ngày chứa `local_time`."""
+    bucket = local_time.replace(minute=0, second=0, microsecond=0)
+    return bucket.replace(hour=0) if granularity == 'day' else bucket
+
+
+class SalesRollup:
+    """Gom số liệu của nhiều đơn trong bộ nhớ rồi ghi bằng một lệnh upsert cho mỗi bảng."""
+
+    def __init__(self, offset=None):
+        self.offset = utc_offset() if offset is None else offset
+        # (venue_id, granularity, bucket) -> [doanh thu, số đơn, số món]
+        self.venues = defaultdict(lambda: [0.0, 0, 0])
+        # (menu_item_id, granularity, bucket) -> [venue_id, số lượng, doanh thu, số đơn]
+        self.items = defaultdict(lambda: [None, 0, 0.0, 0])
+
+    def add_order(self, venue_id, created_at, lines):
+        """Cộng một đơn; `lines` là các bộ (menu_item_id, đơn giá, số lượng)."""
+        lines = list(lines)
+        local_time = created_at + self.offset
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(local_time, granularity)
+            totals = self.venues[(venue_id, granularity, bucket)]
+            totals[0] += sum(price * quantity for _, price, quantity in lines)
+            totals[1] += 1
+            totals[2] += sum(quantity for _, _, quantity in lines)
+            for menu_item_id, price, quantity in lines:
+                totals = self.items[(menu_item_id, granularity, bucket)]
+                totals[0] = venue_id
+                totals[1] += quantity
+                totals[2] += price * quantity
+                totals[3] += 1
+
+    def flush(self, session):
+        """Cộng dồn số liệu đã gom vào các bảng rollup (chưa commit)."""
+        # Ghi theo thứ tự khóa để các giao dịch song song khóa dòng cùng một thứ tự, tránh deadlock
+        _upsert_add(session, VenueSales, [
+            {'venue_id': venue_id, 'granularity': granularity, 'bucket': bucket,
+             'revenue': revenue, 'order_count': orders, 'item_count': items}
+            for (venue_id, granularity, bucket), (revenue, orders, items) in sorted(self.venues.items())
+        ], ('revenue', 'order_count', 'item_count'))
+        _upsert_add(session, MenuItemSales, [
+            {'menu_item_id': menu_item_id, 'granularity': granularity, 'bucket': bucket, 'venue_id': venue_id,
+             'quantity': quantity, 'revenue': revenue, 'order_count': orders}
+            for (menu_item_id, granularity, bucket), (venue_id, quantity, revenue, orders)
+            in sorted(self.items.items())
+        ], ('quantity', 'revenue', 'order_count'))
+        self.venues.clear()
+        self.items.clear()
+
+
+def _upsert_add(session, model, rows, counters):
+    """INSERT các dòng rollup; dòng đã tồn tại thì cộng thêm vào các cột đếm."""
+    if not rows:
+        return
+    table = model.__table__
+    dialect = session.get_bind(mapper=model.__mapper__).dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in counters})
+    elif dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=[c.name for c in table.primary_key],
+                                          set_={c: table.c[c] + stmt.excluded[c] for c in counters})
+    else:
+        raise RuntimeError(f"Rollup chưa hỗ trợ CSDL {dialect!r}")
+    session.execute(stmt, rows)
+
+
+def record_order(session, venue_id, created_at, lines):
+    """Cộng một đơn mới vào rollup trong giao dịch hiện tại (người gọi commit)."""
+    rollup = SalesRollup()
+    rollup.add_order(venue_id, created_at, lines)
+    rollup.flush(session)
+
+
+def backfill(session, since=None, batch_size=1000):
+    """Tính lại rollup từ Order/OrderItem kể từ ngày `since` (None: toàn bộ) trong một giao dịch.
+
+    Các dòng rollup từ đầu ngày `since` trở đi bị xóa rồi dựng lại, nên chạy lại
+    nhiều lần vẫn cho cùng kết quả. Đơn được đọc theo lô `batch_size` dòng bằng
+    con trỏ phía server. Trả về số đơn đã xử lý.
+
+    Việc RECORD_ORDER_TASK chưa chạy xong của các đơn được dựng lại sẽ cộng trùng
+    các đơn đó, nên được đánh dấu xong trong cùng giao dịch (worker đang chạy dở
+    việc đó thấy việc đã bị đổi và bỏ kết quả, xem jobs.run_job).
+    """
+    offset = utc_offset()
+    settle_pending_orders(session, None if since is None else bucket_start(since, 'day') - offset)
+    orders = (select(Order.id, Order.venue_id, Order.created_at,
+                     OrderItem.menu_item_id, OrderItem.price, OrderItem.quantity)
+              .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+              .where(Order.created_at.is_not(None))
+              .order_by(Order.id))
+    if since is not None:
+        since = bucket_start(since, 'day')
+        orders = orders.where(Order.created_at >= since - offset)
+        for model in (VenueSales, MenuItemSales):
+            session.execute(delete(model).where(model.bucket >= since))
+    else:
+        for model in (VenueSales, MenuItemSales):
+            session.execute(delete(model))
+
+    rollup = SalesRollup(offset)
+    count = 0
+    try:
+        rows = session.execute(orders.execution_options(yield_per=batch_size))
+        for (_, venue_id, created_at), lines in groupby(rows, key=lambda r: (r.id, r.venue_id, r.created_at)):
+            rollup.add_order(venue_id, created_at, [(r.menu_item_id, r.price, r.quantity)
+                                                    for r in lines if r.menu_item_id is not None])
+            count += 1
+        # Ghi sau khi đọc xong: không chạy lệnh khác trên kết nối đang stream kết quả (MySQL).
+        # Bộ nhớ tỉ lệ với số mốc giờ x nhà hàng/món, không phải số đơn
+        rollup.flush(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return count
+
+
+def settle_pending_orders(session, since=None):
+    """Đánh dấu xong (chưa commit) các việc RECORD_ORDER_TASK đang chờ/chạy của đơn tạo từ
+    `since` (UTC; None: mọi đơn) trong hàng đợi của CSDL hiện tại; trả về số việc."""
+    pending = {job_id: json.loads(payload)['order_id'] for job_id, payload in session.execute(
+        select(Job.id, Job.payload).where(Job.name == RECORD_ORDER_TASK, Job.status.in_(('queued', 'running'))))}
+    if since is not None and pending:
+        in_range = set(session.scalars(select(Order.id).where(Order.id.in_(set(pending.values())),
+                                                              Order.created_at >= since)))
+        pending = {job_id: order_id for job_id, order_id in pending.items() if order_id in in_range}
+    if pending:
+        session.execute(update(Job).where(Job.id.in_(pending), Job.status.in_(('queued', 'running')))
+                        .values(status='done', locked_by=None, last_error=None, finished_at=datetime.utcnow()))
+    return len(pending)
+
+
+def venue_sales(session, venue_ids, granularity, start):
+    """Các dòng rollup của các nhà hàng từ mốc `start` (giờ địa phương), sắp theo thời gian."""
+    if not venue_ids:
+        return []
+    return session.execute(
+        select(VenueSales)
+        .where(VenueSales.venue_id.in_(venue_ids), VenueSales.granularity == granularity,
+               VenueSales.bucket >= start)
+        .order_by(VenueSales.bucket, VenueSales.venue_id)
+    ).scalars().all()
+
+
+def top_menu_items(session, venue_ids, start, limit=10):
+    """Các món bán chạy nhất từ mốc `start`, cộng trên rollup theo ngày."""
+    if not venue_ids:
+        return []
+    quantity = func.sum(MenuItemSales.quantity).label('quantity')
+    return session.execute(
+        select(MenuItem.id, MenuItem.name, MenuItemSales.venue_id, quantity,
+               func.sum(MenuItemSales.revenue).label('revenue'))
+        .join(MenuItem, MenuItem.id == MenuItemSales.menu_item_id)
+        .where(MenuItemSales.venue_id.in_(venue_ids), MenuItemSales.granularity == 'day',
+               MenuItemSales.bucket >= start)
+        .group_by(MenuItem.id, MenuItem.name, MenuItemSales.venue_id)
+        .order_by(quantity.desc())
+        .limit(limit)
+    ).all()
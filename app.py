@@ -1,12 +1,34 @@
-from flask import Flask, render_template, redirect, request, url_for, flash, session  # Import flash để sử dụng thông báo
+from flask import Flask, Response, stream_with_context, render_template, redirect, request, url_for, flash, session, jsonify, abort  # Import flash để sử dụng thông báo
 from config import Config
-from database import db
+from database import db, pool_status, read_only, replica_keys, shard_keys, init_replica_routing
 from models import Venue, Table, User, MenuItem, Order, OrderItem 
 from werkzeug.security import generate_password_hash
 from flask_login import login_user, LoginManager, login_required, current_user, logout_user
 from flask_bcrypt import Bcrypt
 from flask_migrate import Migrate
-from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from datetime import datetime, timedelta
+import hmac
+import time
+import uuid
+from pagination import encode_cursor, decode_cursor, keyset_page, first_page_per_group
+from reservations import BookingError, reserve_table, booked_table_ids
+from orders import (ORDER_STATUSES, OrderConflict, OrderError, place_order, order_cursor, feed_orders,
+                    change_statuses, order_changes, latest_order_event_id)
+from cart import CartFull, create_cart_store, cart_lines
+from cache import MenuCache, UserCache, TTLCache, user_stamp, conditional_response, fingerprint, render_fragment, templates_fingerprint
+from passwords import PasswordHasher, PasswordHasherBusy
+from commands import register_commands
+from analytics import local_now, bucket_start, venue_sales, top_menu_items
+from exports import EXPORT_FORMATS, EXPORT_KINDS, check_format, export_orders
+from search import KINDS as SEARCH_KINDS, SearchIndex
+from instrumentation import RequestMetrics, instrument
+from bulk_import import IMPORT_KINDS, BulkImportError, detect_format, import_rows, load_rows
+from events import create_event_bus, sse_event, sse_stream, table_channel, owner_orders_channel
+from payments import order_qr_payload, payload_digest, payment_reference, render_qr_svg
+from sharding import create_shard_schemas, init_sharding, owner_venue_ids, use_venue_shard
 
 # Khởi tạo Flask app và các công cụ
 app = Flask(__name__)
@@ -16,19 +38,99 @@ app.secret_key = 'your_secret_key'  # Cần thiết để sử dụng flash
 # Khởi tạo các đối tượng cần thiết
 db.init_app(app)
 bcrypt = Bcrypt(app)
+password_hasher = PasswordHasher.from_config(app.config)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
+# Số đơn hàng mỗi trang trên bảng đơn của chủ nhà hàng
+ORDERS_PER_PAGE = 20
+ORDERS_MAX_PER_PAGE = 100
+# Số đơn tối đa mỗi lần chuyển trạng thái hàng loạt
+ORDER_STATUS_MAX_BATCH = 500
+
+# Phân trang các danh sách nhà hàng; bàn/món hiển thị mỗi nhà hàng, phần còn lại tải thêm khi cuộn
+VENUES_PER_PAGE = 20
+ITEMS_PER_VENUE = 20
+
 # Khởi tạo Flask-Migrate
 migrate = Migrate(app, db)  
 
+# Kho giỏ hàng phía server (Redis khi có CART_REDIS_URL, không thì trong bộ nhớ); cookie chỉ giữ cart_id
+cart_store = create_cart_store(app.config)
+
+# Pub/sub đẩy thay đổi trạng thái bàn tới trình duyệt qua Server-Sent Events
+event_bus = create_event_bus(app.config)
+app.before_request(event_bus.start)  # Luồng nhận sự kiện của từng worker (sau khi gunicorn fork)
+
+# Cache danh sách nhà hàng và menu cho trang của khách (báo các worker khác qua event bus khi menu đổi)
+menu_cache = MenuCache(maxsize=app.config['MENU_CACHE_SIZE'], ttl=app.config['MENU_CACHE_TTL'], bus=event_bus)
+
+# Cache User cho user_loader, tránh một truy vấn CSDL ở mỗi request đã đăng nhập
+user_cache = UserCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'], bus=event_bus)
+
+# HTML đã render của các trang khách hàng, khóa theo ETag
+fragment_cache = TTLCache(maxsize=app.config['FRAGMENT_CACHE_SIZE'], ttl=app.config['MENU_CACHE_TTL'])
+TEMPLATES_VERSION = templates_fingerprint(app)
+
+# Ảnh SVG mã QR thanh toán, khóa theo băm của payload VietQR
+qr_cache = TTLCache(maxsize=app.config['QR_CACHE_SIZE'], ttl=app.config['QR_CACHE_TTL'])
+
+# Chỉ mục tìm kiếm nhà hàng và món ăn (mỗi worker một bản, dựng lười ở lần tìm đầu tiên)
+search_index = SearchIndex(ttl=app.config['SEARCH_INDEX_TTL'])
+
+# Thời gian xử lý và số câu SQL của từng request, gộp theo route (/metrics, /stats/routes)
+request_metrics = RequestMetrics(query_budget=app.config['SQL_QUERY_BUDGET'])
+instrument(app, request_metrics)
+
+# Route @read_only đọc từ replica (nếu có DATABASE_REPLICA_URLS), ghi luôn vào primary
+init_replica_routing(app)
+
+# Bàn, menu, đơn hàng... nằm trên shard của chủ nhà hàng (nếu có DATABASE_SHARD_URLS), chọn theo
+# venue_id trong URL hoặc theo chủ nhà hàng đang đăng nhập
+init_sharding(app)
+
+# Đăng ký các lệnh `flask ...`
+register_commands(app)
+
 # Khởi tạo cơ sở dữ liệu và bảng nếu chưa tồn tại
 with app.app_context():
     db.create_all()
+    create_shard_schemas()
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    user, stamp = user_cache.load(int(user_id), session.get('user_stamp'))
+    if user is None:
+        return None
+    if 'user_stamp' not in session:  # Session đăng nhập trước khi có dấu phiên bản
+        session['user_stamp'] = stamp
+    elif session['user_stamp'] != stamp:
+        # Mật khẩu hoặc quyền chủ nhà hàng đã đổi sau khi session này đăng nhập: đăng nhập lại
+        # (kể cả khi mật khẩu chỉ được băm lại với hệ số mới ở một lần đăng nhập khác)
+        session.pop('user_stamp')
+        return None
+    return user
+
+def current_cart_id(create=False):
+    """cart_id của khách lưu trong cookie session, tạo mới nếu cần."""
+    cart_id = session.get('cart_id')
+    if cart_id is None and create:
+        cart_id = session['cart_id'] = uuid.uuid4().hex
+    return cart_id
+
+
+def parse_slot_start(raw):
+    """Giờ bắt đầu khung đặt bàn từ chuỗi 'YYYY-MM-DDTHH:MM' (input datetime-local), sai định dạng thì None."""
+    try:
+        return datetime.strptime(raw or '', '%Y-%m-%dT%H:%M')
+    except ValueError:
+        return None
+
+
+def slot_window(start):
+    """Khung giờ [start, end) của một lượt đặt bàn."""
+    return start, start + timedelta(minutes=app.config['RESERVATION_SLOT_MINUTES'])
+
 
 @app.route('/')
 def home():
@@ -59,7 +161,14 @@ def register():
             flash("Tên đăng nhập đã tồn tại, vui lòng chọn tên khác.", 'error')
             return render_template('register.html')
         
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            hashed_password = password_hasher.hash(password)
+        except ValueError:
+            flash("Mật khẩu quá dài (tối đa 72 byte).", 'error')
+            return render_template('register.html')
+        except PasswordHasherBusy:
+            flash("Hệ thống đang bận, vui lòng thử lại sau giây lát.", 'error')
+            return render_template('register.html'), 503
         
         new_user = User(username=username, password=hashed_password, is_owner=is_owner)
         db.session.add(new_user)
@@ -79,8 +188,23 @@ def login():
         password = request.form['password']
         user = User.query.filter_by(username=username).first()
         
-        if user and bcrypt.check_password_hash(user.password, password):
+        try:
+            valid = user is not None and password_hasher.verify(user.password, password)
+        except PasswordHasherBusy:
+            flash("Hệ thống đang bận, vui lòng thử lại sau giây lát.", 'error')
+            return render_template('login.html'), 503
+
+        if valid:
+            # Băm lại khi hệ số chi phí bcrypt trong cấu hình đã thay đổi
+            if password_hasher.needs_rehash(user.password):
+                try:
+                    user.password = password_hasher.hash(password)
+                    db.session.commit()
+                    user_cache.invalidate(user.id)
+                except PasswordHasherBusy:
+                    pass  # Để lại cho lần đăng nhập sau
             login_user(user)
+            session['user_stamp'] = user_stamp(user)
             flash("Đăng nhập thành công!", 'success')
             return redirect(url_for('dashboard'))
         else:
@@ -94,10 +218,34 @@ def login():
 @login_required
 def logout():
     logout_user()
+    session.pop('user_stamp', None)
     flash("Bạn đã đăng xuất thành công.", 'success')
     return redirect(url_for('login'))
 
 
+def owner_venue_page():
+    """Một trang nhà hàng của chủ đang đăng nhập (keyset theo id, ?cursor=), lọc theo ?venue_id= nếu có."""
+    query = Venue.query.filter_by(user_id=current_user.id)
+    venue_id = request.args.get('venue_id', type=int)
+    if venue_id:
+        query = query.filter(Venue.id == venue_id)
+    cursor = decode_cursor(request.args.get('cursor'), (int,))
+    venues, next_cursor = keyset_page(query, (Venue.id,), cursor=cursor, limit=VENUES_PER_PAGE, descending=False)
+    return venues, encode_cursor(next_cursor)
+
+
+def first_items_per_venue(model, order_column, venues):
+    """{venue_id: (trang đầu bàn/món, con trỏ trang sau)} của các nhà hàng, trong một truy vấn."""
+    pages = first_page_per_group(db.session, model, model.venue_id, (order_column,),
+                                 [venue.id for venue in venues], ITEMS_PER_VENUE)
+    return {venue_id: (rows, encode_cursor(next_cursor)) for venue_id, (rows, next_cursor) in pages.items()}
+
+
+def render_page(template, fragment, **context):
+    """Trang đầy đủ, hoặc chỉ phần danh sách khi trình duyệt tải thêm lúc cuộn (?partial=1)."""
+    return render_template(fragment if request.args.get('partial') else template, **context)
+
+
 # Route quản lý danh sách bàn
 @app.route('/manage_tables')
 @login_required
@@ -105,8 +253,23 @@ def manage_tables():
     if not current_user.is_owner:
         return redirect(url_for('home'))
     
-    venues = Venue.query.filter_by(user_id=current_user.id).all()
-    return render_template('manage_table.html', venues=venues)
+    venues, next_cursor = owner_venue_page()
+    return render_page('manage_table.html', '_manage_tables_page.html', venues=venues, next_cursor=next_cursor,
+                       tables=first_items_per_venue(Table, Table.number, venues))
+
+
+# Các trang bàn tiếp theo của một nhà hàng
+@app.route('/manage_tables/<int:venue_id>/tables')
+@login_required
+def manage_venue_tables(venue_id):
+    venue = Venue.query.filter_by(id=venue_id, user_id=current_user.id).first_or_404()
+    cursor = decode_cursor(request.args.get('cursor'), (int,))
+    tables, next_cursor = keyset_page(Table.query.filter_by(venue_id=venue.id), (Table.number,), cursor=cursor,
+                                      limit=ITEMS_PER_VENUE, descending=False)
+    page = {venue.id: (tables, encode_cursor(next_cursor))}
+    if request.args.get('partial'):
+        return render_template('_table_rows.html', venue=venue, rows=tables, rows_cursor=page[venue.id][1])
+    return render_template('manage_table.html', venues=[venue], tables=page, next_cursor=None)
 
 
 # Cập nhật trạng thái bàn
@@ -119,6 +282,7 @@ def edit_table(table_id):
         status = request.form.get('status')
         table.is_available = status == 'available'
         db.session.commit()
+        event_bus.publish(table_channel(table.venue_id), {'table_id': table.id, 'is_available': table.is_available})
         flash("Cập nhật trạng thái bàn thành công.", 'success')
         return redirect(url_for('manage_tables'))
 
@@ -132,8 +296,8 @@ def manage_restaurants():
     if not current_user.is_owner:
         return redirect(url_for('home'))
     
-    venues = Venue.query.filter_by(user_id=current_user.id).all()
-    return render_template('manage_venue.Fhtml', venues=venues)
+    venues, next_cursor = owner_venue_page()
+    return render_page('manage_venue.html', '_manage_venue_rows.html', venues=venues, next_cursor=next_cursor)
 
 
 # Route thêm bàn (Table)
@@ -146,7 +310,12 @@ def add_table(venue_id):
         number = request.form['number']
         new_table = Table(number=number, venue_id=venue.id)
         db.session.add(new_table)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash(f"Bàn số {number} đã tồn tại trong nhà hàng này.", 'error')
+            return redirect(url_for('add_table', venue_id=venue.id))
         flash("Thêm bàn thành công.", 'success')
         return redirect(url_for('manage_tables'))
     
@@ -170,6 +339,9 @@ def add_menu_item(venue_id):
             new_menu_item = MenuItem(name=name, price=float(price), venue_id=venue.id)
             db.session.add(new_menu_item)
             db.session.commit()
+            menu_cache.bump(venue.id)
+            search_index.upsert_menu_item(new_menu_item.id, new_menu_item.name, new_menu_item.price,
+                                          venue.id, venue.name)
             flash("Thêm món ăn thành công.", 'success')
             return redirect(url_for('manage_menu', venue_id=venue.id))
         
@@ -191,12 +363,68 @@ def edit_menu_item(item_id):
         item.name = request.form['name']
         item.price = request.form['price']
         db.session.commit()
+        menu_cache.bump(item.venue_id)
+        search_index.upsert_menu_item(item.id, item.name, item.price, item.venue_id, item.venue.name)
         flash("Cập nhật món ăn thành công.", "success")
         return redirect(url_for('manage_menu', venue_id=item.venue_id))
 
     return render_template('edit_menu_item.html', item=item)
 
 
+# Nhập hàng loạt bàn hoặc món ăn từ file CSV/JSON (form upload, hoặc POST JSON với ?kind=)
+@app.route('/venues/<int:venue_id>/import', methods=['GET', 'POST'])
+@login_required
+def bulk_import(venue_id):
+    venue = Venue.query.filter_by(id=venue_id, user_id=current_user.id).first_or_404()
+    kind = request.form.get('kind') or request.args.get('kind')
+    if request.method == 'GET':
+        return render_template('bulk_import.html', venue=venue, kinds=IMPORT_KINDS, kind=kind, errors=None)
+
+    max_bytes = app.config['BULK_IMPORT_MAX_BYTES']
+    try:
+        if request.content_length and request.content_length > max_bytes:
+            raise BulkImportError([(None, f"File lớn hơn giới hạn {max_bytes // 1024} KB.")])
+        if request.is_json:
+            rows = load_rows(request.get_data(), 'json', app.config['BULK_IMPORT_MAX_ROWS'])
+        else:
+            upload = request.files.get('file')
+            if upload is None or not upload.filename:
+                raise BulkImportError([(None, "Vui lòng chọn file CSV hoặc JSON.")])
+            rows = load_rows(upload.read(), detect_format(upload.filename), app.config['BULK_IMPORT_MAX_ROWS'])
+        result = import_rows(db.session, venue.id, kind, rows)
+    except BulkImportError as e:
+        if request.is_json:
+            return jsonify(errors=[{'row': row, 'error': message} for row, message in e.errors]), 400
+        flash("File nhập có lỗi, chưa có dòng nào được lưu.", 'error')
+        return render_template('bulk_import.html', venue=venue, kinds=IMPORT_KINDS, kind=kind,
+                               errors=e.errors), 400
+    except IntegrityError:
+        # Một request khác vừa thêm cùng số bàn
+        if request.is_json:
+            return jsonify(errors=[{'row': None, 'error': "Dữ liệu vừa thay đổi, vui lòng thử lại."}]), 409
+        flash("Dữ liệu vừa thay đổi, vui lòng thử lại.", 'error')
+        return redirect(url_for('bulk_import', venue_id=venue.id, kind=kind))
+
+    after_bulk_import(venue, kind, result)
+    if request.is_json:
+        return jsonify(inserted=result['inserted'], updated=len(result['updated']))
+    flash(f"Đã thêm {result['inserted']} và cập nhật {len(result['updated'])} dòng.", 'success')
+    return redirect(url_for('manage_tables' if kind == 'tables' else 'manage_menu', venue_id=venue.id))
+
+
+def after_bulk_import(venue, kind, result):
+    """Cập nhật cache, chỉ mục tìm kiếm và trạng thái bàn trực tiếp sau khi nhập hàng loạt."""
+    if kind == 'menu_items':
+        menu_cache.bump(venue.id)
+        rows = db.session.execute(
+            select(MenuItem.id, MenuItem.name, MenuItem.price).where(MenuItem.venue_id == venue.id))
+        for item_id, name, price in rows:
+            search_index.upsert_menu_item(item_id, name, price, venue.id, venue.name)
+    else:
+        for row in result['updated']:
+            event_bus.publish(table_channel(venue.id), {'table_id': row['id'], 'is_available': row['is_available']})
+
+
 # Route quản lý món ăn
 @app.route('/manage_menu')
 @login_required
@@ -204,8 +432,23 @@ def manage_menu():
     if not current_user.is_owner:
         return redirect(url_for('home'))
     
-    venues = Venue.query.filter_by(user_id=current_user.id).all()
-    return render_template('manage_menu.html', venues=venues)
+    venues, next_cursor = owner_venue_page()
+    return render_page('manage_menu.html', '_manage_menu_page.html', venues=venues, next_cursor=next_cursor,
+                       menu_items=first_items_per_venue(MenuItem, MenuItem.id, venues))
+
+
+# Các trang món tiếp theo của một nhà hàng
+@app.route('/manage_menu/<int:venue_id>/items')
+@login_required
+def manage_venue_menu(venue_id):
+    venue = Venue.query.filter_by(id=venue_id, user_id=current_user.id).first_or_404()
+    cursor = decode_cursor(request.args.get('cursor'), (int,))
+    items, next_cursor = keyset_page(MenuItem.query.filter_by(venue_id=venue.id), (MenuItem.id,), cursor=cursor,
+                                     limit=ITEMS_PER_VENUE, descending=False)
+    page = {venue.id: (items, encode_cursor(next_cursor))}
+    if request.args.get('partial'):
+        return render_template('_menu_item_rows.html', venue=venue, rows=items, rows_cursor=page[venue.id][1])
+    return render_template('manage_menu.html', venues=[venue], menu_items=page, next_cursor=None)
 
 
 # Route xem đơn hàng
@@ -215,12 +458,279 @@ def view_orders():
     if not current_user.is_owner:
         flash("Bạn không có quyền truy cập trang này.", "error")
         return redirect(url_for('home'))
-    
-    venues = Venue.query.filter_by(user_id=current_user.id).all()
+
+    status = request.args.get('status', '').strip()
+    date_from = request.args.get('date_from', '').strip()
+    date_to = request.args.get('date_to', '').strip()
+    limit = min(max(request.args.get('limit', ORDERS_PER_PAGE, type=int), 1), ORDERS_MAX_PER_PAGE)
+    cursor = decode_cursor(request.args.get('cursor'), (datetime, int))
+
+    # Lọc theo các nhà hàng của chủ (bảng venue ở primary, đơn hàng có thể ở shard khác)
+    query = Order.query.filter(Order.venue_id.in_(owner_venue_ids(db.session, current_user.id)))
+    if status:
+        query = query.filter(Order.status == status)
+    try:
+        if date_from:
+            query = query.filter(Order.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
+        if date_to:
+            query = query.filter(Order.created_at < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        flash("Ngày không hợp lệ, định dạng đúng là YYYY-MM-DD.", 'error')
+        return redirect(url_for('view_orders'))
+
+    # Tải trước các món và tên món trong một truy vấn cố định, tránh N+1 trong template
+    query = query.options(selectinload(Order.order_items).joinedload(OrderItem.menu_item))
+    orders, next_cursor = keyset_page(query, (Order.created_at, Order.id), cursor=cursor, limit=limit)
+
+    filters = {key: value for key, value in
+               (('status', status), ('date_from', date_from), ('date_to', date_to)) if value}
+    # Trang đầu không lọc nhận đơn mới qua luồng SSE, bắt đầu sau đơn mới nhất đang hiển thị
+    # cùng mốc sự kiện chuyển trạng thái mới nhất, để bù các thay đổi bị lỡ khi mất kết nối
+    feed_cursor = last_event_id = None
+    if cursor is None and not filters:
+        feed_cursor = order_cursor(orders[0]) if orders else encode_cursor((datetime.min, 0))
+        last_event_id = latest_order_event_id(current_user.id)
+    return render_template('view_orders.html', orders=orders, filters=filters, statuses=ORDER_STATUSES,
+                           export_formats=EXPORT_FORMATS,
+                           next_cursor=encode_cursor(next_cursor), is_first_page=cursor is None,
+                           feed_cursor=feed_cursor, last_event_id=last_event_id, **live_updates())
+
+
+# Xuất lịch sử đơn hàng (CSV/Parquet) theo luồng cho kế toán
+@app.route('/owner/orders/export')
+@login_required
+def export_order_history():
+    if not current_user.is_owner:
+        flash("Bạn không có quyền truy cập trang này.", "error")
+        return redirect(url_for('home'))
+
+    fmt = request.args.get('format', 'csv')
+    kind = request.args.get('kind', 'items')
+    try:
+        if kind not in EXPORT_KINDS:
+            raise ValueError("Loại báo cáo không hợp lệ.")
+        check_format(fmt)
+        date_from = request.args.get('date_from', '').strip()
+        date_to = request.args.get('date_to', '').strip()
+        start = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+        end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1) if date_to else None
+    except (ValueError, RuntimeError) as e:
+        flash(f"Không thể xuất báo cáo: {e}", 'error')
+        return redirect(url_for('view_orders'))
+
+    # stream_with_context giữ phiên CSDL của request trong lúc gửi từng lô
+    chunks = export_orders(db.session, current_user.id, fmt, kind, start, end)
+    filename = f"orders-{kind}-{datetime.now():%Y%m%d}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/vnd.apache.parquet'
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+def streams_exhausted():
+    """Worker đã giữ đủ EVENT_STREAMS_PER_WORKER kết nối SSE: 204 khiến EventSource dừng
+    kết nối lại, trang chuyển sang hỏi định kỳ thay vì chiếm thêm một luồng của worker."""
+    return Response(status=204)
+
+
+def live_updates():
+    """Tham số template cho cập nhật trực tiếp: dùng SSE hay chỉ polling, và chu kỳ polling."""
+    return {'live_updates': event_bus.max_streams != 0, 'poll_interval': app.config['EVENT_POLL_INTERVAL']}
+
+
+# Luồng SSE đơn hàng của chủ nhà hàng: đơn mới và thay đổi trạng thái
+@app.route('/owner/orders/events')
+@login_required
+def order_events():
+    if not current_user.is_owner:
+        abort(403)
+    # Khi kết nối lại, trình duyệt gửi id sự kiện cuối cùng (con trỏ created_at,id) qua Last-Event-ID
+    cursor = decode_cursor(request.headers.get('Last-Event-ID') or request.args.get('after'), (datetime, int))
+
+    # Đăng ký trước rồi mới đọc phần chênh lệch, để đơn tạo xen giữa không bị lỡ (trùng thì bỏ qua)
+    subscription = event_bus.try_subscribe(owner_orders_channel(current_user.id))
+    if subscription is None:
+        return streams_exhausted()
+    sent = set()
+    backlog = []
+    if cursor is not None:
+        try:
+            orders, more = feed_orders(current_user.id, after=cursor, limit=ORDERS_MAX_PER_PAGE)
+        except Exception:
+            subscription.close()
+            raise
+        if more:
+            # Mất kết nối quá lâu: để trình duyệt tải lại trang thay vì đẩy cả lịch sử
+            subscription.close()
+            return Response(sse_event('reset', {}), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache'})
+        for order in orders:
+            sent.add(order['id'])
+            backlog.append(sse_event('order', order, event_id=order['cursor']))
+
+    def frame(message):
+        if message['event'] == 'status':
+            return sse_event('status', {'id': message['id'], 'status': message['status'],
+                                        'version': message['version']})
+        order = message['order']
+        if order['id'] in sent:
+            return None
+        sent.add(order['id'])
+        return sse_event('order', order, event_id=order['cursor'])
+
+    stream = sse_stream(subscription, frame, backlog=backlog, heartbeat=app.config['EVENT_STREAM_HEARTBEAT'],
+                        max_duration=app.config['EVENT_STREAM_MAX_SECONDS'])
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def parse_status_changes():
+    """Các bộ (order_id, version, trạng thái mới) từ JSON {"changes": [{"id", "version", "status"}]}
+    hoặc từ form của trang đơn hàng (các ô order_id đã chọn, version-<id>, một trạng thái chung)."""
+    try:
+        if request.is_json:
+            data = request.get_json(silent=True)
+            changes = [(int(change['id']), int(change['version']), change['status'])
+                       for change in data['changes']]
+        else:
+            status = request.form.get('status')
+            changes = [(int(order_id), int(request.form.get(f'version-{order_id}', '')), status)
+                       for order_id in request.form.getlist('order_id')]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Dữ liệu chuyển trạng thái không hợp lệ.")
+    if not changes:
+        raise ValueError("Chưa chọn đơn hàng nào.")
+    if len(changes) > ORDER_STATUS_MAX_BATCH:
+        raise ValueError(f"Tối đa {ORDER_STATUS_MAX_BATCH} đơn mỗi lần.")
+    if any(status not in ORDER_STATUSES for _, _, status in changes):
+        raise ValueError("Trạng thái đơn hàng không hợp lệ.")
+    return changes
+
+
+# Chuyển trạng thái nhiều đơn cùng lúc (một câu UPDATE kèm version đã đọc của từng đơn)
+@app.route('/owner/orders/status', methods=['POST'])
+@login_required
+def update_order_statuses():
+    if not current_user.is_owner:
+        abort(403)
+    owner_id = current_user.id  # Đọc trước khi commit (commit làm hết hạn thuộc tính của current_user)
+    try:
+        events, rejected = change_statuses(owner_id, parse_status_changes(), actor_id=owner_id)
+    except ValueError as e:
+        if request.is_json:
+            return jsonify(error=str(e)), 400
+        flash(str(e), 'error')
+        return redirect(url_for('view_orders'))
+    except OrderConflict as e:
+        if request.is_json:
+            return jsonify(error=str(e)), 409
+        flash(str(e), 'error')
+        return redirect(url_for('view_orders'))
+
+    for event in events:
+        event_bus.publish(owner_orders_channel(owner_id), {
+            'event': 'status', 'id': event['order_id'], 'status': event['to_status'], 'version': event['version']})
+    if request.is_json:
+        return jsonify(updated=[{'id': event['order_id'], 'status': event['to_status'], 'version': event['version']}
+                                for event in events],
+                       rejected=[{'id': order_id, 'error': reason} for order_id, reason in rejected])
+    if events:
+        flash(f"Đã chuyển {len(events)} đơn sang trạng thái mới.", 'success')
+    for order_id, reason in rejected:
+        flash(f"Đơn #{order_id}: {reason}.", 'error')
+    return redirect(url_for('view_orders'))
+
+
+# Các lần chuyển trạng thái đơn sau một mốc, cho màn hình bếp đọc tiếp khi kết nối lại
+@app.route('/owner/orders/changes')
+@login_required
+def order_status_changes():
+    if not current_user.is_owner:
+        abort(403)
+    events, more = order_changes(current_user.id, after=request.args.get('after', 0, type=int),
+                                 limit=ORDERS_MAX_PER_PAGE)
+    return jsonify(events=events, more=more)
+
+
+def publish_new_order(order):
+    """Đẩy payload đơn vừa tạo (từ place_order) lên luồng đơn hàng của chủ nhà hàng, không truy vấn thêm:
+    chủ nhà hàng lấy từ menu_cache (đã tải khi khách xem menu)."""
+    menu = menu_cache.menu(order['venue_id'])
+    if menu is not None:
+        event_bus.publish(owner_orders_channel(menu['venue']['owner_id']), {'event': 'order', 'order': order})
+
+
+# Thống kê bán hàng của chủ nhà hàng, đọc từ bảng tổng hợp sẵn
+@app.route('/owner/analytics')
+@login_required
+def owner_analytics():
+    if not current_user.is_owner:
+        flash("Bạn không có quyền truy cập trang này.", "error")
+        return redirect(url_for('home'))
+
+    days = min(max(request.args.get('days', 14, type=int), 1), 90)
+    venues = db.session.execute(
+        select(Venue.id, Venue.name).where(Venue.user_id == current_user.id).order_by(Venue.id)
+    ).all()
     venue_ids = [venue.id for venue in venues]
-    orders = Order.query.filter(Order.venue_id.in_(venue_ids)).all()
-    
-    return render_template('view_orders.html', orders=orders)
+    today = bucket_start(local_now(), 'day')
+    since = today - timedelta(days=days - 1)
+    return render_template(
+        'analytics.html', venues=venues, days=days,
+        daily=venue_sales(db.session, venue_ids, 'day', since),
+        hourly=venue_sales(db.session, venue_ids, 'hour', today),
+        top_items=top_menu_items(db.session, venue_ids, since))
+
+
+# Số liệu cache của worker hiện tại
+@app.route('/stats/cache')
+@login_required
+def cache_stats():
+    if not current_user.is_owner:
+        return redirect(url_for('home'))
+    return jsonify(menu=menu_cache.stats(), fragments=fragment_cache.stats(), users=user_cache.stats(),
+                   search=search_index.stats(), qr=qr_cache.stats(),
+                   shards=app.extensions['shard_directory'].stats())
+
+
+# Tình trạng pool kết nối CSDL của worker hiện tại
+@app.route('/stats/pool')
+@login_required
+def pool_stats():
+    if not current_user.is_owner:
+        return redirect(url_for('home'))
+    return jsonify({**pool_status(db.engine),
+                    'replicas': {key: pool_status(db.engines[key]) for key in replica_keys(db.engines)},
+                    'shards': {key: pool_status(db.engines[key]) for key in shard_keys(db.engines)}})
+
+
+# Số kết nối SSE đang mở trên worker hiện tại
+@app.route('/stats/events')
+@login_required
+def event_stats():
+    if not current_user.is_owner:
+        return redirect(url_for('home'))
+    return jsonify(subscribers=event_bus.subscriber_count())
+
+
+# p50/p95/p99 thời gian xử lý và số câu SQL theo route trên worker hiện tại
+@app.route('/stats/routes')
+@login_required
+def route_stats():
+    if not current_user.is_owner:
+        return redirect(url_for('home'))
+    return jsonify(query_budget=request_metrics.query_budget, routes=request_metrics.snapshot())
+
+
+# Số liệu request dạng Prometheus cho hệ thống giám sát
+@app.route('/metrics')
+def metrics():
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        abort(404)  # Chưa cấu hình token: không công khai số liệu route của hệ thống
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return Response(request_metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
 
 
 
@@ -233,107 +743,169 @@ def view_orders():
                                                       #ROUTE FOR CUSTOMER
 # Trang chủ khách hàng
 @app.route('/customer_home')
+@read_only
 def customer_home():
     return render_template('customer_home.html')
 
 
 # Xem danh sách nhà hàng
 @app.route('/venues', methods=['GET'])
+@read_only
 def view_venues():
-    venues = Venue.query.all()
-    return render_template('view_venues.html', venues=venues)
+    cursor = decode_cursor(request.args.get('cursor'), (int,))
+    venues = menu_cache.venues(after=cursor[0] if cursor else None, limit=VENUES_PER_PAGE)
+    etag = fingerprint(TEMPLATES_VERSION, venues['etag'])
+    venue_list = lambda: render_fragment(fragment_cache, '_venue_list.html', etag, venues=venues['venues'],
+                                         next_cursor=venues['next_cursor'], is_first_page=cursor is None)
+    if request.args.get('partial'):  # Trang kế tiếp, tải khi cuộn
+        return conditional_response(etag, venues['last_modified'], venue_list)
+    return conditional_response(etag, venues['last_modified'], lambda: render_template(
+        'view_venues.html', venue_list=venue_list()))
+
+
+# Tìm nhà hàng (tên, địa chỉ) và món ăn, không phân biệt dấu tiếng Việt
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    query = request.args.get('q', '').strip()[:100]
+    kind = request.args.get('type')
+    if kind not in SEARCH_KINDS:
+        kind = None
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('limit', 20, type=int), 1), 50)
+
+    search_index.ensure_fresh()
+    started = time.perf_counter()
+    total, results = search_index.search(query, kind=kind, page=page, per_page=per_page)
+    return jsonify(query=query, type=kind or 'all', page=page, per_page=per_page, total=total,
+                   has_more=page * per_page < total, results=results,
+                   took_ms=round((time.perf_counter() - started) * 1000, 2))
 
 
 # Xem danh sách bàn của nhà hàng
 @app.route('/tables/<int:venue_id>', methods=['GET'])
+@read_only
 def view_tables(venue_id):
-    venue = Venue.query.get_or_404(venue_id)
-    return render_template('view_tables.html', venue=venue)
-
-
-# Đặt bàn
-@app.route('/book_table/<int:table_id>', methods=['GET', 'POST'])
+    menu = menu_cache.menu(venue_id)
+    if menu is None:
+        abort(404)
+    venue = menu['venue']
+    start = parse_slot_start(request.args.get('start'))
+    if start is None:
+        start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    start, end = slot_window(start)
+
+    # Trạng thái bàn luôn đọc từ CSDL (thay đổi theo từng lượt đặt), chỉ phần render được cache
+    tables = [table._asdict() for table in db.session.execute(
+        select(Table.id, Table.number, Table.is_available).where(Table.venue_id == venue_id).order_by(Table.number)
+    )]
+    booked_ids = sorted(booked_table_ids(db.session, venue_id, start, end))
+    etag = fingerprint(TEMPLATES_VERSION, venue, tables, booked_ids, start)
+    return conditional_response(etag, None, lambda: render_template(
+        'view_tables.html', venue=venue, start=start, end=end, **live_updates(),
+        table_list=render_fragment(fragment_cache, '_table_list.html', etag, venue=venue,
+                                   tables=tables, booked_ids=booked_ids, start=start)))
+
+
+# Luồng SSE: đẩy thay đổi trạng thái bàn của nhà hàng thay cho việc tải lại trang
+@app.route('/tables/<int:venue_id>/events', methods=['GET'])
+def table_events(venue_id):
+    if menu_cache.menu(venue_id) is None:
+        abort(404)
+    # Đăng ký trước khi trả response để không lỡ sự kiện; stream không giữ kết nối CSDL
+    subscription = event_bus.try_subscribe(table_channel(venue_id))
+    if subscription is None:
+        return streams_exhausted()
+    stream = sse_stream(subscription, lambda message: sse_event('table', message),
+                        heartbeat=app.config['EVENT_STREAM_HEARTBEAT'],
+                        max_duration=app.config['EVENT_STREAM_MAX_SECONDS'])
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Đặt bàn theo khung giờ
+@app.route('/book_table/<int:venue_id>/<int:table_id>', methods=['POST'])
 @login_required
-def book_table(table_id):
-    table = Table.query.get_or_404(table_id)
-    if table.is_available:
-        table.is_available = False
-        db.session.commit()
-        flash(f"Đặt bàn số {table.number} tại {table.venue.name} thành công!", 'success')
+def book_table(venue_id, table_id):
+    table = Table.query.filter_by(id=table_id, venue_id=venue_id).first_or_404()
+    start = parse_slot_start(request.form.get('start'))
+    if start is None or start < datetime.now():
+        flash("Khung giờ đặt bàn không hợp lệ.", 'error')
+        return redirect(url_for('view_tables', venue_id=venue_id))
+
+    start, end = slot_window(start)
+    try:
+        reserve_table(db.session, table.id, current_user.id, start, end)
+    except BookingError as e:
+        flash(str(e), 'error')
     else:
-        flash("Bàn đã được đặt.", "error")
-    return redirect(url_for('view_tables', venue_id=table.venue.id))
+        event_bus.publish(table_channel(venue_id), {
+            'table_id': table.id, 'start': start.isoformat(), 'end': end.isoformat()})
+        flash(f"Đặt bàn số {table.number} lúc {start:%H:%M %d/%m/%Y} thành công!", 'success')
+    return redirect(url_for('view_tables', venue_id=venue_id, start=f"{start:%Y-%m-%dT%H:%M}"))
 
 
 # Xem menu của nhà hàng
 @app.route('/view_menu/<int:venue_id>', methods=['GET'])
+@read_only
 def view_menu(venue_id):
-    venue = db.session.get(Venue, venue_id)
-    if venue:
-        menu_items = MenuItem.query.filter_by(venue_id=venue_id).all()
+    menu = menu_cache.menu(venue_id)
+    if menu:
         session['venue_id'] = venue_id
-        return render_template('view_menu.html', venue=venue, menu_items=menu_items)
+        etag = fingerprint(TEMPLATES_VERSION, menu['etag'])
+        return conditional_response(etag, menu['last_modified'], lambda: render_template(
+            'view_menu.html', venue=menu['venue'],
+            menu_list=render_fragment(fragment_cache, '_menu_list.html', etag, venue=menu['venue'],
+                                      menu_items=menu['menu_items'])))
     else:
         flash("Không tìm thấy nhà hàng.", 'error')
         return redirect(url_for('view_venues'))
 
 
 # Thêm món vào giỏ hàng
-@app.route('/order_item/<int:item_id>', methods=['POST'])
+@app.route('/order_item/<int:venue_id>/<int:item_id>', methods=['POST'])
 @login_required
-def order_item(item_id):
+def order_item(venue_id, item_id):
     """Thêm món vào giỏ hàng."""
-    item = MenuItem.query.get_or_404(item_id)
-
-    # Kiểm tra nếu venue_id có trong session chưa
-    venue_id = session.get('venue_id')
-    if not venue_id:
-        flash("Không tìm thấy nhà hàng.", 'error')
-        return redirect(url_for('view_venues'))
-
-    # Lấy danh sách các món đã đặt trong session
-    ordered_items = session.get('ordered_items', [])
-    ordered_items.append({'id': item.id, 'name': item.name, 'price': item.price})
-    session['ordered_items'] = ordered_items  # Lưu lại vào session
-
-    flash(f"Bạn đã thêm {item.name} vào giỏ hàng.", 'success')
+    item = MenuItem.query.filter_by(id=item_id, venue_id=venue_id).first_or_404()
+
+    # Giỏ hàng chỉ chứa món của một nhà hàng; chọn món ở nhà hàng khác thì bắt đầu giỏ mới
+    cart_id = current_cart_id(create=True)
+    cart = cart_store.get(cart_id)
+    if cart and cart.venue_id != item.venue_id:
+        cart_store.clear(cart_id)
+        flash("Giỏ hàng cũ ở nhà hàng khác đã được làm mới.", 'warning')
+    try:
+        cart_store.add_item(cart_id, item.venue_id, item.id, item.price)
+    except CartFull as e:
+        flash(str(e), 'error')
+    else:
+        flash(f"Bạn đã thêm {item.name} vào giỏ hàng.", 'success')
     return redirect(url_for('view_menu', venue_id=venue_id))  # Điều hướng về menu để tiếp tục chọn món
 
 # Xác nhận đơn hàng
 @app.route('/confirm_order', methods=['POST', 'GET'])
 @login_required
 def confirm_order():
-    ordered_items = session.get('ordered_items', [])
-    if not ordered_items:
+    cart_id = current_cart_id()
+    cart = cart_store.get(cart_id)
+    if not cart:
         flash("Giỏ hàng của bạn trống.", "warning")
         return redirect(url_for('view_menu', venue_id=session.get('venue_id')))
-    
-    # Tính tổng tiền của đơn hàng
-    total_price = sum(item['price'] for item in ordered_items)
-
-    # Xử lý đơn hàng: lưu vào cơ sở dữ liệu hoặc các hành động cần thiết khác
-    # Ví dụ, tạo một đơn hàng mới với giá trị tổng tiền và trạng thái mặc định là 'pending':
-    order = Order(
-        customer_id=current_user.id, 
-        venue_id=session.get('venue_id'), 
-        total_price=total_price,  # Gán tổng tiền
-        status='pending',  # Gán trạng thái mặc định
-        created_at=datetime.utcnow()  # Nếu mô hình yêu cầu giá trị thời gian
-    )
-    db.session.add(order)
-    db.session.commit()
-
-    # Thêm các mục từ giỏ hàng vào đơn hàng
-    for item in ordered_items:
-        order_item = OrderItem(order_id=order.id, menu_item_id=item['id'], price=item['price'])
-        db.session.add(order_item)
-    
+
+    # Giá được lấy lại từ CSDL khi tạo đơn
+    use_venue_shard(cart.venue_id)
+    try:
+        order = place_order(current_user.id, cart.venue_id, cart.items)
+    except OrderError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('view_cart'))
+    publish_new_order(order)
+
     # Xóa giỏ hàng sau khi xác nhận
-    session.pop('ordered_items', None)
-    db.session.commit()
+    cart_store.clear(cart_id)
 
     flash("Đơn hàng của bạn đã được xác nhận!", 'success')
-    return redirect(url_for('view_venues'))  # Điều hướng người dùng về trang danh sách nhà hàng hoặc nơi khác
+    return redirect(url_for('order_payment', venue_id=order['venue_id'], order_id=order['id']))  # Trang quét mã QR thanh toán của đơn
 
 
 
@@ -341,24 +913,22 @@ def confirm_order():
 @app.route('/view_cart', methods=['GET'])
 @login_required
 def view_cart():
-    ordered_items = session.get('ordered_items', [])
-    if not ordered_items:
+    cart = cart_store.get(current_cart_id())
+    if not cart:
         flash("Giỏ hàng của bạn trống.", "warning")
         return redirect(url_for('view_menu', venue_id=session.get('venue_id')))
     
-    total_price = sum(item['price'] for item in ordered_items)
-    return render_template('view_cart.html', ordered_items=ordered_items, total_price=total_price)
+    use_venue_shard(cart.venue_id)
+    return render_template('view_cart.html', ordered_items=cart_lines(cart), total_price=cart.total)
 
 
 # Xóa món khỏi giỏ hàng
 @app.route('/remove_from_cart/<int:item_id>', methods=['POST'])
 @login_required
 def remove_from_cart(item_id):
-    ordered_items = session.get('ordered_items', [])
-    
-    # Xóa món có id là item_id khỏi giỏ hàng
-    ordered_items = [item for item in ordered_items if item['id'] != item_id]
-    session['ordered_items'] = ordered_items  # Cập nhật lại giỏ hàng trong session
+    cart_id = current_cart_id()
+    if cart_id:
+        cart_store.remove_item(cart_id, item_id)
 
     flash("Món đã được xóa khỏi giỏ hàng.", 'success')
     return redirect(url_for('view_cart'))
@@ -368,17 +938,58 @@ def remove_from_cart(item_id):
 @app.route('/checkout', methods=['GET'])
 @login_required
 def checkout():
-    ordered_items = session.get('ordered_items', [])
-    if not ordered_items:
+    cart = cart_store.get(current_cart_id())
+    if not cart:
         flash("Giỏ hàng của bạn trống.", "warning")
         return redirect(url_for('view_menu', venue_id=session.get('venue_id')))
-    
-    total_price = sum(item['price'] for item in ordered_items)
 
-    # Đường dẫn đến hình ảnh mã QR (Techcombank trong ví dụ của bạn)
-    qr_code_url = "/static/techcom.png"
+    # Xem lại giỏ rồi xác nhận; mã QR có số tiền và mã đơn chỉ tạo được sau khi đơn được lưu
+    use_venue_shard(cart.venue_id)
+    return render_template('confirm_order.html', ordered_items=cart_lines(cart), total_price=cart.total)
+
 
-    return render_template('qr_payment.html', ordered_items=ordered_items, total_price=total_price, qr_code_url=qr_code_url)
+def customer_order(venue_id, order_id):
+    """Đơn của khách đang đăng nhập tại nhà hàng, hoặc 404 (venue_id trong URL chọn shard chứa đơn)."""
+    return Order.query.filter_by(id=order_id, venue_id=venue_id, customer_id=current_user.id).first_or_404()
+
+
+# Trang thanh toán của một đơn: mã QR VietQR có sẵn số tiền và nội dung chuyển khoản
+@app.route('/venues/<int:venue_id>/orders/<int:order_id>/payment', methods=['GET'])
+@login_required
+def order_payment(venue_id, order_id):
+    order = customer_order(venue_id, order_id)
+    digest = payload_digest(order_qr_payload(order, app.config))
+    ordered_items = [{'name': item.menu_item.name, 'price': item.price, 'quantity': item.quantity}
+                     for item in OrderItem.query.filter_by(order_id=order.id)
+                     .options(selectinload(OrderItem.menu_item)).order_by(OrderItem.id)]
+    return render_template('qr_payment.html', order=order, ordered_items=ordered_items,
+                           total_price=order.total_price,
+                           reference=payment_reference(order.id, app.config['PAYMENT_REFERENCE_PREFIX'],
+                                                       order.venue_id),
+                           # Tham số v đổi khi payload đổi, nên trình duyệt cache ảnh được lâu
+                           qr_code_url=url_for('order_qr', venue_id=order.venue_id, order_id=order.id,
+                                               v=digest[:16]))
+
+
+# Ảnh SVG mã QR của đơn; render một lần cho mỗi payload rồi lấy từ qr_cache
+@app.route('/venues/<int:venue_id>/orders/<int:order_id>/qr.svg', methods=['GET'])
+@login_required
+def order_qr(venue_id, order_id):
+    payload = order_qr_payload(customer_order(venue_id, order_id), app.config)
+    digest = payload_digest(payload)
+    if request.if_none_match.contains(digest):
+        response = Response(status=304)
+    else:
+        try:
+            svg = qr_cache.get_or_load(digest, lambda: render_qr_svg(payload))
+        except RuntimeError:
+            app.logger.exception("Không tạo được mã QR thanh toán")
+            abort(503)
+        response = Response(svg, mimetype='image/svg+xml')
+    response.set_etag(digest)
+    response.cache_control.private = True
+    response.cache_control.max_age = app.config['QR_CACHE_TTL']
+    return response
 
 
 if __name__ == '__main__':
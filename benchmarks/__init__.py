@@ -0,0 +1 @@
+"""Công cụ đo hiệu năng Table Hub (chạy bằng `python -m benchmarks.<tên>`)."""
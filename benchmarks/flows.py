@@ -0,0 +1,301 @@
+"""Benchmark tái lập được cho luồng của khách và của chủ nhà hàng, chạy trong tiến trình.
+
+    python -m benchmarks.flows --output baseline.json
+    python -m benchmarks.flows --baseline baseline.json        # thoát mã 1 nếu chậm đi
+
+Lần chạy đầu gieo một CSDL SQLite (mặc định trong thư mục tạm) với hàng nghìn nhà
+hàng, menu và --orders đơn hàng (--orders 2000000 cho cỡ hàng triệu, mất vài
+phút); các lần sau dùng lại nếu cùng tham số gieo. --database-uri trỏ tới một
+CSDL MySQL thử nghiệm (không dùng CSDL thật: benchmark tạo đơn hàng).
+
+Các luồng được chạy tuần tự bằng Flask test client với seed cố định:
+  customer: /venues -> /view_menu -> /order_item (x2) -> /view_cart -> /checkout -> /confirm_order
+            -> trang thanh toán -> ảnh QR
+  owner:    /owner/orders -> trang đơn kế tiếp
+Mỗi bước ghi request/giây, p50/p95/p99 và số câu SQL trung bình. So với
+baseline, một bước bị coi là chậm đi khi p95 tăng quá --tolerance (và quá
+--min-delta-ms), hoặc số câu SQL tăng.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.search import CITIES, DISHES, STYLES, TOPPINGS
+from benchmarks.stats import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'bench-password'
+STATUSES = ('pending', 'preparing', 'served', 'paid', 'closed')
+
+
+def seed(conn, params, password_hash, chunk=20000):
+    """Gieo dữ liệu xác định theo `params` bằng các lệnh executemany theo lô."""
+    from sqlalchemy import insert
+    from models import MenuItem, Order, OrderItem, Table, User, Venue
+
+    rnd = random.Random(0)
+    venues, per_owner = params['venues'], params['venues_per_owner']
+    items, tables = params['items_per_venue'], params['tables_per_venue']
+    owners = -(-venues // per_owner)
+    conn.execute(insert(User), [
+        {'id': i, 'username': f'bench-owner-{i}', 'password': password_hash, 'is_owner': True}
+        for i in range(1, owners + 1)])
+    conn.execute(insert(User), [
+        {'id': owners + i, 'username': f'bench-customer-{i}', 'password': password_hash, 'is_owner': False}
+        for i in range(1, params['customers'] + 1)])
+    conn.execute(insert(Venue), [
+        {'id': v, 'name': f"Quán {rnd.choice(DISHES)} {rnd.choice(CITIES)} {v}",
+         'location': f"{rnd.randint(1, 500)} đường số {rnd.randint(1, 50)}, {rnd.choice(CITIES)}",
+         'user_id': (v - 1) // per_owner + 1} for v in range(1, venues + 1)])
+    conn.execute(insert(Table), [
+        {'id': (v - 1) * tables + n, 'number': n, 'venue_id': v}
+        for v in range(1, venues + 1) for n in range(1, tables + 1)])
+    conn.execute(insert(MenuItem), [
+        {'id': (v - 1) * items + n, 'name': f"{rnd.choice(DISHES)} {rnd.choice(TOPPINGS)} {rnd.choice(STYLES)}",
+         'price': rnd.randint(20, 120) * 1000.0, 'venue_id': v}
+        for v in range(1, venues + 1) for n in range(1, items + 1)])
+
+    start = datetime(2024, 1, 1)
+    span = 365 * 24 * 60  # Đơn rải đều trong một năm
+    for first in range(1, params['orders'] + 1, chunk):
+        orders, lines = [], []
+        for order_id in range(first, min(first + chunk, params['orders'] + 1)):
+            venue_id = rnd.randint(1, venues)
+            total = 0.0
+            for item_id in rnd.sample(range(1, items + 1), rnd.randint(1, min(4, items))):
+                quantity = rnd.randint(1, 3)
+                lines.append({'order_id': order_id, 'menu_item_id': (venue_id - 1) * items + item_id,
+                              'price': 50000.0, 'quantity': quantity})
+                total += 50000.0 * quantity
+            orders.append({'id': order_id, 'customer_id': owners + rnd.randint(1, params['customers']),
+                           'venue_id': venue_id, 'total_price': total, 'status': rnd.choice(STATUSES),
+                           'created_at': start + timedelta(minutes=order_id * span // params['orders'])})
+        conn.execute(insert(Order), orders)
+        conn.execute(insert(OrderItem), lines)
+
+
+def prepare_database(app, password_hasher, params, reseed=False):
+    """Gieo CSDL nếu chưa có dữ liệu đúng tham số; trả về số giây gieo (0 nếu dùng lại)."""
+    from sqlalchemy import func, select
+    from database import db
+    from models import MenuItem, Order, Venue
+
+    with app.app_context():
+        venues = db.session.scalar(select(func.count()).select_from(Venue))
+        matches = (venues == params['venues']
+                   and db.session.scalar(select(func.count()).select_from(MenuItem))
+                   == params['venues'] * params['items_per_venue']
+                   and db.session.get(Order, params['orders']) is not None)
+        if matches and not reseed:
+            return 0.0
+        if venues and not reseed:
+            raise SystemExit("CSDL đã có dữ liệu với tham số gieo khác; thêm --reseed để xóa và gieo lại.")
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        password_hash = password_hasher.hash(PASSWORD)  # Mọi tài khoản benchmark dùng chung một mật khẩu
+        with db.engine.begin() as conn:
+            seed(conn, params, password_hash)
+        return time.perf_counter() - started
+
+
+class Recorder:
+    """Gom độ trễ, lỗi và số câu SQL của từng bước."""
+
+    def __init__(self, query_counter):
+        self.query_counter = query_counter
+        self.steps = {}
+
+    def request(self, client, name, method, path, expect=(200, 302), **kwargs):
+        queries = self.query_counter[0]
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        step = self.steps.setdefault(name, {'latencies': [], 'errors': 0, 'queries': 0})
+        step['latencies'].append(elapsed)
+        step['queries'] += self.query_counter[0] - queries
+        step['errors'] += response.status_code not in expect
+        return response
+
+    def results(self):
+        results = {}
+        for name, step in self.steps.items():
+            result = summarize(step['latencies'], sum(step['latencies']), step['errors'])
+            result['queries'] = round(step['queries'] / len(step['latencies']), 2)
+            results[name] = result
+        return results
+
+
+def customer_flow(recorder, client, rnd, params):
+    venue_id = rnd.randint(1, params['venues'])
+    items = params['items_per_venue']
+    recorder.request(client, 'customer.venues', 'GET', '/venues')
+    recorder.request(client, 'customer.view_menu', 'GET', f'/view_menu/{venue_id}')
+    for item in rnd.sample(range(1, items + 1), min(2, items)):
+        item_id = (venue_id - 1) * items + item
+        recorder.request(client, 'customer.order_item', 'POST', f'/order_item/{venue_id}/{item_id}')
+    recorder.request(client, 'customer.view_cart', 'GET', '/view_cart')
+    recorder.request(client, 'customer.checkout', 'GET', '/checkout', expect=(200,))
+    response = recorder.request(client, 'customer.confirm_order', 'POST', '/confirm_order', expect=(302,))
+    if response.location and '/payment' in response.location:
+        page = recorder.request(client, 'customer.payment', 'GET', response.location, expect=(200,))
+        match = re.search(r'<img src="([^"]+/qr\.svg[^"]*)"', page.get_data(as_text=True))
+        if match:
+            recorder.request(client, 'customer.payment_qr', 'GET', match.group(1).replace('&amp;', '&'),
+                             expect=(200,))
+
+
+def owner_flow(recorder, client, rnd, params):
+    response = recorder.request(client, 'owner.view_orders', 'GET', '/owner/orders', expect=(200,))
+    match = re.search(r'href="([^"]*/owner/orders\?cursor=[^"]+)"', response.get_data(as_text=True))
+    if match:
+        recorder.request(client, 'owner.view_orders_next', 'GET', match.group(1).replace('&amp;', '&'),
+                         expect=(200,))
+
+
+def logged_in_client(app, username):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': PASSWORD})
+    if response.status_code != 302:
+        raise SystemExit(f"Đăng nhập {username} thất bại (HTTP {response.status_code}).")
+    return client
+
+
+def run(app, params, iterations, warmup, seed_value=1):
+    """Chạy warmup + iterations lượt mỗi luồng; trả về số liệu của từng bước và từng luồng."""
+    from sqlalchemy import event
+    from database import db
+
+    query_counter = [0]
+
+    def count(*args):
+        query_counter[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        rnd = random.Random(seed_value)
+        owners = -(-params['venues'] // params['venues_per_owner'])
+        customers = [logged_in_client(app, f'bench-customer-{i}') for i in range(1, min(params['customers'], 20) + 1)]
+        owner_clients = [logged_in_client(app, f'bench-owner-{i}') for i in range(1, min(owners, 20) + 1)]
+
+        flows = {'customer': (customer_flow, customers), 'owner': (owner_flow, owner_clients)}
+        flow_latencies = {name: [] for name in flows}
+        recorder = None
+        for phase, rounds in (('warmup', warmup), ('measure', iterations)):
+            recorder = Recorder(query_counter)
+            for i in range(rounds):
+                for name, (flow, clients) in flows.items():
+                    started = time.perf_counter()
+                    flow(recorder, clients[i % len(clients)], rnd, params)
+                    if phase == 'measure':
+                        flow_latencies[name].append(time.perf_counter() - started)
+        return {
+            'flows': {name: summarize(latencies, sum(latencies)) for name, latencies in flow_latencies.items()},
+            'steps': recorder.results(),
+        }
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+
+def compare(current, baseline, tolerance, min_delta_ms):
+    """Danh sách các bước chậm đi so với baseline (rỗng nếu không có)."""
+    regressions = []
+    print(f"{'step':<28}{'p95 base':>10}{'p95 now':>10}{'change':>9}{'SQL base':>10}{'SQL now':>9}")
+    for name, base in sorted(baseline['steps'].items()):
+        now = current['steps'].get(name)
+        if now is None:
+            regressions.append(f"{name}: không còn được đo")
+            continue
+        change = (now['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0.0
+        print(f"{name:<28}{base['p95_ms']:>10}{now['p95_ms']:>10}{change:>+9.0%}{base['queries']:>10}"
+              f"{now['queries']:>9}")
+        if change > tolerance and now['p95_ms'] - base['p95_ms'] > min_delta_ms:
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {now['p95_ms']} ms ({change:+.0%})")
+        if now['queries'] > base['queries'] + max(0.5, base['queries'] * 0.1):
+            regressions.append(f"{name}: số câu SQL {base['queries']} -> {now['queries']}")
+        if now['errors'] > base['errors']:
+            regressions.append(f"{name}: {now['errors']} lỗi (baseline {base['errors']})")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', help='Mặc định: SQLite trong thư mục tạm (--db).')
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'tablehub-bench.db'))
+    parser.add_argument('--reseed', action='store_true', help='Xóa và gieo lại dữ liệu.')
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--venues-per-owner', type=int, default=5)
+    parser.add_argument('--items-per-venue', type=int, default=30)
+    parser.add_argument('--tables-per-venue', type=int, default=15)
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--iterations', type=int, default=200, help='Số lượt đo mỗi luồng.')
+    parser.add_argument('--warmup', type=int, default=20, help='Số lượt chạy trước (không tính) để làm nóng cache.')
+    parser.add_argument('--output', help='Ghi kết quả ra file JSON (dùng làm baseline).')
+    parser.add_argument('--baseline', help='So sánh với file JSON của một lần chạy trước.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Mức p95 được phép chậm hơn baseline.')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='Bỏ qua chênh lệch p95 nhỏ hơn mức này (nhiễu đo).')
+    args = parser.parse_args(argv)
+
+    # Cấu hình phải có trước khi import app: CSDL benchmark, bcrypt rẻ, băm mật khẩu ngay trên luồng
+    os.environ['DATABASE_URL'] = args.database_uri or 'sqlite:///' + os.path.abspath(args.db)
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    sys.path.insert(0, ROOT)
+    from app import app, password_hasher
+
+    params = {key: getattr(args, key) for key in
+              ('venues', 'venues_per_owner', 'items_per_venue', 'tables_per_venue', 'customers', 'orders')}
+    seeded = prepare_database(app, password_hasher, params, args.reseed)
+    if seeded:
+        print(f"Đã gieo dữ liệu trong {seeded:.1f} giây: {params}")
+
+    result = run(app, params, args.iterations, args.warmup)
+    result['meta'] = {
+        'params': params, 'iterations': args.iterations, 'warmup': args.warmup, 'revision': git_revision(),
+        'database': os.environ['DATABASE_URL'].split(':', 1)[0], 'python': platform.python_version(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+    print(f"{'':<28}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'SQL':>7}")
+    for name, step in sorted(result['steps'].items()):
+        print(f"{name:<28}{step['rps']:>10}{step['p50_ms']:>9}{step['p95_ms']:>9}{step['p99_ms']:>9}"
+              f"{step['errors']:>8}{step['queries']:>7}")
+    for name, flow in result['flows'].items():
+        print(f"{'flow ' + name:<28}{flow['rps']:>10}{flow['p50_ms']:>9}{flow['p95_ms']:>9}{flow['p99_ms']:>9}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("Chậm đi so với baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("Không có bước nào chậm đi so với baseline.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""Đo tải HTTP cho luồng duyệt (browse) và đặt món (order) của khách.
+
+Chạy trên một server đang chạy:
+
+    python -m benchmarks.http_load --base-url http://localhost:8000 --flows browse,order
+
+hoặc tự khởi động gunicorn lần lượt với từng GUNICORN_PROFILE để so sánh
+request/giây và độ trễ p99 với chế độ sync cũ (cùng CSDL, cùng biến môi trường):
+
+    python -m benchmarks.http_load --profiles sync,gthread,gevent --duration 30 --output load.json
+
+CSDL cần có sẵn vài nhà hàng có menu; benchmark tự đăng ký một tài khoản khách.
+Luồng order tạo đơn hàng thật, chỉ chạy trên CSDL thử nghiệm.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from benchmarks.stats import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Không tự theo redirect để mỗi request được đo riêng."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    """Một phiên trình duyệt (giữ cookie) gửi request tới server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                return response.status, response.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+    def login(self, username, password):
+        status, _ = self.request('POST', '/login', {'username': username, 'password': password})
+        if status != 302:
+            raise RuntimeError(f"Đăng nhập thất bại (HTTP {status})")
+
+
+def discover(base_url):
+    """Danh sách (venue_id, [menu_item_id]) lấy từ các trang công khai."""
+    client = Client(base_url)
+    _, html = client.request('GET', '/venues')
+    venues = []
+    for venue_id in sorted(set(int(v) for v in re.findall(r'/view_menu/(\d+)', html))):
+        _, menu = client.request('GET', f'/view_menu/{venue_id}')
+        venues.append((venue_id, [int(i) for i in re.findall(rf'/order_item/{venue_id}/(\d+)', menu)]))
+    if not venues:
+        raise RuntimeError("CSDL chưa có nhà hàng nào để đo.")
+    return venues
+
+
+def browse_steps(client, venues, rnd):
+    venue_id, _ = rnd.choice(venues)
+    yield 'GET', '/venues', None
+    yield 'GET', f'/view_menu/{venue_id}', None
+    yield 'GET', f'/tables/{venue_id}', None
+
+
+def order_steps(client, venues, rnd):
+    venue_id, items = rnd.choice([v for v in venues if v[1]])
+    yield 'GET', f'/view_menu/{venue_id}', None
+    for item_id in rnd.sample(items, min(2, len(items))):
+        yield 'POST', f'/order_item/{venue_id}/{item_id}', {}
+    yield 'POST', '/confirm_order', {}
+
+
+FLOWS = {'browse': browse_steps, 'order': order_steps}
+
+
+def run_flow(base_url, flow, venues, concurrency, duration, credentials):
+    """Chạy một luồng với `concurrency` phiên song song trong `duration` giây."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        client = Client(base_url)
+        local, local_errors = [], 0
+        if flow == 'order':
+            try:
+                client.login(*credentials)
+            except (OSError, RuntimeError):
+                with lock:
+                    errors[0] += 1
+                return
+        while time.monotonic() < deadline:
+            for method, path, data in FLOWS[flow](client, venues, rnd):
+                started = time.perf_counter()
+                try:
+                    status, _ = client.request(method, path, data)
+                except OSError:
+                    status = 599
+                local.append(time.perf_counter() - started)
+                local_errors += status >= 400
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, time.monotonic() - started, errors[0])
+
+
+def run_all(base_url, flows, concurrency, duration):
+    venues = discover(base_url)
+    credentials = (f'bench-{uuid.uuid4().hex[:8]}', uuid.uuid4().hex)
+    Client(base_url).request('POST', '/register', dict(zip(('username', 'password'), credentials)))
+    return {flow: run_flow(base_url, flow, venues, concurrency, duration, credentials) for flow in flows}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_profile(profile, flows, concurrency, duration, workers):
+    """Khởi động gunicorn với GUNICORN_PROFILE=profile, đo rồi tắt server."""
+    port = _free_port()
+    env = dict(os.environ, GUNICORN_PROFILE=profile, PORT=str(port))
+    if workers:
+        env['WEB_CONCURRENCY'] = str(workers)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                              cwd=ROOT, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(300):
+            try:
+                urllib.request.urlopen(base_url + '/venues', timeout=1).read()
+                break
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError(f"gunicorn ({profile}) thoát với mã {server.returncode}")
+                time.sleep(0.1)
+        return run_all(base_url, flows, concurrency, duration)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', help='Đo server đang chạy tại địa chỉ này.')
+    parser.add_argument('--profiles', default='sync,gthread',
+                        help='Các GUNICORN_PROFILE cần so sánh khi không có --base-url (mặc định: sync,gthread).')
+    parser.add_argument('--flows', default='browse,order')
+    parser.add_argument('--concurrency', type=int, default=32, help='Số phiên khách song song.')
+    parser.add_argument('--duration', type=float, default=20, help='Số giây đo cho mỗi luồng.')
+    parser.add_argument('--workers', type=int, help='WEB_CONCURRENCY cho gunicorn (giữ giống nhau giữa các chế độ).')
+    parser.add_argument('--output', help='Ghi kết quả ra file JSON.')
+    args = parser.parse_args(argv)
+
+    flows = [f for f in args.flows.split(',') if f]
+    if args.base_url:
+        results = {'server': run_all(args.base_url, flows, args.concurrency, args.duration)}
+    else:
+        results = {profile: run_profile(profile, flows, args.concurrency, args.duration, args.workers)
+                   for profile in args.profiles.split(',') if profile}
+
+    print(f"{'profile':<10}{'flow':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for profile, by_flow in results.items():
+        for flow, r in by_flow.items():
+            print(f"{profile:<10}{flow:<8}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Đo thông lượng kiểm tra mật khẩu (lượt đăng nhập/giây) theo số tiến trình băm.
+
+    python -m benchmarks.password_hashing --rounds 12 --workers 0,1,2,4 --duration 10
+
+workers=0 là cách cũ: bcrypt chạy ngay trên luồng xử lý request.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from benchmarks.stats import summarize
+from passwords import PasswordHasher
+
+
+def measure(rounds, workers, concurrency, duration):
+    hasher = PasswordHasher(rounds=rounds, workers=workers, max_pending=concurrency, wait_timeout=60)
+    hashed = hasher.hash('mat-khau-thu')  # Đồng thời khởi động pool trước khi đo
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        local = []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            hasher.verify(hashed, 'mat-khau-thu')
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    result = summarize(latencies, time.monotonic() - started)
+    hasher.shutdown()
+
+    cores = min(workers, os.cpu_count()) if workers else 1
+    result['logins_per_core'] = round(result['rps'] / cores, 2)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=12, help='Hệ số chi phí bcrypt (BCRYPT_LOG_ROUNDS).')
+    parser.add_argument('--workers', default='0,1,2', help='Các giá trị PASSWORD_HASH_WORKERS cần đo.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Số lượt đăng nhập song song.')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--output', help='Ghi kết quả ra file JSON.')
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'workers':>8}{'login/s':>10}{'/core':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for workers in (int(w) for w in args.workers.split(',')):
+        r = results[workers] = measure(args.rounds, workers, args.concurrency, args.duration)
+        print(f"{workers:>8}{r['rps']:>10}{r['logins_per_core']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rounds': args.rounds, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Đo tốc độ tạo mã QR thanh toán: dựng payload, render SVG và lấy lại từ cache.
+
+    python -m benchmarks.qr --orders 2000 --repeat 20000
+
+Lượt "render" tạo ảnh cho --orders đơn khác nhau (mỗi đơn một payload, không
+cache). Lượt "cached" mô phỏng khách tải lại trang thanh toán: --repeat lượt
+chọn ngẫu nhiên trong các đơn gần nhất (đơn mới được chọn nhiều hơn), đi qua
+cache LRU theo nội dung như route /orders/<id>/qr.svg, và in tỉ lệ hit.
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.stats import summarize
+from cache import TTLCache
+from payments import payload_digest, payment_reference, render_qr_svg, vietqr_payload
+
+BANK_BIN = '970407'
+ACCOUNT = '19035651370018'
+NAME = 'NGUYEN VAN HUNG'
+
+
+def payloads(orders, seed=0):
+    rnd = random.Random(seed)
+    return [vietqr_payload(BANK_BIN, ACCOUNT, rnd.randrange(20, 2000) * 1000, payment_reference(order_id), NAME)
+            for order_id in range(1, orders + 1)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20000)
+    parser.add_argument('--cache-size', type=int, default=1024)
+    parser.add_argument('--output', help='Ghi kết quả ra file JSON.')
+    args = parser.parse_args(argv)
+
+    render_qr_svg(vietqr_payload(BANK_BIN, ACCOUNT, 1000, 'WARMUP'))  # Nạp segno trước khi đo
+
+    results = {}
+    started = time.perf_counter()
+    items = payloads(args.orders)
+    results['payload_us'] = round((time.perf_counter() - started) / args.orders * 1e6, 2)
+
+    latencies = []
+    for payload in items:
+        t = time.perf_counter()
+        render_qr_svg(payload)
+        latencies.append(time.perf_counter() - t)
+    results['render'] = summarize(latencies, sum(latencies))
+
+    cache = TTLCache(maxsize=args.cache_size, ttl=3600)
+    rnd = random.Random(1)
+    latencies = []
+    for _ in range(args.repeat):
+        # Đơn càng mới càng hay được mở lại (phân bố mũ trên thứ tự đơn)
+        payload = items[max(0, args.orders - 1 - int(rnd.expovariate(1 / 200)))]
+        t = time.perf_counter()
+        cache.get_or_load(payload_digest(payload), lambda: render_qr_svg(payload))
+        latencies.append(time.perf_counter() - t)
+    results['cached'] = summarize(latencies, sum(latencies))
+    stats = cache.stats()
+    results['hit_rate'] = round(stats['hits'] / (stats['hits'] + stats['misses']), 3)
+
+    print(f"Dựng payload VietQR: {results['payload_us']} µs/đơn")
+    print(f"{'':>8}{'images/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label in ('render', 'cached'):
+        result = results[label]
+        print(f"{label:>8}{result['rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+              f"{result['p99_ms']:>10}{result['max_ms']:>10}")
+    print(f"Tỉ lệ hit cache: {results['hit_rate']:.1%} ({stats['size']} ảnh trong cache)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'orders': args.orders, 'repeat': args.repeat, 'cache_size': args.cache_size, **results},
+                      f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Đo thời gian dựng chỉ mục và độ trễ tìm kiếm trên một danh mục món ăn giả lập.
+
+    python -m benchmarks.search --items 100000 --queries 2000
+
+Tên món được ghép từ các từ tiếng Việt thường gặp; câu tìm gồm cả có dấu, không
+dấu và tiền tố đang gõ dở. Lượt "sau khi ghi" sửa một món trước mỗi câu tìm
+(không tính giờ) để đo trường hợp không có gì trong cache.
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.stats import summarize
+from search import SearchIndex
+
+DISHES = ['Phở', 'Bún', 'Cơm', 'Bánh mì', 'Bánh cuốn', 'Hủ tiếu', 'Mì', 'Miến', 'Cháo', 'Xôi', 'Gỏi cuốn', 'Chả giò']
+TOPPINGS = ['bò', 'gà', 'heo', 'tôm', 'cua', 'chả', 'nem', 'sườn', 'vịt', 'cá', 'mực', 'đậu hũ', 'trứng', 'xá xíu']
+STYLES = ['tái', 'chín', 'nướng', 'rang', 'chiên', 'xào', 'hấp', 'kho', 'đặc biệt', 'thập cẩm', 'Huế', 'Hà Nội', 'Sài Gòn']
+CITIES = ['Hà Nội', 'Đà Nẵng', 'Huế', 'Hải Phòng', 'Cần Thơ', 'Nha Trang', 'Đà Lạt', 'Vũng Tàu', 'TP. Hồ Chí Minh']
+QUERIES = ['phở bò', 'pho bo', 'bun bo hue', 'bún', 'com ga', 'banh mi', 'banh m', 'hu tieu', 'chao ca', 'xoi',
+           'ga nuong', 'dac biet', 'đà nẵng', 'da lat', 'cua', 'muc xao', 'ph', 'bun ch', 'thap cam', 'sai gon']
+
+
+def build(items, venues, seed=0):
+    rnd = random.Random(seed)
+    index = SearchIndex()
+    started = time.perf_counter()
+    for venue_id in range(1, venues + 1):
+        index.upsert_venue(venue_id, f"Quán {rnd.choice(DISHES)} {rnd.choice(CITIES)} {venue_id}",
+                           f"{rnd.randint(1, 500)} đường số {rnd.randint(1, 50)}, {rnd.choice(CITIES)}")
+    for item_id in range(1, items + 1):
+        name = f"{rnd.choice(DISHES)} {rnd.choice(TOPPINGS)} {rnd.choice(STYLES)}"
+        index.upsert_menu_item(item_id, name, rnd.randint(20, 120) * 1000, rnd.randint(1, venues))
+    return index, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--output', help='Ghi kết quả ra file JSON.')
+    args = parser.parse_args(argv)
+
+    index, build_seconds = build(args.items, args.venues)
+    print(f"Dựng chỉ mục {args.items} món + {args.venues} nhà hàng: {build_seconds:.2f} giây, {index.stats()}")
+
+    rnd = random.Random(1)
+    results = {}
+    print(f"{'':>12}{'queries/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, write_first in (('search', False), ('after_write', True)):
+        latencies = []
+        elapsed = 0.0
+        for _ in range(args.queries):
+            query = rnd.choice(QUERIES)
+            if write_first:
+                item_id = rnd.randint(1, args.items)
+                index.upsert_menu_item(item_id, f"{rnd.choice(DISHES)} {rnd.choice(TOPPINGS)}", 50000, 1)
+            t = time.perf_counter()
+            index.search(query, page=rnd.randint(1, 3))
+            latencies.append(time.perf_counter() - t)
+            elapsed += latencies[-1]
+        result = results[label] = summarize(latencies, elapsed)
+        print(f"{label:>12}{result['rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+              f"{result['p99_ms']:>10}{result['max_ms']:>10}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'items': args.items, 'venues': args.venues, 'build_seconds': round(build_seconds, 2),
+                       **results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""Tính số liệu độ trễ dùng chung cho các benchmark."""
+import math
+
+
+def percentile(samples, p):
+    """Phân vị p (0-100) theo phương pháp nearest-rank; samples phải đã sắp xếp."""
+    if not samples:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(samples)))
+    return samples[rank - 1]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Tóm tắt một lần chạy: số request, lỗi, request/giây và các phân vị độ trễ (ms)."""
+    samples = sorted(latencies)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        'max_ms': round(samples[-1] * 1000, 2) if samples else 0.0,
+    }
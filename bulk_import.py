@@ -0,0 +1,214 @@
+# bulk_import.py
+"""Nhập hàng loạt bàn và món ăn cho một nhà hàng từ file CSV hoặc JSON.
+
+Toàn bộ file được kiểm tra trước; có dòng lỗi thì không ghi gì và trả về lỗi
+của từng dòng. Nếu hợp lệ, các dòng mới được chèn và các dòng đã có được cập
+nhật bằng executemany trong một giao dịch, thay vì mỗi bàn/món một request và
+một commit. Dòng đã có nhận ra theo số bàn (bàn) hoặc theo `id` / tên món (món).
+"""
+import csv
+import io
+import json
+import math
+
+from sqlalchemy import insert, select, update
+
+from models import MenuItem, Table
+from sharding import assign_ids
+
+IMPORT_KINDS = ('tables', 'menu_items')
+IMPORT_FORMATS = ('csv', 'json')
+
+_NAME_LENGTH = MenuItem.__table__.c.name.type.length
+_TRUE = {'1', 'true', 'yes', 'y', 'available', 'có'}
+_FALSE = {'0', 'false', 'no', 'n', 'unavailable', 'không'}
+
+
+class BulkImportError(Exception):
+    """File nhập không hợp lệ; `errors` là danh sách (số dòng hoặc None, thông báo)."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} lỗi trong file nhập")
+
+
+def detect_format(filename, default='csv'):
+    """Định dạng theo đuôi file (.csv / .json)."""
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    return extension if extension in IMPORT_FORMATS else default
+
+
+def load_rows(data, fmt, max_rows=5000):
+    """Đọc file thành danh sách (số dòng, {cột: giá trị}).
+
+    CSV cần dòng tiêu đề (số dòng tính cả tiêu đề, khớp khi mở bằng trình soạn
+    thảo); JSON là một mảng object (số dòng là vị trí trong mảng, từ 1).
+    """
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise BulkImportError([(None, "File phải được mã hóa UTF-8.")])
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(data))
+        rows = []
+        for values in reader:
+            if any((value or '').strip() for value in values.values()):
+                rows.append((reader.line_num, {(key or '').strip().lower(): value for key, value in values.items()}))
+    elif fmt == 'json':
+        try:
+            items = json.loads(data)
+        except ValueError as e:
+            raise BulkImportError([(None, f"JSON không hợp lệ: {e}")])
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise BulkImportError([(None, "JSON phải là một mảng các object.")])
+        rows = [(number, {key.lower(): value for key, value in item.items()})
+                for number, item in enumerate(items, 1)]
+    else:
+        raise BulkImportError([(None, f"Định dạng không hỗ trợ: {fmt!r}")])
+    if not rows:
+        raise BulkImportError([(None, "File không có dòng dữ liệu nào.")])
+    if len(rows) > max_rows:
+        raise BulkImportError([(None, f"File có {len(rows)} dòng, tối đa {max_rows} dòng mỗi lần nhập.")])
+    return rows
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _integer(value, field):
+    if isinstance(value, bool):
+        raise ValueError(f"{field} phải là số nguyên")
+    try:
+        number = float(_text(value)) if not isinstance(value, (int, float)) else value
+    except ValueError:
+        raise ValueError(f"{field} phải là số nguyên")
+    if not float(number).is_integer():
+        raise ValueError(f"{field} phải là số nguyên")
+    return int(number)
+
+
+def _boolean(value, field):
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f"{field} phải là true/false")
+
+
+def _validate_table(values):
+    if _text(values.get('number')) == '':
+        raise ValueError("thiếu số bàn (number)")
+    number = _integer(values['number'], 'number')
+    if number < 1:
+        raise ValueError("number phải lớn hơn 0")
+    row = {'number': number}
+    if _text(values.get('is_available')) != '':
+        row['is_available'] = _boolean(values['is_available'], 'is_available')
+    return row
+
+
+def _validate_menu_item(values):
+    name = _text(values.get('name'))
+    if not name:
+        raise ValueError("thiếu tên món (name)")
+    if len(name) > _NAME_LENGTH:
+        raise ValueError(f"tên món dài quá {_NAME_LENGTH} ký tự")
+    if _text(values.get('price')) == '' or isinstance(values.get('price'), bool):
+        raise ValueError("thiếu giá (price)")
+    try:
+        price = float(values['price'])
+    except (TypeError, ValueError):
+        raise ValueError("price phải là số")
+    if not math.isfinite(price) or price < 0:
+        raise ValueError("price phải là số không âm")
+    row = {'name': name, 'price': price}
+    if _text(values.get('id')) != '':
+        row['id'] = _integer(values['id'], 'id')
+    return row
+
+
+def _plan_tables(session, venue_id, rows, errors):
+    existing = dict(session.execute(select(Table.number, Table.id).where(Table.venue_id == venue_id)).all())
+    inserts, updates, seen = [], [], {}
+    for line, row in rows:
+        if row['number'] in seen:
+            errors.append((line, f"bàn số {row['number']} trùng với dòng {seen[row['number']]}"))
+            continue
+        seen[row['number']] = line
+        if row['number'] in existing:
+            if 'is_available' in row:
+                updates.append({'id': existing[row['number']], 'is_available': row['is_available']})
+        else:
+            inserts.append({'venue_id': venue_id, 'number': row['number'],
+                            'is_available': row.get('is_available', True)})
+    return inserts, updates
+
+
+def _plan_menu_items(session, venue_id, rows, errors):
+    by_id, by_name = {}, {}
+    for item_id, name in session.execute(
+            select(MenuItem.id, MenuItem.name).where(MenuItem.venue_id == venue_id).order_by(MenuItem.id)):
+        by_id[item_id] = name
+        by_name.setdefault(name, item_id)
+    inserts, updates, seen_names, seen_ids = [], [], {}, {}
+    for line, row in rows:
+        if row['name'] in seen_names:
+            errors.append((line, f"món {row['name']!r} trùng với dòng {seen_names[row['name']]}"))
+            continue
+        seen_names[row['name']] = line
+        item_id = row.get('id')
+        if item_id is not None and item_id not in by_id:
+            errors.append((line, f"món id={item_id} không thuộc nhà hàng này"))
+            continue
+        if item_id is None:
+            item_id = by_name.get(row['name'])
+        if item_id is None:
+            inserts.append({'venue_id': venue_id, 'name': row['name'], 'price': row['price']})
+        elif item_id in seen_ids:
+            errors.append((line, f"món id={item_id} trùng với dòng {seen_ids[item_id]}"))
+        else:
+            seen_ids[item_id] = line
+            updates.append({'id': item_id, 'name': row['name'], 'price': row['price']})
+    return inserts, updates
+
+
+_KINDS = {
+    'tables': (Table, _validate_table, _plan_tables),
+    'menu_items': (MenuItem, _validate_menu_item, _plan_menu_items),
+}
+
+
+def import_rows(session, venue_id, kind, rows):
+    """Kiểm tra rồi ghi các dòng của `load_rows` trong một giao dịch và commit.
+
+    Trả về {'inserted': số dòng chèn, 'updated': [tham số UPDATE của từng dòng đã có]};
+    có lỗi thì không ghi gì và ném BulkImportError với lỗi của mọi dòng.
+    """
+    if kind not in _KINDS:
+        raise BulkImportError([(None, f"Loại dữ liệu không hợp lệ: {kind!r}")])
+    model, validate, plan = _KINDS[kind]
+
+    errors, valid = [], []
+    for line, values in rows:
+        try:
+            valid.append((line, validate(values)))
+        except ValueError as e:
+            errors.append((line, str(e)))
+    try:
+        inserts, updates = plan(session, venue_id, valid, errors)
+        if errors:
+            raise BulkImportError(sorted(errors, key=lambda error: error[0] or 0))
+        if inserts:
+            session.execute(insert(model), assign_ids(session, model, inserts))
+        if updates:
+            session.execute(update(model), updates)  # UPDATE theo khóa chính, executemany
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return {'inserted': len(inserts), 'updated': updates}
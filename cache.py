@@ -0,0 +1,275 @@
+# cache.py
+"""Bộ nhớ đệm đọc-xuyên (read-through) trong tiến trình cho dữ liệu ít thay đổi.
+
+Dữ liệu được lưu dưới dạng dict thuần (không phải đối tượng ORM) để dùng lại
+an toàn giữa các request, kèm ETag tính từ nội dung để trả 304 cho trình duyệt
+và làm khóa cache cho HTML đã render. Mỗi nhà hàng có một số phiên bản: các route ghi menu
+gọi MenuCache.bump, tăng phiên bản để vô hiệu hóa ngay trong worker hiện tại và
+báo qua event bus (kênh MENU_CHANNEL) để các worker khác cùng tăng. Với
+EVENT_BROKER=memory, hoặc khi mất kết nối tới broker, worker khác chỉ nhận dữ
+liệu mới khi mục hết hạn TTL.
+"""
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import make_response, render_template, request, session
+from markupsafe import Markup
+from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
+from werkzeug.http import is_resource_modified
+
+from database import db, on_primary
+from models import Venue, MenuItem, User
+from pagination import keyset_page
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+MENU_CHANNEL = 'cache:menu'
+USER_CHANNEL = 'cache:user'
+
+
+def _origin():
+    """Worker hiện tại (máy, tiến trình), để bỏ qua sự kiện do chính nó gửi."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _announce(bus, channel, message, what):
+    """Báo các worker khác qua event bus; lỗi broker chỉ ghi log (worker khác nhận dữ liệu mới sau TTL)."""
+    if bus is None:
+        return
+    try:
+        bus.publish(channel, dict(message, origin=_origin()))
+    except Exception:
+        logger.exception("Không báo được thay đổi %s", what)
+
+
+class TTLCache:
+    """Cache LRU có thời hạn sống, an toàn đa luồng, kèm bộ đếm hit/miss."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (hết hạn lúc, giá trị)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """Trả về giá trị trong cache, hoặc gọi loader() rồi lưu lại (bỏ qua nếu loader trả về None)."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data),
+                    'maxsize': self.maxsize, 'ttl': self.ttl}
+
+
+class MenuCache:
+    """Cache danh sách nhà hàng và menu từng nhà hàng, vô hiệu hóa theo số phiên bản.
+
+    Danh sách nhà hàng không có phiên bản: app chưa có route thêm/sửa nhà hàng, trang
+    danh sách chỉ đổi sau TTL.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, bus=None):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._bus = bus
+        if bus is not None:
+            bus.listen(MENU_CHANNEL, self._on_bump)
+
+    def venues(self, after=None, limit=20):
+        """Một trang nhà hàng theo id tăng dần, sau id `after`:
+        {'venues': [{'id', 'name', 'location'}], 'next_cursor', 'etag', 'last_modified'}."""
+        key = ('venues', after, limit)
+        return self._cache.get_or_load(key, lambda: _load_venues(after, limit))
+
+    def menu(self, venue_id):
+        """{'venue', 'menu_items', 'etag', 'last_modified'} của một nhà hàng, hoặc None nếu không tồn tại."""
+        key = ('menu', venue_id, self._versions.get(venue_id, 0))
+        return self._cache.get_or_load(key, lambda: _load_menu(venue_id))
+
+    def bump(self, venue_id):
+        """Gọi sau khi menu của nhà hàng thay đổi: vô hiệu hóa ngay trong worker này và báo các worker khác."""
+        self._invalidate(venue_id)
+        _announce(self._bus, MENU_CHANNEL, {'venue_id': venue_id}, f"menu của nhà hàng {venue_id}")
+
+    def _on_bump(self, message):
+        if message.get('origin') != _origin():  # Worker gửi đã tự vô hiệu hóa
+            self._invalidate(message['venue_id'])
+
+    def _invalidate(self, venue_id):
+        with self._lock:
+            version = self._versions.get(venue_id, 0)
+            self._versions[venue_id] = version + 1
+        self._cache.delete(('menu', venue_id, version))
+
+    def stats(self):
+        return self._cache.stats()
+
+
+def user_stamp(user):
+    """Dấu phiên bản của user, đổi khi mật khẩu hoặc quyền chủ nhà hàng thay đổi."""
+    return hashlib.sha1(f"{user.password}|{bool(user.is_owner)}".encode('utf-8')).hexdigest()[:16]
+
+
+class UserCache:
+    """Cache User cho user_loader của Flask-Login, khóa theo id, kèm dấu phiên bản hiện tại của user.
+
+    Chỉ dùng bản cache khi dấu trong session trùng dấu đã lưu. Route ghi User gọi
+    `invalidate`: xóa mục trong worker này và báo các worker khác qua event bus (kênh
+    USER_CHANNEL), nên lần tải sau đọc lại CSDL ngay. Thay đổi ngoài app (sửa thẳng
+    CSDL), hoặc khi mất kết nối tới broker, chỉ được nhận sau TTL.
+    """
+
+    def __init__(self, maxsize=4096, ttl=30, bus=None):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._bus = bus
+        if bus is not None:
+            bus.listen(USER_CHANNEL, self._on_invalidate)
+
+    def load(self, user_id, stamp):
+        """(User gắn vào db.session hiện tại hoặc None, dấu phiên bản hiện tại); chỉ truy vấn CSDL khi
+        cache trượt hoặc dấu trong session khác dấu đã lưu."""
+        cached = self._cache.get(user_id)
+        if cached is not None and stamp and cached[0] == stamp:
+            # Gắn bản sao vào session của request mà không cần SELECT
+            return db.session.merge(cached[1], load=False), stamp
+        user = db.session.get(User, user_id)
+        if user is None:
+            self._cache.delete(user_id)
+            return None, None
+        current = user_stamp(user)
+        copy = User(id=user.id, username=user.username, password=user.password, is_owner=user.is_owner)
+        make_transient_to_detached(copy)
+        self._cache.set(user_id, (current, copy))
+        return user, current
+
+    def invalidate(self, user_id):
+        """Gọi sau khi ghi User (mật khẩu, quyền chủ nhà hàng): mọi worker đọc lại CSDL ở lần tải sau."""
+        self._cache.delete(user_id)
+        _announce(self._bus, USER_CHANNEL, {'user_id': user_id}, f"của user {user_id}")
+
+    def _on_invalidate(self, message):
+        if message.get('origin') != _origin():
+            self._cache.delete(message['user_id'])
+
+    def stats(self):
+        return self._cache.stats()
+
+
+def _venue_dict(venue):
+    return {'id': venue.id, 'name': venue.name, 'location': venue.location, 'owner_id': venue.user_id}
+
+
+def _stamped(data):
+    """Gắn ETag (băm nội dung) và thời điểm tải để phục vụ HTTP conditional request."""
+    data['etag'] = fingerprint(data)
+    data['last_modified'] = datetime.utcnow().replace(microsecond=0)
+    return data
+
+
+@on_primary
+def _load_venues(after, limit):
+    cursor = None if after is None else (after,)
+    venues, next_cursor = keyset_page(Venue.query, (Venue.id,), cursor=cursor, limit=limit, descending=False)
+    return _stamped({'venues': [_venue_dict(venue) for venue in venues],
+                     'next_cursor': next_cursor[0] if next_cursor else None})
+
+
+@on_primary
+def _load_menu(venue_id):
+    venue = db.session.get(Venue, venue_id)
+    if venue is None:
+        return None
+    rows = db.session.execute(
+        select(MenuItem.id, MenuItem.name, MenuItem.price).where(MenuItem.venue_id == venue_id).order_by(MenuItem.id)
+    )
+    return _stamped({
+        'venue': _venue_dict(venue),
+        'menu_items': [{'id': item_id, 'name': name, 'price': price} for item_id, name, price in rows],
+    })
+
+
+def fingerprint(*parts):
+    """Chuỗi băm ổn định (giống nhau giữa các worker) của dữ liệu thuần."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def templates_fingerprint(app):
+    """Băm nội dung thư mục templates, để ETag đổi khi giao diện được triển khai lại."""
+    digest = hashlib.sha1()
+    folder = os.path.join(app.root_path, app.template_folder)
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            digest.update(name.encode('utf-8'))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def render_fragment(cache, template, etag, **context):
+    """Render một template con, dùng lại HTML đã render nếu ETag không đổi."""
+    return Markup(cache.get_or_load((template, etag), lambda: render_template(template, **context)))
+
+
+def conditional_response(etag, last_modified, render):
+    """Trả 304 nếu trình duyệt đã có bản khớp ETag/Last-Modified, ngược lại gọi render().
+
+    Khi còn thông báo flash chưa hiển thị thì luôn render đầy đủ.
+    """
+    if '_flashes' not in session and not is_resource_modified(
+            request.environ, etag=etag, last_modified=last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Trang có thể khác nhau theo phiên đăng nhập: chỉ cho trình duyệt cache và luôn hỏi lại server
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,227 @@
+# cart.py
+"""Giỏ hàng của khách: mặc định lưu phía server, cookie session chỉ giữ `cart_id`.
+
+Mỗi giỏ được lưu gọn dưới dạng {menu_item_id: số lượng} kèm đơn giá lúc thêm
+và tổng tiền tính sẵn, nên thêm/xóa một món là O(1) và không phải tính lại
+tổng. Backend chọn bằng CART_BACKEND (xem config.py):
+  - RedisCartStore: mặc định khi có CART_REDIS_URL; Redis hoặc máy chủ tương thích
+    Redis, dùng chung giữa các worker gunicorn;
+  - MemoryCartStore: mặc định khi không có CART_REDIS_URL; trong tiến trình, giới hạn
+    số giỏ theo LRU (chỉ dùng khi chạy một worker, gunicorn.conf.py kiểm tra);
+  - CookieCartStore: chỉ khi đặt CART_BACKEND=cookie, cho nhiều worker mà không có
+    Redis; cả giỏ nằm trong cookie session đã ký, nên mỗi lần thêm/xóa món cookie
+    được ký lại và giỏ bị giới hạn số món.
+"""
+import threading
+from collections import OrderedDict
+
+from flask import session
+from sqlalchemy import select
+
+from database import db
+from models import MenuItem
+
+
+class CartFull(Exception):
+    """Giỏ hàng đã đủ số món khác nhau mà backend chứa được."""
+
+
+class Cart:
+    """Giỏ hàng của một khách tại một nhà hàng."""
+    __slots__ = ('venue_id', 'items', 'prices', 'total')
+
+    def __init__(self, venue_id=None, items=None, prices=None, total=0.0):
+        self.venue_id = venue_id
+        self.items = items or {}    # menu_item_id -> số lượng
+        self.prices = prices or {}  # menu_item_id -> đơn giá lúc thêm vào giỏ
+        self.total = total
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def add(self, venue_id, item_id, price, quantity=1):
+        self.venue_id = venue_id
+        self.items[item_id] = self.items.get(item_id, 0) + quantity
+        self.prices[item_id] = price
+        self.total += price * quantity
+
+    def remove(self, item_id):
+        quantity = self.items.pop(item_id, 0)
+        self.total -= self.prices.pop(item_id, 0) * quantity
+        if not self.items:
+            self.total = 0.0  # Tránh sai số cộng dồn của số thực
+
+    def copy(self):
+        return Cart(self.venue_id, dict(self.items), dict(self.prices), self.total)
+
+
+class CookieCartStore:
+    """Lưu giỏ trong cookie session của Flask (đã ký bằng SECRET_KEY), bỏ qua `cart_id`.
+
+    Dạng gọn {'v': venue_id, 'i': {'<id>': [số lượng, đơn giá]}, 't': tổng tiền}; cookie
+    giới hạn khoảng 4KB nên giỏ nhận tối đa `max_items` món khác nhau (đủ cho một bàn ăn).
+    """
+
+    def __init__(self, max_items=60, key='cart'):
+        self.max_items = max_items
+        self.key = key
+
+    def get(self, cart_id):
+        data = session.get(self.key)
+        if not data or 't' not in data:  # Cookie cũ chưa có tổng tiền: coi như giỏ trống
+            return Cart()
+        items = {int(item_id): quantity for item_id, (quantity, _) in data['i'].items()}
+        prices = {int(item_id): price for item_id, (_, price) in data['i'].items()}
+        return Cart(data['v'], items, prices, data['t'])
+
+    def add_item(self, cart_id, venue_id, item_id, price, quantity=1):
+        data = session.get(self.key)
+        if data is None or 't' not in data:  # Giỏ mới, hoặc cookie cũ chưa có tổng tiền
+            data = session[self.key] = {'v': venue_id, 'i': {}, 't': 0.0}
+        lines = data['i']
+        if str(item_id) not in lines and len(lines) >= self.max_items:
+            raise CartFull(f"Giỏ hàng chỉ chứa tối đa {self.max_items} món khác nhau.")
+        lines[str(item_id)] = [lines.get(str(item_id), [0])[0] + quantity, price]
+        data['v'] = venue_id
+        data['t'] += price * quantity
+        session.modified = True
+
+    def remove_item(self, cart_id, item_id):
+        data = session.get(self.key)
+        if data and 't' in data and str(item_id) in data['i']:
+            quantity, price = data['i'].pop(str(item_id))
+            if data['i']:
+                data['t'] -= quantity * price
+                session.modified = True
+            else:
+                session.pop(self.key)  # Tránh sai số cộng dồn của số thực
+
+    def clear(self, cart_id):
+        session.pop(self.key, None)
+
+
+class MemoryCartStore:
+    """Lưu giỏ trong bộ nhớ tiến trình, loại giỏ ít dùng nhất khi vượt `max_carts`."""
+
+    def __init__(self, max_carts=10000):
+        self.max_carts = max_carts
+        self._carts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _touch(self, cart_id):
+        cart = self._carts.get(cart_id)
+        if cart is None:
+            cart = self._carts[cart_id] = Cart()
+            if len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+        else:
+            self._carts.move_to_end(cart_id)
+        return cart
+
+    def get(self, cart_id):
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is None:
+                return Cart()
+            self._carts.move_to_end(cart_id)
+            return cart.copy()
+
+    def add_item(self, cart_id, venue_id, item_id, price, quantity=1):
+        with self._lock:
+            self._touch(cart_id).add(venue_id, item_id, price, quantity)
+
+    def remove_item(self, cart_id, item_id):
+        with self._lock:
+            if cart_id in self._carts:
+                self._touch(cart_id).remove(item_id)
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+
+# Xóa một món và trừ tổng tiền trong cùng một thao tác nguyên tử phía Redis
+_REDIS_REMOVE_ITEM = """
+local quantity = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local price = tonumber(redis.call('HGET', KEYS[1], 'p:' .. ARGV[1]) or '0')
+redis.call('HDEL', KEYS[1], ARGV[1], 'p:' .. ARGV[1])
+if redis.call('HLEN', KEYS[1]) <= 2 then
+    redis.call('DEL', KEYS[1])
+elseif quantity > 0 then
+    redis.call('HINCRBYFLOAT', KEYS[1], 'total', -quantity * price)
+end
+return quantity
+"""
+
+
+class RedisCartStore:
+    """Lưu mỗi giỏ thành một hash Redis: `<id>` -> số lượng, `p:<id>` -> đơn giá, `venue`, `total`."""
+
+    def __init__(self, url, ttl=86400, prefix='cart:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CART_BACKEND=redis cần cài gói 'redis' (pip install redis).") from e
+        self._redis = redis.Redis.from_url(url)
+        self._remove_item = self._redis.register_script(_REDIS_REMOVE_ITEM)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, cart_id):
+        if not cart_id:
+            return Cart()
+        cart = Cart()
+        for field, value in self._redis.hgetall(self.prefix + cart_id).items():
+            field = field.decode()
+            if field == 'venue':
+                cart.venue_id = int(value)
+            elif field == 'total':
+                cart.total = float(value)
+            elif field.startswith('p:'):
+                cart.prices[int(field[2:])] = float(value)
+            else:
+                cart.items[int(field)] = int(value)
+        if not cart.items:
+            cart.total = 0.0
+        return cart
+
+    def add_item(self, cart_id, venue_id, item_id, price, quantity=1):
+        key = self.prefix + cart_id
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={'venue': venue_id, f'p:{item_id}': price})
+        pipe.hincrby(key, str(item_id), quantity)
+        pipe.hincrbyfloat(key, 'total', price * quantity)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def remove_item(self, cart_id, item_id):
+        self._remove_item(keys=[self.prefix + cart_id], args=[str(item_id)])
+
+    def clear(self, cart_id):
+        self._redis.delete(self.prefix + cart_id)
+
+
+def create_cart_store(config):
+    """Tạo backend giỏ hàng theo cấu hình CART_BACKEND."""
+    backend = config.get('CART_BACKEND', 'memory')
+    if backend == 'cookie':
+        return CookieCartStore(max_items=config.get('CART_COOKIE_MAX_ITEMS', 60))
+    if backend == 'memory':
+        return MemoryCartStore(max_carts=config.get('CART_MAX_CARTS', 10000))
+    if backend == 'redis':
+        return RedisCartStore(config['CART_REDIS_URL'], ttl=config.get('CART_TTL', 86400))
+    raise ValueError(f"CART_BACKEND không hợp lệ: {backend!r}")
+
+
+def cart_lines(cart):
+    """Các dòng hiển thị của giỏ (tên, đơn giá, số lượng), lấy tên món bằng một truy vấn IN."""
+    if not cart:
+        return []
+    names = dict(db.session.execute(
+        select(MenuItem.id, MenuItem.name).where(MenuItem.id.in_(cart.items))
+    ).all())
+    return [
+        {'id': item_id, 'name': names.get(item_id, '?'), 'price': cart.prices.get(item_id, 0),
+         'quantity': quantity}
+        for item_id, quantity in cart.items.items()
+    ]
@@ -0,0 +1,471 @@
+# commands.py
+"""Các lệnh `flask ...` phục vụ vận hành và kiểm tra hệ thống."""
+import contextvars
+import os
+import random
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, has_request_context, request
+from flask.cli import with_appcontext
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import db, replica_keys
+from analytics import backfill
+from bulk_import import IMPORT_FORMATS, IMPORT_KINDS, BulkImportError, detect_format, import_rows, load_rows
+from exports import EXPORT_FORMATS, EXPORT_KINDS, export_orders
+from jobs import due_jobs
+from models import User, Venue, Table, Reservation, MenuItem, Order, OrderItem, TenantShard
+from reservations import BookingError, reserve_table, find_double_bookings
+from sharding import move_tenant, shard_scope, tenant_shards, use_owner_shard, use_venue_shard
+
+
+def _scratch_engine(database_uri, **engine_options):
+    """Engine tới CSDL nháp; mặc định là một file SQLite tạm (trả về kèm đường dẫn để xóa sau)."""
+    temp_path = None
+    if database_uri is None:
+        fd, temp_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        database_uri = 'sqlite:///' + temp_path
+    connect_args = {'timeout': 30} if database_uri.startswith('sqlite') else {}
+    return create_engine(database_uri, connect_args=connect_args, **engine_options), temp_path
+
+
+@click.command('stress-booking')
+@click.option('--bookings', default=500, show_default=True, help='Tổng số lượt đặt bàn bắn song song.')
+@click.option('--workers', default=64, show_default=True, help='Số luồng đặt bàn cùng lúc.')
+@click.option('--tables', 'table_count', default=3, show_default=True, help='Số bàn bị tranh chấp.')
+@click.option('--slots', default=4, show_default=True, help='Số khung giờ bị tranh chấp.')
+@click.option('--database-uri', default=None,
+              help='CSDL nháp để thử tải (mặc định: một file SQLite tạm; nên chạy thêm với một CSDL '
+                   'MySQL trống, ví dụ mysql+pymysql://...). Không trỏ vào CSDL thật.')
+@with_appcontext
+def stress_booking(bookings, workers, table_count, slots, database_uri):
+    """Bắn nhiều lượt đặt bàn song song và kiểm tra không có bàn nào bị đặt trùng.
+
+    Mỗi lượt đặt đi đúng đường của route `book_table`: tải bàn trước rồi mới gọi
+    reserve_table trong cùng giao dịch, nên trên MySQL lệnh bắt được lỗi đọc theo
+    snapshot cũ nếu kiểm tra trùng giờ không khóa.
+    """
+    engine, temp_path = _scratch_engine(database_uri, pool_size=workers, max_overflow=0)
+
+    try:
+        db.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as s:
+            owner = User(username=f'stress-{uuid.uuid4().hex[:8]}', password='!', is_owner=True)
+            s.add(owner)
+            s.flush()
+            venue = Venue(name='Stress test', location='-', user_id=owner.id)
+            s.add(venue)
+            s.flush()
+            tables = [Table(number=n, venue_id=venue.id) for n in range(1, table_count + 1)]
+            s.add_all(tables)
+            s.commit()
+            table_ids = [t.id for t in tables]
+            customer_id = owner.id
+
+        slot = timedelta(minutes=current_app.config['RESERVATION_SLOT_MINUTES'])
+        base = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+        def attempt(i):
+            rnd = random.Random(i)
+            # Một nửa số lượt lệch nửa khung để có cả các khung chồng lấn một phần
+            start = base + rnd.randrange(slots) * slot + (slot / 2 if rnd.random() < 0.5 else timedelta(0))
+            with Session() as s:
+                try:
+                    # Như book_table: SELECT bàn mở giao dịch (và chụp snapshot trên InnoDB) trước khi khóa
+                    table = s.get(Table, rnd.choice(table_ids))
+                    reserve_table(s, table.id, customer_id, start, start + slot)
+                    return 'booked'
+                except BookingError:
+                    return 'rejected'
+                except OperationalError:
+                    return 'error'
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(attempt, range(bookings)))
+        elapsed = time.perf_counter() - started
+
+        with Session() as s:
+            clashes = find_double_bookings(s)
+
+        click.echo(f"{bookings} lượt đặt trong {elapsed:.2f}s: "
+                   f"{outcomes.count('booked')} thành công, {outcomes.count('rejected')} bị từ chối, "
+                   f"{outcomes.count('error')} lỗi khóa/timeout.")
+        if clashes:
+            raise click.ClickException(f"Phát hiện {len(clashes)} cặp đặt trùng: {clashes[:10]}")
+        click.echo("Không có bàn nào bị đặt trùng.")
+    finally:
+        engine.dispose()
+        if temp_path:
+            os.remove(temp_path)
+
+
+def _seed_for_plans(conn, owners=20, venues_per_owner=10, orders=5000):
+    """Dữ liệu mẫu đủ lớn để bộ tối ưu truy vấn chọn chỉ mục như trên môi trường thật."""
+    rnd = random.Random(0)
+    conn.execute(insert(User), [
+        {'id': i, 'username': f'owner-{i}', 'password': '!', 'is_owner': True} for i in range(1, owners + 1)])
+    conn.execute(insert(User), {'id': owners + 1, 'username': 'customer', 'password': '!', 'is_owner': False})
+    venue_ids = range(1, owners * venues_per_owner + 1)
+    conn.execute(insert(Venue), [
+        {'id': v, 'name': f'Venue {v}', 'location': '-', 'user_id': (v - 1) // venues_per_owner + 1}
+        for v in venue_ids])
+    conn.execute(insert(Table), [
+        {'id': (v - 1) * 10 + n, 'number': n, 'venue_id': v} for v in venue_ids for n in range(1, 11)])
+    conn.execute(insert(MenuItem), [
+        {'id': (v - 1) * 20 + n, 'name': f'Món {n}', 'price': 10.0 * n, 'venue_id': v}
+        for v in venue_ids for n in range(1, 21)])
+    base = datetime(2024, 1, 1)
+    conn.execute(insert(Order), [
+        {'id': o, 'customer_id': rnd.randint(1, owners), 'venue_id': rnd.choice(venue_ids), 'total_price': 100.0,
+         'status': 'pending', 'created_at': base + timedelta(minutes=o)} for o in range(1, orders + 1)])
+    conn.execute(insert(OrderItem), [
+        {'order_id': o, 'menu_item_id': rnd.randint(1, len(venue_ids) * 20), 'price': 10.0, 'quantity': 1}
+        for o in range(1, orders + 1) for _ in range(3)])
+    conn.execute(insert(Reservation), [
+        {'table_id': rnd.randint(1, len(venue_ids) * 10), 'customer_id': 1,
+         'start_time': base + timedelta(hours=h), 'end_time': base + timedelta(hours=h + 2)} for h in range(2000)])
+
+
+def route_requests(conn):
+    """Các request đi qua những route chính của app.py: (mã người dùng đăng nhập hoặc None, method, URL, form).
+
+    Khi thêm route có truy vấn riêng, thêm request tương ứng vào đây.
+    """
+    owner_id, customer_id = 1, conn.scalar(select(User.id).where(User.username == 'customer'))
+    venue_id = conn.scalar(select(Venue.id).where(Venue.user_id == owner_id).order_by(Venue.id))
+    table_id = conn.scalar(select(Table.id).where(Table.venue_id == venue_id).order_by(Table.id))
+    item_ids = conn.scalars(select(MenuItem.id).where(MenuItem.venue_id == venue_id).order_by(MenuItem.id)
+                            .limit(2)).all()
+    order_id = conn.scalar(select(Order.id).where(Order.venue_id == venue_id).order_by(Order.id))
+    start = f"{datetime.now() + timedelta(days=1):%Y-%m-%dT%H:00}"
+    return [
+        (None, 'POST', '/login', {'username': 'owner-1', 'password': '-'}),
+        (owner_id, 'GET', '/dashboard', None),
+        (owner_id, 'GET', '/manage_restaurants', None),
+        (owner_id, 'GET', '/manage_tables', None),
+        (owner_id, 'GET', f'/manage_tables/{venue_id}/tables', None),
+        (owner_id, 'POST', f'/add_table/{venue_id}', {'number': '99'}),
+        (owner_id, 'POST', f'/admin/edit/{table_id}', {'status': 'available'}),
+        (owner_id, 'GET', '/manage_menu', None),
+        (owner_id, 'GET', f'/manage_menu/{venue_id}/items', None),
+        (owner_id, 'POST', f'/add_menu_item/{venue_id}', {'name': 'Món mới', 'price': '25'}),
+        (owner_id, 'POST', f'/edit_menu_item/{item_ids[0]}', {'name': 'Món 1', 'price': '10'}),
+        (owner_id, 'GET', '/owner/orders', None),
+        (owner_id, 'GET', '/owner/orders?status=pending&date_from=2024-01-01', None),
+        (owner_id, 'POST', '/owner/orders/status', {'order_id': order_id, f'version-{order_id}': 0, 'status': 'preparing'}),
+        (owner_id, 'GET', '/owner/orders/changes?after=0', None),
+        (owner_id, 'GET', '/owner/orders/export?format=csv&kind=items', None),
+        (owner_id, 'GET', '/owner/analytics', None),
+        (customer_id, 'GET', '/venues', None),
+        (customer_id, 'GET', '/api/search?q=mon', None),
+        (customer_id, 'GET', f'/tables/{venue_id}', None),
+        (customer_id, 'POST', f'/book_table/{venue_id}/{table_id}', {'start': start}),
+        (customer_id, 'GET', f'/view_menu/{venue_id}', None),
+        *[(customer_id, 'POST', f'/order_item/{venue_id}/{item_id}', None) for item_id in item_ids],
+        (customer_id, 'GET', '/view_cart', None),
+        (customer_id, 'GET', '/checkout', None),
+        (customer_id, 'POST', '/confirm_order', None),  # Theo chuyển hướng tới trang thanh toán của đơn
+    ]
+
+
+def background_queries():
+    """Truy vấn không chạy qua route (hoặc chỉ chạy khi có shard): (tên, câu lệnh)."""
+    return [
+        ('shard của nhà hàng (khi có DATABASE_SHARD_URLS)', select(TenantShard.shard)
+            .join(Venue, Venue.user_id == TenantShard.owner_id).where(Venue.id == 1)),
+        ('worker (nhận việc nền)', due_jobs(datetime(2024, 1, 10, 18, 0), 300, 50)),
+    ]
+
+
+@contextmanager
+def use_engine(engine):
+    """Tạm cho app (mọi route, kể cả shard/replica) dùng `engine` thay cho các engine đã cấu hình."""
+    engines = db.engines
+    configured = dict(engines)
+    db.session.remove()
+    engines.clear()
+    engines[None] = engine
+    try:
+        yield
+    finally:
+        db.session.remove()
+        engines.clear()
+        engines.update(configured)
+
+
+def capture_route_sql(engine, requests):
+    """Chạy các request qua test client trên `engine`, ghi lại câu SQL route gửi đi.
+
+    Trả về (câu SQL theo route: {route: {câu lệnh: tham số}}, các request trả mã lỗi). Câu
+    lệnh được bắt bằng sự kiện before_cursor_execute (như instrumentation.py), nên là
+    đúng câu và tham số mà driver nhận; câu executemany (INSERT hàng loạt) bị bỏ qua.
+    """
+    captured = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not has_request_context() or request.url_rule is None:
+            return
+        if statement.lstrip().split(None, 1)[0].upper() in ('SELECT', 'WITH', 'UPDATE', 'DELETE'):
+            captured.setdefault(f"{request.method} {request.url_rule.rule}", {}).setdefault(statement, parameters)
+
+    app = current_app._get_current_object()
+    clients, failed = {}, []
+
+    def send(user_id, method, url, data):
+        client = clients.get(user_id)
+        if client is None:
+            client = clients[user_id] = app.test_client()
+            if user_id is not None:
+                with client.session_transaction() as session:
+                    session['_user_id'] = str(user_id)
+                    session['_fresh'] = True
+        response = client.open(url, method=method, data=data, follow_redirects=True)
+        response.get_data()  # Đọc hết response dạng luồng (xuất báo cáo)
+        if response.status_code >= 400:
+            failed.append(f"{method} {url}: HTTP {response.status_code}")
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        with use_engine(engine):
+            for args in requests:
+                # Ngữ cảnh trống: mỗi request có app context (g, db.session) riêng như khi chạy thật,
+                # thay vì dùng chung app context của lệnh flask
+                contextvars.Context().run(send, *args)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return captured, failed
+
+
+# Các lần quét toàn bảng có chủ đích: (route, bảng) -> lý do
+ALLOWED_SCANS = {
+    ('GET /venues', 'venue'): 'trang đầu đọc theo khóa chính, dừng ở LIMIT',
+    ('GET /api/search', 'venue'): 'dựng chỉ mục tìm kiếm (lần đầu của worker, sau đó trong luồng nền)',
+    ('GET /api/search', 'menu_item'): 'dựng chỉ mục tìm kiếm (lần đầu của worker, sau đó trong luồng nền)',
+}
+
+
+def explain(conn, statement, parameters=None):
+    """Kế hoạch thực thi của câu lệnh (câu SQL của driver kèm tham số, hoặc câu lệnh SQLAlchemy):
+    danh sách (mô tả, tên bảng bị quét toàn bộ hoặc None).
+
+    Chỉ tính bảng thật; quét bảng tạm của truy vấn con (anon_1, <derived2>...) thì không.
+    """
+    if not isinstance(statement, str):
+        compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+        parameters = compiled.construct_params()
+        if compiled.positional:
+            parameters = tuple(parameters[name] for name in compiled.positiontup)
+        statement = compiled.string
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        return [(row[3], row[3].split()[1] if row[3].startswith('SCAN ') and ' USING ' not in row[3]
+                 and row[3].split()[1] in db.metadata.tables else None) for row in rows]
+    rows = conn.exec_driver_sql('EXPLAIN ' + statement, parameters).mappings().all()
+    return [(f"{row['table']}: type={row['type']} key={row['key']}",
+             row['table'] if row['type'] == 'ALL' and row['table'] in db.metadata.tables else None) for row in rows]
+
+
+@click.command('check-query-plans')
+@click.option('--database-uri', default=None,
+              help='CSDL nháp để gieo dữ liệu và EXPLAIN (mặc định: một file SQLite tạm). Không trỏ vào CSDL thật.')
+@with_appcontext
+def check_query_plans(database_uri):
+    """Gieo dữ liệu mẫu, chạy các route chính qua test client rồi EXPLAIN đúng các câu SQL chúng gửi đi.
+
+    Trong lúc chạy, app dùng CSDL nháp thay cho mọi CSDL đã cấu hình; cache trong tiến
+    trình (menu, người dùng, chỉ mục tìm kiếm) chỉ chứa dữ liệu nháp và mất khi lệnh kết thúc.
+    """
+    engine, temp_path = _scratch_engine(database_uri)
+    try:
+        db.metadata.create_all(engine)
+        with engine.begin() as conn:
+            _seed_for_plans(conn)
+            if conn.dialect.name == 'sqlite':
+                conn.exec_driver_sql('ANALYZE')
+            requests = route_requests(conn)
+
+        captured, failures = capture_route_sql(engine, requests)
+        failures = [f"Route trả về lỗi, truy vấn của nó chưa được kiểm tra: {failure}" for failure in failures]
+        with engine.connect() as conn:
+            plans = [(route, statement, explain(conn, statement, parameters))
+                     for route, statements in captured.items() for statement, parameters in statements.items()]
+            plans += [(name, str(statement), explain(conn, statement)) for name, statement in background_queries()]
+        route = None
+        for name, statement, plan in plans:
+            if name != route:
+                route = name
+                click.echo(f"{name}:")
+            click.echo(f"    {' '.join(statement.split())[:100]}")
+            for detail, scanned in plan:
+                reason = ALLOWED_SCANS.get((name, scanned))
+                click.echo(f"        {detail}" + (f" (được phép: {reason})" if reason else ''))
+                if scanned and not reason:
+                    failures.append(f"{name}: {detail}")
+        if failures:
+            raise click.ClickException("Kiểm tra kế hoạch truy vấn không đạt:\n" + "\n".join(failures))
+        click.echo(f"{len(plans)} câu SQL của {len(captured)} route và việc nền đều dùng chỉ mục.")
+    finally:
+        engine.dispose()
+        if temp_path:
+            os.remove(temp_path)
+
+
+@click.command('analytics-backfill')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Chỉ tính lại từ ngày này (giờ địa phương); mặc định tính lại toàn bộ.')
+@click.option('--batch-size', default=1000, show_default=True, help='Số dòng đọc mỗi lô.')
+@with_appcontext
+def analytics_backfill(since, batch_size):
+    """Dựng lại bảng số liệu bán hàng tổng hợp từ các đơn hàng đã có (lần lượt trên primary và mọi shard)."""
+    started = time.perf_counter()
+    count = 0
+    for shard in tenant_shards():
+        with shard_scope(shard):
+            count += backfill(db.session, since=since, batch_size=batch_size)
+    click.echo(f"Đã tổng hợp {count} đơn hàng trong {time.perf_counter() - started:.1f} giây.")
+
+
+@click.command('export-orders')
+@click.argument('owner')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv', show_default=True)
+@click.option('--kind', type=click.Choice(EXPORT_KINDS), default='items', show_default=True,
+              help='items: từng món trong từng đơn; daily: tổng theo ngày.')
+@click.option('--date-from', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@click.option('--date-to', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@click.option('--batch-size', default=5000, show_default=True, help='Số dòng đọc mỗi lô.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), required=True)
+@with_appcontext
+def export_orders_command(owner, fmt, kind, date_from, date_to, batch_size, output):
+    """Xuất lịch sử đơn hàng của chủ nhà hàng OWNER (tên đăng nhập) ra file."""
+    owner_id = db.session.scalar(select(User.id).where(User.username == owner, User.is_owner.is_(True)))
+    if owner_id is None:
+        raise click.ClickException(f"Không tìm thấy chủ nhà hàng {owner!r}.")
+    use_owner_shard(owner_id)
+    end = date_to + timedelta(days=1) if date_to else None
+    started = time.perf_counter()
+    try:
+        chunks = export_orders(db.session, owner_id, fmt, kind, date_from, end, batch_size=batch_size)
+        size = 0
+        with open(output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Đã ghi {size} byte vào {output} trong {time.perf_counter() - started:.1f} giây.")
+
+
+@click.command('bulk-import')
+@click.argument('venue_id', type=int)
+@click.argument('kind', type=click.Choice(IMPORT_KINDS))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='Mặc định đoán theo đuôi file.')
+@with_appcontext
+def bulk_import_command(venue_id, kind, path, fmt):
+    """Nhập hàng loạt bàn hoặc món ăn (KIND) cho nhà hàng VENUE_ID từ file CSV/JSON.
+
+    Cache và chỉ mục tìm kiếm của các worker đang chạy nhận dữ liệu mới khi hết hạn TTL.
+    """
+    if db.session.get(Venue, venue_id) is None:
+        raise click.ClickException(f"Không tìm thấy nhà hàng {venue_id}.")
+    use_venue_shard(venue_id)
+    with open(path, 'rb') as f:
+        data = f.read()
+    started = time.perf_counter()
+    try:
+        rows = load_rows(data, fmt or detect_format(path), current_app.config['BULK_IMPORT_MAX_ROWS'])
+        result = import_rows(db.session, venue_id, kind, rows)
+    except BulkImportError as e:
+        for row, message in e.errors:
+            click.echo(f"  dòng {row}: {message}" if row else f"  {message}", err=True)
+        raise click.ClickException("File nhập có lỗi, chưa có dòng nào được lưu.")
+    click.echo(f"Đã thêm {result['inserted']} và cập nhật {len(result['updated'])} dòng "
+               f"trong {time.perf_counter() - started:.2f} giây.")
+
+
+@click.command('replica-sync')
+@with_appcontext
+def replica_sync():
+    """Chép CSDL SQLite primary sang các file replica SQLite (thử định tuyến replica trên máy local).
+
+    Giữa hai lần chạy, replica đứng yên như một replica MySQL bị trễ. Với MySQL,
+    dùng cơ chế sao chép của MySQL thay cho lệnh này.
+    """
+    keys = replica_keys(db.engines)
+    if not keys:
+        raise click.ClickException("Chưa cấu hình replica (DATABASE_REPLICA_URLS).")
+    if any(db.engines[key].dialect.name != 'sqlite' for key in [None, *keys]):
+        raise click.ClickException("Lệnh này chỉ dùng khi primary và các replica đều là SQLite.")
+    source = db.engine.raw_connection()
+    try:
+        for key in keys:
+            target = db.engines[key].raw_connection()
+            try:
+                source.driver_connection.backup(target.driver_connection)
+            finally:
+                target.close()
+            click.echo(f"Đã chép primary sang {key} ({db.engines[key].url.database}).")
+    finally:
+        source.close()
+
+
+@click.command('shard-move')
+@click.argument('target')
+@click.option('--owner', default=None, help='Tên đăng nhập của chủ nhà hàng cần chuyển.')
+@click.option('--venue', 'venue_id', type=int, default=None,
+              help='Hoặc id một nhà hàng: chuyển chủ của nhà hàng đó cùng mọi nhà hàng khác của chủ.')
+@click.option('--wait', type=int, default=None,
+              help='Số giây chờ các worker thấy trạng thái đang chuyển trước khi chép '
+                   '(mặc định: số lớn hơn trong SHARD_DIRECTORY_TTL và MENU_CACHE_TTL).')
+@click.option('--batch-size', default=1000, show_default=True, help='Số dòng chép mỗi lô.')
+@with_appcontext
+def shard_move(target, owner, venue_id, wait, batch_size):
+    """Chuyển bàn, menu, đơn hàng... của một chủ nhà hàng sang shard TARGET ('shard_<n>' hoặc 'primary').
+
+    Các nhà hàng của chủ trả 503 trong lúc chuyển. Các dòng giữ nguyên id ở shard đích,
+    nên link thanh toán, nội dung chuyển khoản và giỏ hàng đang mở vẫn dùng được.
+    """
+    if (owner is None) == (venue_id is None):
+        raise click.UsageError("Chọn một trong --owner hoặc --venue.")
+    if owner is not None:
+        owner_id = db.session.scalar(select(User.id).where(User.username == owner, User.is_owner.is_(True)))
+    else:
+        owner_id = db.session.scalar(select(Venue.user_id).where(Venue.id == venue_id))
+    if owner_id is None:
+        raise click.ClickException("Không tìm thấy chủ nhà hàng.")
+    config = current_app.config
+    if wait is None:
+        wait = max(config['SHARD_DIRECTORY_TTL'], config['MENU_CACHE_TTL'])
+
+    click.echo(f"Chuyển các nhà hàng của chủ {owner_id} sang {target} (chờ {wait} giây trước khi chép)...")
+    started = time.perf_counter()
+    try:
+        counts = move_tenant(owner_id, None if target == 'primary' else target, wait=wait, batch_size=batch_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for table, count in counts.items():
+        click.echo(f"  {table}: {count} dòng")
+    click.echo(f"Đã chuyển sang {target} trong {time.perf_counter() - started:.1f} giây.")
+
+
+def register_commands(app):
+    """Đăng ký các lệnh CLI vào app."""
+    app.cli.add_command(stress_booking)
+    app.cli.add_command(check_query_plans)
+    app.cli.add_command(analytics_backfill)
+    app.cli.add_command(export_orders_command)
+    app.cli.add_command(bulk_import_command)
+    app.cli.add_command(replica_sync)
+    app.cli.add_command(shard_move)
@@ -1,3 +1,200 @@
+import functools
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import g, has_app_context, has_request_context, session as web_session
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+# Khóa SQLALCHEMY_BINDS của các replica chỉ đọc (xem replica_binds trong config.py)
+REPLICA_PREFIX = 'replica_'
+# Khóa SQLALCHEMY_BINDS của các shard chứa dữ liệu nhà hàng (xem shard_binds trong config.py)
+SHARD_PREFIX = 'shard_'
+# Bảng dữ liệu của từng nhà hàng, nằm trên shard của chủ nhà hàng (sharding.py), cùng bảng job:
+# mỗi CSDL có hàng đợi việc nền riêng để việc được xếp trong cùng giao dịch với dữ liệu của nó.
+# Các bảng khác (user, venue, tenant_shard, id_block) luôn ở primary
+SHARDED_TABLES = frozenset({'tables', 'reservation', 'menu_item', 'order', 'order_item', 'order_event',
+                            'venue_sales', 'menu_item_sales', 'job'})
+
+
+class RoutingSession(Session):
+    """Session gửi câu đọc của route @read_only tới một replica, câu ghi tới primary.
+
+    Mỗi request dùng một replica chọn ngẫu nhiên. Sau khi session đã ghi (flush hoặc
+    INSERT/UPDATE/DELETE), các câu đọc tiếp theo của session cũng đi primary; sau
+    request có ghi, trình duyệt đọc từ primary thêm REPLICA_STICKY_SECONDS giây để
+    thấy ngay thay đổi của chính mình (replica có thể trễ).
+
+    Câu SQL trên các bảng SHARDED_TABLES đi tới shard đã chọn bằng sharding.use_shard
+    (tenant ở primary thì vẫn theo quy tắc replica như trên).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            writing = self._flushing or isinstance(clause, UpdateBase)
+            if writing:
+                self.info['wrote'] = True
+                if has_request_context():
+                    g.db_wrote = True
+            if _is_sharded(mapper, clause):
+                shard = _current_shard(self._db.engines)
+                if shard is not None:
+                    return shard
+            if not writing and not self.info.get('wrote'):
+                replica = _request_replica(self._db.engines)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_keys(engines):
+    return [key for key in engines if key and key.startswith(REPLICA_PREFIX)]
+
+
+def shard_keys(engines):
+    return [key for key in engines if key and key.startswith(SHARD_PREFIX)]
+
+
+def _is_sharded(mapper, clause):
+    """Câu SQL có nhắm vào một bảng trong SHARDED_TABLES không (theo mapper ORM hoặc bảng của INSERT/UPDATE/DELETE)."""
+    if mapper is not None:
+        return mapper.local_table.name in SHARDED_TABLES
+    table = clause.table if isinstance(clause, UpdateBase) else None
+    return table is not None and table.name in SHARDED_TABLES
+
+
+def _current_shard(engines):
+    """Engine shard đã chọn cho app context hiện tại, hoặc None nếu dữ liệu ở primary."""
+    if not has_app_context() or not shard_keys(engines):
+        return None
+    if 'db_shard' not in g:
+        # Đọc nhầm primary sẽ trả về kết quả rỗng thay vì báo lỗi, nên bắt buộc chọn shard trước
+        raise RuntimeError("Chưa chọn shard cho truy vấn trên bảng dữ liệu nhà hàng (sharding.use_shard).")
+    return engines[g.db_shard] if g.db_shard is not None else None
+
+
+def _request_replica(engines):
+    """Engine replica cho request hiện tại, hoặc None nếu phải đọc từ primary."""
+    if not has_request_context() or not g.get('db_read_only') or g.get('db_force_primary'):
+        return None
+    if 'db_replica' not in g:
+        keys = replica_keys(engines)
+        sticky = web_session.get('db_primary_until', 0) > time.time() if keys else False
+        g.db_replica = random.choice(keys) if keys and not sticky else None
+    return engines[g.db_replica] if g.db_replica is not None else None
+
+
+def read_only(view):
+    """Route chỉ đọc: câu SELECT của route được phép đi tới replica."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def on_primary(func):
+    """Luôn đọc từ primary trong lúc gọi `func`, kể cả trong route @read_only.
+
+    Dùng cho hàm nạp cache: dữ liệu trễ của replica không bị giữ lại suốt TTL của cache.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not has_request_context():
+            return func(*args, **kwargs)
+        previous = g.get('db_force_primary', False)
+        g.db_force_primary = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            g.db_force_primary = previous
+    return wrapper
+
+
+def init_replica_routing(app):
+    """Ghi nhớ trong session của trình duyệt: sau request có ghi thì đọc từ primary một lúc."""
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get('db_wrote') and replica_keys(app.config.get('SQLALCHEMY_BINDS') or {}):
+            web_session['db_primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # Khởi tạo đối tượng db mà không cần truyền app vào
+
+
+class PoolStats:
+    """Số liệu lấy kết nối từ một pool (mỗi engine một pool) của worker hiện tại."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool đo thời gian chờ mỗi lần lấy kết nối và ghi log khi phải chờ lâu."""
+
+    slow_checkout = float(os.environ.get('DB_POOL_SLOW_CHECKOUT_MS', 100)) / 1000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        # engine.dispose() thay pool bằng pool mới; giữ số liệu đã đo
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            logger.error("Hết thời gian chờ kết nối CSDL (pid %s): %s", os.getpid(), self.status())
+            raise
+        waited = time.perf_counter() - started
+        self.stats.record(waited)
+        if waited > self.slow_checkout:
+            logger.warning("Chờ kết nối CSDL %.1f ms (pid %s): %s", waited * 1000, os.getpid(), self.status())
+        return connection
+
 
-db = SQLAlchemy()  # Khởi tạo đối tượng db mà không cần truyền app vào
+def pool_status(engine):
+    """Tình trạng pool kết nối của worker hiện tại: đang dùng, overflow, thời gian chờ."""
+    pool = engine.pool
+    status = {'pid': os.getpid(), 'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_out=pool.checkedout(), checked_in=pool.checkedin(),
+                      overflow=pool.overflow())
+    if isinstance(pool, TimedQueuePool):
+        status.update(pool.stats.snapshot())
+    return status
@@ -0,0 +1,225 @@
+# events.py
+"""Pub/sub để đẩy sự kiện thời gian thực (Server-Sent Events) tới trình duyệt.
+
+Mỗi worker giữ một bảng subscriber trong bộ nhớ và chia sự kiện tới từng
+kết nối SSE (fan-out). Với nhiều worker gunicorn, đặt EVENT_BROKER=redis:
+sự kiện được publish lên Redis (hoặc máy chủ tương thích Redis) và một luồng
+nền của mỗi worker nhận về rồi fan-out cho các kết nối của worker đó.
+
+Mỗi kết nối SSE giữ một luồng (gthread) hoặc greenlet (gevent) của worker suốt
+thời gian mở, nên mỗi worker chỉ nhận tối đa `max_streams` kết nối; quá số đó
+`try_subscribe` trả None và trang quay về hỏi định kỳ (polling).
+
+Ngoài kết nối SSE, `listen` gắn hàm xử lý vào một kênh (ví dụ để mọi worker
+xóa cache khi dữ liệu đổi); hàm này không chiếm chỗ của kết nối SSE.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Hàng đợi sự kiện của một kết nối SSE."""
+
+    def __init__(self, bus, channel, maxsize):
+        self.channel = channel
+        self.lost = False  # True nếu hàng đợi đầy và đã bỏ sự kiện: client nên tải lại trạng thái
+        self._bus = bus
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.lost = True
+
+    def get(self, timeout=None):
+        """Sự kiện kế tiếp, hoặc None nếu hết thời gian chờ."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBus:
+    """Fan-out trong tiến trình; lớp con có thể chuyển publish qua broker dùng chung."""
+
+    def __init__(self, max_queue=100, max_streams=None):
+        self.max_queue = max_queue
+        self.max_streams = max_streams  # None: không giới hạn; 0: tắt SSE
+        self._subscribers = {}
+        self._listeners = {}  # kênh -> các hàm xử lý sự kiện trong worker
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Bắt đầu nhận sự kiện trong worker hiện tại (gọi lại nhiều lần được); bus trong tiến trình không cần."""
+
+    def listen(self, channel, callback):
+        """Gọi `callback(message)` với mỗi sự kiện của kênh (trong luồng nhận sự kiện, cần xử lý nhanh)."""
+        with self._lock:
+            self._listeners.setdefault(channel, []).append(callback)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def try_subscribe(self, channel):
+        """Như subscribe, nhưng trả None nếu worker đã giữ đủ `max_streams` kết nối."""
+        subscription = Subscription(self, channel, self.max_queue)
+        with self._lock:
+            if self.max_streams is not None and \
+                    sum(len(s) for s in self._subscribers.values()) >= self.max_streams:
+                return None
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, message):
+        self._fanout(channel, message)
+
+    def _fanout(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+            listeners = list(self._listeners.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+        for callback in listeners:
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Lỗi khi xử lý sự kiện của kênh %s", channel)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+class RedisEventBus(EventBus):
+    """Publish qua Redis pub/sub để mọi worker cùng nhận; mỗi worker một luồng nghe nền."""
+
+    def __init__(self, url, prefix='tablehub:', max_queue=100, max_streams=None):
+        super().__init__(max_queue=max_queue, max_streams=max_streams)
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("EVENT_BROKER=redis cần cài gói 'redis' (pip install redis).") from e
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._listener_pid = None
+
+    def start(self):
+        if self._listener_pid != os.getpid():
+            self._ensure_listener()
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def try_subscribe(self, channel):
+        self._ensure_listener()
+        return super().try_subscribe(channel)
+
+    def publish(self, channel, message):
+        # Luồng nghe của chính worker này cũng nhận lại sự kiện, nên không fan-out trực tiếp
+        self._redis.publish(self.prefix + channel, json.dumps(message))
+
+    def _ensure_listener(self):
+        # Khởi động lười trong từng worker (sau khi gunicorn fork)
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, name='event-bus-listener', daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                for item in pubsub.listen():
+                    if item['type'] == 'pmessage':
+                        channel = item['channel'].decode('utf-8')[len(self.prefix):]
+                        self._fanout(channel, json.loads(item['data']))
+            except Exception:
+                logger.exception("Mất kết nối tới event broker, thử lại sau 1 giây")
+                time.sleep(1)
+
+
+def table_channel(venue_id):
+    """Kênh sự kiện thay đổi trạng thái bàn của một nhà hàng."""
+    return f'venue:{venue_id}:tables'
+
+
+def owner_orders_channel(owner_id):
+    """Kênh sự kiện đơn hàng mới / đổi trạng thái của một chủ nhà hàng."""
+    return f'owner:{owner_id}:orders'
+
+
+def create_event_bus(config):
+    """Tạo event bus theo cấu hình EVENT_BROKER ('memory' hoặc 'redis')."""
+    backend = config.get('EVENT_BROKER', 'memory')
+    options = {'max_queue': config.get('EVENT_QUEUE_SIZE', 100),
+               'max_streams': config.get('EVENT_STREAMS_PER_WORKER')}
+    if backend == 'memory':
+        return EventBus(**options)
+    if backend == 'redis':
+        return RedisEventBus(config['EVENT_REDIS_URL'], **options)
+    raise ValueError(f"EVENT_BROKER không hợp lệ: {backend!r}")
+
+
+def sse_event(event, data, event_id=None):
+    """Một khung SSE; trình duyệt gửi lại `event_id` cuối cùng qua header Last-Event-ID khi kết nối lại."""
+    frame = f"event: {event}\n"
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+def sse_stream(subscription, frame, backlog=(), heartbeat=15, max_duration=300):
+    """Sinh các khung SSE từ subscription; đóng sau max_duration giây để trình duyệt tự kết nối lại.
+
+    `frame(message)` chuyển một sự kiện thành khung SSE (None để bỏ qua);
+    `backlog` là các khung gửi trước, ví dụ phần chênh lệch kể từ lần kết nối trước.
+    Gửi comment giữ kết nối mỗi `heartbeat` giây, và sự kiện `reset` khi đã mất
+    sự kiện do client đọc chậm (client nên tải lại trạng thái đầy đủ).
+    """
+    deadline = time.monotonic() + max_duration
+    try:
+        yield 'retry: 3000\n\n'
+        yield from backlog
+        while time.monotonic() < deadline:
+            message = subscription.get(timeout=heartbeat)
+            if subscription.lost:
+                yield sse_event('reset', {})
+                return
+            if message is None:
+                yield ': keep-alive\n\n'
+                continue
+            text = frame(message)
+            if text is not None:
+                yield text
+    finally:
+        subscription.close()
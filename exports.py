@@ -0,0 +1,215 @@
+# exports.py
+"""Xuất lịch sử đơn hàng của chủ nhà hàng ra CSV hoặc Parquet theo luồng.
+
+Dòng (đơn, món) được đọc theo lô bằng con trỏ phía server (stream_results), mỗi
+lô chuyển thành các cột NumPy rồi ghi ngay ra file, nên bộ nhớ chỉ phụ thuộc kích
+thước lô chứ không phụ thuộc số đơn. Báo cáo theo ngày cộng dồn bằng NumPy trên
+từng lô. Parquet cần gói tùy chọn `pyarrow`.
+"""
+import csv
+import io
+
+import numpy as np
+from sqlalchemy import case, select
+
+from analytics import utc_offset
+from models import MenuItem, Order, OrderItem, Venue
+
+EXPORT_FORMATS = ('csv', 'parquet')
+EXPORT_KINDS = ('items', 'daily')
+
+ITEM_COLUMNS = ('order_id', 'created_at_utc', 'venue_id', 'venue', 'customer_id', 'status',
+                'menu_item_id', 'menu_item', 'price', 'quantity', 'amount')
+DAILY_COLUMNS = ('day', 'orders', 'items', 'revenue')
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Xuất Parquet cần cài gói 'pyarrow' (pip install pyarrow).") from e
+    return pyarrow
+
+
+def check_format(fmt):
+    """Báo lỗi sớm (trước khi bắt đầu stream) nếu định dạng không dùng được."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Định dạng xuất không hợp lệ: {fmt!r}")
+    if fmt == 'parquet':
+        _pyarrow()
+
+
+def order_item_batches(session, owner_id, start=None, end=None, batch_size=5000):
+    """Các lô dòng (đơn, món) của chủ nhà hàng theo thứ tự (created_at, id), trong khoảng UTC [start, end)."""
+    # Tên nhà hàng đọc trước: bảng venue ở primary, đơn hàng có thể ở shard khác (sharding.py)
+    venues = dict(session.execute(select(Venue.id, Venue.name).where(Venue.user_id == owner_id)).all())
+    if not venues:
+        return
+    stmt = (select(Order.id, Order.created_at, Order.venue_id, case(venues, value=Order.venue_id),
+                   Order.customer_id, Order.status,
+                   OrderItem.menu_item_id, MenuItem.name, OrderItem.price, OrderItem.quantity)
+            .join(OrderItem, OrderItem.order_id == Order.id)
+            .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+            .where(Order.venue_id.in_(venues))
+            .order_by(Order.created_at, Order.id))
+    if start is not None:
+        stmt = stmt.where(Order.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(Order.created_at < end)
+    result = session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def item_columns(rows):
+    """Chuyển một lô dòng thành các cột (mảng NumPy cho số, list cho chuỗi)."""
+    (order_ids, created_at, venue_ids, venues, customer_ids, statuses,
+     menu_item_ids, menu_items, prices, quantities) = zip(*rows)
+    price = np.array(prices, dtype=np.float64)
+    quantity = np.array(quantities, dtype=np.int64)
+    return {
+        'order_id': np.array(order_ids, dtype=np.int64),
+        'created_at_utc': np.array(created_at, dtype='datetime64[us]'),
+        'venue_id': np.array(venue_ids, dtype=np.int64),
+        'venue': list(venues),
+        'customer_id': np.array(customer_ids, dtype=np.int64),
+        'status': list(statuses),
+        'menu_item_id': np.array(menu_item_ids, dtype=np.int64),
+        'menu_item': list(menu_items),
+        'price': price,
+        'quantity': quantity,
+        'amount': price * quantity,
+    }
+
+
+class DailyTotals:
+    """Cộng dồn số đơn, số món và doanh thu theo ngày (giờ địa phương) trên từng lô cột."""
+
+    def __init__(self, offset):
+        self.offset = np.timedelta64(int(offset.total_seconds()), 's')
+        self.days = {}  # ngày -> [số đơn, số món, doanh thu]
+        self._last_order_id = None
+
+    def add(self, columns):
+        order_ids = columns['order_id']
+        days = (columns['created_at_utc'] + self.offset).astype('datetime64[D]')
+        # Dòng của một đơn nằm liền nhau (sắp theo created_at, id), có thể vắt qua hai lô
+        first_row = np.empty(len(order_ids), dtype=bool)
+        first_row[0] = order_ids[0] != self._last_order_id
+        first_row[1:] = order_ids[1:] != order_ids[:-1]
+        self._last_order_id = order_ids[-1]
+
+        unique_days, index = np.unique(days, return_inverse=True)
+        orders = np.bincount(index, weights=first_row)
+        items = np.bincount(index, weights=columns['quantity'])
+        revenue = np.bincount(index, weights=columns['amount'])
+        for day, o, i, r in zip(unique_days.tolist(), orders, items, revenue):
+            totals = self.days.setdefault(day, [0, 0, 0.0])
+            totals[0] += int(o)
+            totals[1] += int(i)
+            totals[2] += float(r)
+
+    def columns(self):
+        days = sorted(self.days)
+        return {
+            'day': np.array(days, dtype='datetime64[D]'),
+            'orders': np.array([self.days[d][0] for d in days], dtype=np.int64),
+            'items': np.array([self.days[d][1] for d in days], dtype=np.int64),
+            'revenue': np.array([self.days[d][2] for d in days], dtype=np.float64),
+        }
+
+
+def _daily(batches, offset):
+    totals = DailyTotals(offset)
+    for columns in batches:
+        totals.add(columns)
+    yield totals.columns()
+
+
+def _csv_chunks(names, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for columns in batches:
+        values = [columns[name] for name in names]
+        writer.writerows(zip(*(v.tolist() if isinstance(v, np.ndarray) else v for v in values)))
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """File chỉ-ghi giữ các khối bytes vừa ghi, để gửi dần cho client."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _parquet_schema(pa, kind):
+    if kind == 'daily':
+        return pa.schema([('day', pa.date32()), ('orders', pa.int64()), ('items', pa.int64()),
+                          ('revenue', pa.float64())])
+    return pa.schema([
+        ('order_id', pa.int64()), ('created_at_utc', pa.timestamp('us')), ('venue_id', pa.int64()),
+        ('venue', pa.string()), ('customer_id', pa.int64()), ('status', pa.string()),
+        ('menu_item_id', pa.int64()), ('menu_item', pa.string()), ('price', pa.float64()),
+        ('quantity', pa.int64()), ('amount', pa.float64()),
+    ])
+
+
+def _parquet_chunks(kind, batches):
+    pa = _pyarrow()
+    schema = _parquet_schema(pa, kind)
+    sink = _ChunkSink()
+    # Mỗi lô thành một row group, ghi và gửi đi ngay
+    with pa.parquet.ParquetWriter(sink, schema) as writer:
+        for columns in batches:
+            writer.write_table(pa.table({name: columns[name] for name in schema.names}, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
+
+
+def export_orders(session, owner_id, fmt='csv', kind='items', start=None, end=None, batch_size=5000):
+    """Sinh các khối bytes của file xuất (dùng được cho HTTP streaming hoặc ghi ra đĩa).
+
+    kind='items': mỗi dòng là một món trong một đơn; kind='daily': tổng theo ngày.
+    `start`/`end` là giờ địa phương, cùng múi giờ với các ngày trong báo cáo.
+    """
+    check_format(fmt)
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Loại báo cáo không hợp lệ: {kind!r}")
+
+    offset = utc_offset()
+    start = start - offset if start is not None else None
+    end = end - offset if end is not None else None
+    batches = (item_columns(rows) for rows in order_item_batches(session, owner_id, start, end, batch_size))
+    if kind == 'daily':
+        batches = _daily(batches, offset)
+    if fmt == 'csv':
+        return _csv_chunks(ITEM_COLUMNS if kind == 'items' else DAILY_COLUMNS, batches)
+    return _parquet_chunks(kind, batches)
@@ -0,0 +1,58 @@
+# gunicorn.conf.py
+"""Cấu hình gunicorn; chọn chế độ phục vụ bằng biến môi trường GUNICORN_PROFILE:
+
+  sync    - mỗi worker xử lý một request một lúc (chế độ cũ);
+  gthread - mặc định; mỗi worker có GUNICORN_THREADS luồng, chờ MySQL không chặn cả worker;
+  gevent  - cần `pip install gevent`; gunicorn monkey-patch socket nên pymysql (thuần Python)
+            nhường CPU cho request khác trong lúc chờ MySQL.
+
+Kích thước pool kết nối CSDL mặc định theo số request đồng thời của một worker
+(có thể ghi đè bằng DB_POOL_SIZE / DB_MAX_OVERFLOW, xem config.py).
+
+Mỗi kết nối SSE (/tables/<id>/events, /owner/orders/events) chiếm một luồng (gthread)
+hoặc một greenlet (gevent) cho tới EVENT_STREAM_MAX_SECONDS, nên số kết nối SSE mỗi worker
+bị giới hạn (EVENT_STREAMS_PER_WORKER): gthread chỉ dành 1/4 số luồng cho SSE, gevent
+dành một nửa worker_connections, sync tắt SSE; trang vượt giới hạn quay về polling.
+Với nhiều khách mở trang cùng lúc nên dùng gevent.
+"""
+import multiprocessing
+import os
+
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+if profile not in ('sync', 'gthread', 'gevent'):
+    raise RuntimeError(f"GUNICORN_PROFILE không hợp lệ: {profile!r}")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = profile
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.environ.get('GUNICORN_ACCESSLOG')
+
+if profile == 'gevent':
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+    # Hàng trăm greenlet dùng chung một pool nhỏ; greenlet chờ kết nối thay vì mở quá nhiều kết nối MySQL
+    os.environ.setdefault('DB_POOL_SIZE', '10')
+    os.environ.setdefault('DB_MAX_OVERFLOW', '10')
+    os.environ.setdefault('EVENT_STREAMS_PER_WORKER', str(worker_connections // 2))
+elif profile == 'gthread':
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+    threads = int(os.environ.get('GUNICORN_THREADS', 8))
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+    os.environ.setdefault('DB_MAX_OVERFLOW', '2')
+    # Luôn chừa phần lớn luồng cho request thường
+    os.environ.setdefault('EVENT_STREAMS_PER_WORKER', str(threads // 4))
+else:
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+    os.environ.setdefault('DB_POOL_SIZE', '1')
+    os.environ.setdefault('DB_MAX_OVERFLOW', '2')
+    os.environ.setdefault('EVENT_STREAMS_PER_WORKER', '0')
+
+# Giỏ hàng 'memory' (mặc định khi không có CART_REDIS_URL, cùng quy tắc với config.py) nằm
+# riêng trong từng worker: khách sẽ thấy giỏ lúc có lúc mất
+cart_backend = os.environ.get('CART_BACKEND') or ('redis' if os.environ.get('CART_REDIS_URL') else 'memory')
+if cart_backend == 'memory' and workers > 1:
+    raise RuntimeError("Giỏ hàng trong bộ nhớ (CART_BACKEND=memory) chỉ dùng được với WEB_CONCURRENCY=1; "
+                       "khi chạy nhiều worker hãy đặt CART_REDIS_URL (giỏ ở Redis) "
+                       "hoặc CART_BACKEND=cookie (giỏ trong cookie).")
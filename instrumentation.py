@@ -0,0 +1,225 @@
+# instrumentation.py
+"""Đo hiệu năng từng request: thời gian xử lý, số câu SQL và tổng thời gian SQL.
+
+Câu SQL được đếm bằng sự kiện before/after_cursor_execute của SQLAlchemy (mọi
+engine) và cộng vào `g` của request đang chạy. Khi request kết thúc (teardown,
+nên cả request lỗi 500 do exception cũng được ghi), số liệu
+được gộp vào histogram theo route (quy tắc URL, không phải đường dẫn cụ thể)
+để tính p50/p95/p99 và xuất ở dạng văn bản Prometheus. Request vượt ngân sách
+SQL_QUERY_BUDGET câu được ghi log kèm các câu lặp lại nhiều nhất (dấu hiệu N+1).
+
+Số liệu thuộc về worker hiện tại, giống các trang /stats/...
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Mốc histogram (giây / số câu), theo kiểu mốc mặc định của Prometheus
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Histogram mốc cố định: bộ nhớ không đổi dù có bao nhiêu request."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Ô cuối: lớn hơn mốc cuối (+Inf)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Ước lượng phân vị q bằng nội suy tuyến tính trong ô chứa nó (như histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.max
+                lower = self.buckets[i - 1] if i else 0.0
+                return min(lower + (self.buckets[i] - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def cumulative(self):
+        """Các cặp (mốc, số quan sát <= mốc) cho dòng _bucket của Prometheus."""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class RouteStats:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_time = Histogram(DURATION_BUCKETS)
+        self.statuses = Counter()
+        self.over_budget = 0
+
+
+class RequestMetrics:
+    """Histogram thời gian, số câu SQL và thời gian SQL theo (method, route)."""
+
+    def __init__(self, query_budget=20):
+        self.query_budget = query_budget
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method, route, status, duration, queries, sql_time):
+        with self._lock:
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = RouteStats()
+            stats.duration.observe(duration)
+            stats.queries.observe(queries)
+            stats.sql_time.observe(sql_time)
+            stats.statuses[status] += 1
+            stats.over_budget += queries > self.query_budget
+
+    def snapshot(self):
+        """{'METHOD route': {'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'avg_queries', ...}}."""
+        with self._lock:
+            return {
+                f"{method} {route}": {
+                    'count': stats.duration.count,
+                    **{f"p{int(q * 100)}_ms": round(stats.duration.quantile(q) * 1000, 2) for q in QUANTILES},
+                    'max_ms': round(stats.duration.max * 1000, 2),
+                    'avg_queries': round(stats.queries.sum / stats.queries.count, 2),
+                    'max_queries': int(stats.queries.max),
+                    'avg_sql_ms': round(stats.sql_time.sum / stats.sql_time.count * 1000, 2),
+                    'over_budget': stats.over_budget,
+                }
+                for (method, route), stats in sorted(self._routes.items(), key=lambda item: item[0][::-1])
+            }
+
+    def prometheus(self, prefix='tablehub'):
+        """Số liệu ở dạng văn bản Prometheus (text exposition format 0.0.4)."""
+        with self._lock:
+            routes = sorted(self._routes.items(), key=lambda item: item[0][::-1])
+            lines = [f"# HELP {prefix}_http_requests_total Số request đã xử lý.",
+                     f"# TYPE {prefix}_http_requests_total counter"]
+            for (method, route), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'{prefix}_http_requests_total{_labels(method, route, status=status)} {count}')
+
+            for name, attribute, help_text in (
+                    ('http_request_duration_seconds', 'duration', "Thời gian xử lý request."),
+                    ('http_request_sql_queries', 'queries', "Số câu SQL mỗi request."),
+                    ('http_request_sql_seconds', 'sql_time', "Tổng thời gian SQL mỗi request.")):
+                metric = f"{prefix}_{name}"
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                for (method, route), stats in routes:
+                    histogram = getattr(stats, attribute)
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{_labels(method, route, le=_number(bound))} {count}')
+                    lines.append(f'{metric}_sum{_labels(method, route)} {_number(histogram.sum)}')
+                    lines.append(f'{metric}_count{_labels(method, route)} {histogram.count}')
+                # Phân vị ước lượng từ histogram, đọc trực tiếp không cần histogram_quantile()
+                lines += [f"# HELP {metric}_quantile {help_text} (phân vị ước lượng trên worker này)",
+                          f"# TYPE {metric}_quantile gauge"]
+                for (method, route), stats in routes:
+                    histogram = getattr(stats, attribute)
+                    for q in QUANTILES:
+                        lines.append(f'{metric}_quantile{_labels(method, route, quantile=q)} '
+                                     f'{_number(histogram.quantile(q))}')
+
+            lines += [f"# HELP {prefix}_http_requests_over_query_budget_total "
+                      f"Số request chạy quá {self.query_budget} câu SQL.",
+                      f"# TYPE {prefix}_http_requests_over_query_budget_total counter"]
+            for (method, route), stats in routes:
+                lines.append(f'{prefix}_http_requests_over_query_budget_total{_labels(method, route)} '
+                             f'{stats.over_budget}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(method, route, **extra):
+    labels = {'method': method, 'route': route, **extra}
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_app_context() or 'sql_queries' not in g:
+        return
+    started = getattr(context, '_query_started', None)
+    g.sql_queries += 1
+    if started is not None:
+        g.sql_time += time.perf_counter() - started
+    g.sql_statements[statement] += 1
+
+
+def instrument(app, metrics):
+    """Gắn bộ đếm SQL và đo thời gian vào mọi request của app."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_time = 0.0
+        g.sql_statements = Counter()
+
+    @app.after_request
+    def remember_status(response):
+        g.response_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request(exc):
+        if 'request_started' not in g:
+            return
+        duration = time.perf_counter() - g.request_started
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        # Không có response (exception chưa được xử lý) thì client nhận 500
+        status = 500 if exc is not None else g.get('response_status', 500)
+        metrics.observe(request.method, route, status, duration, g.sql_queries, g.sql_time)
+        if g.sql_queries > metrics.query_budget:
+            repeated = ', '.join(f"{count}x {_summarize(statement)}"
+                                 for statement, count in g.sql_statements.most_common(3))
+            logger.warning("%s %s chạy %d câu SQL (ngân sách %d), %.1f ms SQL / %.1f ms tổng; lặp nhiều nhất: %s",
+                           request.method, request.path, g.sql_queries, metrics.query_budget,
+                           g.sql_time * 1000, duration * 1000, repeated)
+
+
+def _summarize(statement):
+    """Lệnh và bảng đầu tiên của câu SQL ("SELECT ... FROM tables"), đủ để nhận ra câu lặp trong log."""
+    words = statement.split()
+    for i, word in enumerate(words[1:-1], 1):
+        if word.upper() in ('FROM', 'INTO'):
+            return f"{words[0].upper()} ... {word.upper()} {words[i + 1]}"
+    return ' '.join(words[:2])
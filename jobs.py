@@ -0,0 +1,183 @@
+# jobs.py
+"""Hàng đợi việc nền lưu trong CSDL (bảng job), chạy bởi worker.py ngoài luồng request.
+
+Request chỉ chèn một dòng Job trong cùng giao dịch với dữ liệu chính (`enqueue`,
+người gọi commit), nên việc nền được xếp hàng khi và chỉ khi giao dịch thành công.
+Khi chia shard, mỗi CSDL có bảng job riêng (dòng Job đi tới shard đang chọn, cùng
+chỗ với dữ liệu chính) và worker.py chạy việc của từng CSDL trong shard_scope.
+Worker lấy việc theo lô bằng một câu UPDATE có điều kiện (nhiều worker không lấy
+trùng việc), chạy từng việc rồi đánh dấu xong trong cùng giao dịch với thay đổi
+của việc đó: việc chạy lại sau lỗi không ghi hai lần. Việc lỗi được thử lại sau
+thời gian chờ tăng dần, hết số lần thử thì chuyển sang 'failed'. Việc 'running'
+quá JOBS_LOCK_TIMEOUT giây (worker chết giữa chừng) được worker khác lấy lại.
+
+JOBS_EAGER=1 chạy việc ngay khi xếp hàng, trong giao dịch của người gọi (khi
+phát triển một tiến trình, không cần chạy worker); khi đó không có dòng Job.
+"""
+import json
+import logging
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+# Tên task -> (hàm xử lý, số lần thử tối đa)
+_TASKS = {}
+
+
+def task(name, max_attempts=5):
+    """Đăng ký hàm `handler(session, payload)` làm task `name`.
+
+    Hàm xử lý không commit: worker commit thay đổi của nó cùng lúc đánh dấu việc xong.
+    """
+    def register(handler):
+        _TASKS[name] = (handler, max_attempts)
+        return handler
+    return register
+
+
+def enqueue(session, name, payload, key=None, delay=0):
+    """Xếp hàng task `name` với `payload` (dict JSON được) trong giao dịch hiện tại (người gọi commit).
+
+    Việc cùng `key` đã có trong bảng thì bỏ qua, nên gọi lại nhiều lần vẫn chỉ chạy một lần.
+    """
+    if name not in _TASKS:
+        raise ValueError(f"Task chưa đăng ký: {name!r}")
+    handler, max_attempts = _TASKS[name]
+    if current_app.config.get('JOBS_EAGER'):
+        handler(session, payload)
+        return
+    now = datetime.utcnow()
+    row = {'name': name, 'payload': json.dumps(payload), 'idempotency_key': key, 'status': 'queued',
+           'attempts': 0, 'max_attempts': max_attempts, 'run_at': now + timedelta(seconds=delay),
+           'created_at': now}
+    if key is None:
+        session.execute(insert(Job), [row])
+    else:
+        session.execute(_insert_ignoring_key(session), [row])
+
+
+def _insert_ignoring_key(session):
+    """INSERT một Job; bỏ qua nếu idempotency_key đã tồn tại."""
+    table = Job.__table__
+    dialect = session.get_bind(mapper=Job.__mapper__).dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(idempotency_key=table.c.idempotency_key)
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        return stmt.on_conflict_do_nothing(index_elements=['idempotency_key'])
+    raise RuntimeError(f"Hàng đợi việc nền chưa hỗ trợ CSDL {dialect!r}")
+
+
+def _claimable(now, lock_timeout):
+    return or_(Job.status == 'queued',
+               and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=lock_timeout)))
+
+
+def due_jobs(now, lock_timeout, limit):
+    """Câu SELECT id các việc đến hạn (kể cả việc của worker đã chết), cũ nhất trước."""
+    return (select(Job.id).where(_claimable(now, lock_timeout), Job.run_at <= now)
+            .order_by(Job.run_at, Job.id).limit(limit))
+
+
+def claim(session, worker_id, limit=50, lock_timeout=300):
+    """Nhận tối đa `limit` việc đến hạn cho worker và commit; trả về các Job đã nhận.
+
+    UPDATE chỉ đổi những dòng vẫn còn nhận được, nên khi hai worker cùng chọn một
+    việc, chỉ một bên ghi được mã nhận của mình lên dòng đó.
+    """
+    now = datetime.utcnow()
+    ids = session.execute(due_jobs(now, lock_timeout, limit)).scalars().all()
+    if not ids:
+        session.commit()
+        return []
+    token = f"{worker_id}/{uuid.uuid4().hex[:8]}"  # Mã riêng của lần nhận này
+    session.execute(update(Job).where(Job.id.in_(ids), _claimable(now, lock_timeout))
+                    .values(status='running', locked_by=token, locked_at=now, attempts=Job.attempts + 1))
+    session.commit()
+    return session.execute(select(Job).where(Job.id.in_(ids), Job.locked_by == token)
+                           .order_by(Job.run_at, Job.id)).scalars().all()
+
+
+def run_job(session, job, retry_delay=5, max_retry_delay=3600):
+    """Chạy một việc đã nhận và commit kết quả; trả về True nếu thành công.
+
+    Lỗi thì hủy thay đổi của việc và xếp hàng lại sau retry_delay x 2^(lần thử - 1)
+    giây (tối đa max_retry_delay), hoặc chuyển sang 'failed' khi hết số lần thử.
+    """
+    job_id, token, name, attempts, max_attempts = job.id, job.locked_by, job.name, job.attempts, job.max_attempts
+    mine = and_(Job.id == job_id, Job.locked_by == token)
+    try:
+        if name not in _TASKS:
+            raise LookupError(f"Task chưa đăng ký: {name!r}")
+        _TASKS[name][0](session, json.loads(job.payload))
+        result = session.execute(update(Job).where(mine).values(
+            status='done', locked_by=None, last_error=None, finished_at=datetime.utcnow()))
+        if result.rowcount != 1:
+            # Quá hạn khóa và đã bị worker khác nhận lại: bỏ kết quả để không ghi hai lần
+            session.rollback()
+            logger.warning("Việc %s (%s) đã bị worker khác nhận lại, bỏ kết quả", job_id, name)
+            return False
+        session.commit()
+        return True
+    except Exception:
+        session.rollback()
+        failed = attempts >= max_attempts
+        delay = min(retry_delay * 2 ** (attempts - 1), max_retry_delay)
+        logger.exception("Việc %s (%s) lỗi ở lần thử %d/%d%s", job_id, name, attempts, max_attempts,
+                         ", bỏ cuộc" if failed else f", thử lại sau {delay} giây")
+        session.execute(update(Job).where(mine).values(
+            status='failed' if failed else 'queued', locked_by=None,
+            run_at=datetime.utcnow() + timedelta(seconds=delay),
+            last_error=traceback.format_exc()[-4000:],
+            finished_at=datetime.utcnow() if failed else None))
+        session.commit()
+        return False
+
+
+def drain(session, worker_id, batch_size=50, lock_timeout=300, retry_delay=5, max_jobs=None, stop=None):
+    """Nhận và chạy từng lô việc đến hạn cho tới khi hết (hoặc đủ `max_jobs`, hoặc `stop()` đúng).
+
+    Trả về (số việc xong, số việc lỗi).
+    """
+    done = failed = 0
+    while max_jobs is None or done + failed < max_jobs:
+        limit = batch_size if max_jobs is None else min(batch_size, max_jobs - done - failed)
+        jobs = claim(session, worker_id, limit, lock_timeout)
+        if not jobs:
+            break
+        for job in jobs:
+            if stop is not None and stop():
+                # Trả các việc chưa chạy về hàng đợi để worker khác lấy ngay
+                session.execute(update(Job).where(Job.locked_by == job.locked_by, Job.status == 'running')
+                                .values(status='queued', locked_by=None, attempts=Job.attempts - 1))
+                session.commit()
+                return done, failed
+            if run_job(session, job, retry_delay):
+                done += 1
+            else:
+                failed += 1
+    return done, failed
+
+
+def purge_finished(session, older_than):
+    """Xóa các việc đã xong trước thời điểm `older_than` (việc 'failed' được giữ để xem lại)."""
+    result = session.execute(delete(Job).where(Job.status == 'done', Job.finished_at < older_than))
+    session.commit()
+    return result.rowcount
+
+
+def job_counts(session):
+    """Số việc theo trạng thái, ví dụ {'queued': 3, 'running': 1, 'done': 120, 'failed': 0}."""
+    counts = dict(session.execute(select(Job.status, func.count()).group_by(Job.status)).all())
+    return {status: counts.get(status, 0) for status in JOB_STATUSES}
@@ -0,0 +1,45 @@
+"""Add reservation table and tables.version
+
+Revision ID: 4b8e2f1c9a37
+Revises: 13721cec1b32
+Create Date: 2026-10-18 09:12:40.512304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8e2f1c9a37'
+down_revision = '13721cec1b32'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reservation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_id', sa.Integer(), nullable=False),
+    sa.Column('customer_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('end_time', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['customer_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['table_id'], ['tables.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_table_window', ['table_id', 'start_time', 'end_time'], unique=False)
+
+    with op.batch_alter_table('tables', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('tables', schema=None) as batch_op:
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_table_window')
+
+    op.drop_table('reservation')
@@ -0,0 +1,53 @@
+"""Add order version and order_event table
+
+Revision ID: 8f4e6b2a7d15
+Revises: 5a8d2c7e1f93
+Create Date: 2026-10-18 16:21:09.604412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f4e6b2a7d15'
+down_revision = '5a8d2c7e1f93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    order = sa.table('order', sa.column('status', sa.String(length=20)))
+    op.execute(order.update().where(order.c.status.is_(None)).values(status='pending'))
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.alter_column('status', existing_type=sa.String(length=20), nullable=False)
+
+    op.create_table('order_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('from_status', sa.String(length=20), nullable=False),
+    sa.Column('to_status', sa.String(length=20), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['actor_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['order_id'], ['order.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('order_event', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_order_event_order_id'), ['order_id'], unique=False)
+        batch_op.create_index('ix_order_event_venue_id', ['venue_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('order_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_event_venue_id')
+        batch_op.drop_index(batch_op.f('ix_order_event_order_id'))
+
+    op.drop_table('order_event')
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.alter_column('status', existing_type=sa.String(length=20), nullable=True)
+        batch_op.drop_column('version')
@@ -0,0 +1,26 @@
+"""Add quantity to order_item
+
+Revision ID: 9d3a6c5e0f21
+Revises: 4b8e2f1c9a37
+Create Date: 2026-10-18 10:02:17.845120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3a6c5e0f21'
+down_revision = '4b8e2f1c9a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('quantity', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.drop_column('quantity')
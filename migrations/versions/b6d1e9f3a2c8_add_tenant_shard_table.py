@@ -0,0 +1,30 @@
+"""Add tenant_shard table
+
+Revision ID: b6d1e9f3a2c8
+Revises: 8f4e6b2a7d15
+Create Date: 2026-10-18 19:41:05.532817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1e9f3a2c8'
+down_revision = '8f4e6b2a7d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tenant_shard',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.String(length=50), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('owner_id')
+    )
+
+
+def downgrade():
+    op.drop_table('tenant_shard')
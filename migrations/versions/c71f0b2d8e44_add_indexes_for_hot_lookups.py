@@ -0,0 +1,84 @@
+"""Add indexes for hot lookup paths
+
+Revision ID: c71f0b2d8e44
+Revises: 9d3a6c5e0f21
+Create Date: 2026-10-18 11:20:03.118972
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71f0b2d8e44'
+down_revision = '9d3a6c5e0f21'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def renumber_duplicate_tables():
+    """Trước đây add_table không chặn số bàn trùng trong một nhà hàng. Giữ số cho bàn có id
+    nhỏ nhất, các bàn trùng còn lại nhận số kế tiếp sau số lớn nhất của nhà hàng (id bàn và
+    các lượt đặt không đổi), để tạo được ràng buộc duy nhất (venue_id, number)."""
+    tables = sa.table('tables', sa.column('id', sa.Integer()), sa.column('number', sa.Integer()),
+                      sa.column('venue_id', sa.Integer()))
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(tables.c.id, tables.c.venue_id, tables.c.number)
+                        .order_by(tables.c.venue_id, tables.c.id)).all()
+    numbers, highest, renumbered = {}, {}, []
+    for row in rows:
+        highest[row.venue_id] = max(highest.get(row.venue_id, row.number), row.number)
+    for row in rows:
+        used = numbers.setdefault(row.venue_id, set())
+        if row.number in used:
+            highest[row.venue_id] += 1
+            renumbered.append((row.id, row.venue_id, row.number, highest[row.venue_id]))
+            used.add(highest[row.venue_id])
+        else:
+            used.add(row.number)
+    for table_id, venue_id, old, new in renumbered:
+        conn.execute(tables.update().where(tables.c.id == table_id).values(number=new))
+        logger.warning("Bàn %s của nhà hàng %s trùng số %s, đổi thành số %s", table_id, venue_id, old, new)
+
+
+def upgrade():
+    with op.batch_alter_table('venue', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_venue_user_id'), ['user_id'], unique=False)
+
+    renumber_duplicate_tables()
+    with op.batch_alter_table('tables', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_tables_venue_number', ['venue_id', 'number'])
+
+    with op.batch_alter_table('menu_item', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_menu_item_venue_id'), ['venue_id'], unique=False)
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.create_index('ix_order_venue_created', ['venue_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_order_customer_created', ['customer_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_order_item_order_id'), ['order_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_order_item_menu_item_id'), ['menu_item_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_order_item_menu_item_id'))
+        batch_op.drop_index(batch_op.f('ix_order_item_order_id'))
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_customer_created')
+        batch_op.drop_index('ix_order_venue_created')
+
+    with op.batch_alter_table('menu_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_menu_item_venue_id'))
+
+    with op.batch_alter_table('tables', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_tables_venue_number', type_='unique')
+
+    with op.batch_alter_table('venue', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_venue_user_id'))
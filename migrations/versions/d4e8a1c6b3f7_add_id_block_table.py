@@ -0,0 +1,28 @@
+"""Add id_block table
+
+Revision ID: d4e8a1c6b3f7
+Revises: b6d1e9f3a2c8
+Create Date: 2026-10-19 09:12:44.218305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e8a1c6b3f7'
+down_revision = 'b6d1e9f3a2c8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('id_block',
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('next_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('id_block')
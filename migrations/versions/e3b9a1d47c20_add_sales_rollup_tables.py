@@ -0,0 +1,51 @@
+"""Add sales rollup tables
+
+Revision ID: e3b9a1d47c20
+Revises: c71f0b2d8e44
+Create Date: 2026-10-18 13:40:12.530417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b9a1d47c20'
+down_revision = 'c71f0b2d8e44'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('venue_sales',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(length=4), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('item_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+    sa.PrimaryKeyConstraint('venue_id', 'granularity', 'bucket')
+    )
+    op.create_table('menu_item_sales',
+    sa.Column('menu_item_id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(length=4), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['menu_item_id'], ['menu_item.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+    sa.PrimaryKeyConstraint('menu_item_id', 'granularity', 'bucket')
+    )
+    with op.batch_alter_table('menu_item_sales', schema=None) as batch_op:
+        batch_op.create_index('ix_menu_item_sales_venue_bucket', ['venue_id', 'granularity', 'bucket'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('menu_item_sales', schema=None) as batch_op:
+        batch_op.drop_index('ix_menu_item_sales_venue_bucket')
+
+    op.drop_table('menu_item_sales')
+    op.drop_table('venue_sales')
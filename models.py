@@ -14,14 +14,39 @@ class Venue(db.Model):
     menu_items = db.relationship('MenuItem', backref='venue', lazy=True)  # Liên kết với MenuItem
 
     # Tham chiếu đến User (mỗi venue thuộc về một user)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
 
 class Table(db.Model):
     __tablename__ = 'tables'  # Đổi tên bảng từ 'table' thành 'tables'
     id = db.Column(db.Integer, primary_key=True)
     number = db.Column(db.Integer, nullable=False)
-    is_available = db.Column(db.Boolean, default=True)
+    is_available = db.Column(db.Boolean, default=True)  # Bàn đang phục vụ (chủ nhà hàng có thể tạm ngưng)
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
+    # Tăng mỗi lần đặt bàn; câu UPDATE có điều kiện trên cột này khóa hàng để tuần tự hóa các lượt đặt
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    reservations = db.relationship('Reservation', backref='table', lazy=True)
+
+    # Số bàn là duy nhất trong một nhà hàng; cũng phục vụ truy vấn danh sách bàn theo nhà hàng
+    __table_args__ = (
+        db.UniqueConstraint('venue_id', 'number', name='uq_tables_venue_number'),
+    )
+
+
+class Reservation(db.Model):
+    """Một lượt đặt bàn trong khung giờ [start_time, end_time)"""
+    __tablename__ = 'reservation'
+    id = db.Column(db.Integer, primary_key=True)
+    table_id = db.Column(db.Integer, db.ForeignKey('tables.id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Phục vụ truy vấn trùng khung giờ theo từng bàn
+    __table_args__ = (
+        db.Index('ix_reservation_table_window', 'table_id', 'start_time', 'end_time'),
+    )
 
 
 class MenuItem(db.Model):
@@ -29,7 +54,7 @@ class MenuItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)  # Tên món ăn
     price = db.Column(db.Float, nullable=False)  # Giá món ăn
-    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)  # Tham chiếu tới nhà hàng
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False, index=True)  # Tham chiếu tới nhà hàng
 
 class User(UserMixin, db.Model):
     __tablename__ = 'user'
@@ -46,20 +71,114 @@ class Order(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
     total_price = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(20), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # Xem ORDER_STATUSES trong orders.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Tăng mỗi lần đổi trạng thái; câu UPDATE kèm version đã đọc phát hiện thay đổi xen giữa (khóa lạc quan)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Bảng đơn của chủ nhà hàng (lọc theo venue, phân trang theo created_at/id) và lịch sử đơn của khách
+    __table_args__ = (
+        db.Index('ix_order_venue_created', 'venue_id', 'created_at', 'id'),
+        db.Index('ix_order_customer_created', 'customer_id', 'created_at'),
+    )
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
-    menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
-    price = db.Column(db.Float, nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False, index=True)
+    price = db.Column(db.Float, nullable=False)  # Đơn giá tại thời điểm đặt
+    quantity = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     # Quan hệ với Order và MenuItem (nếu có)
     order = db.relationship('Order', backref=db.backref('order_items', lazy=True))
     menu_item = db.relationship('MenuItem', backref=db.backref('order_items', lazy=True))
 
 
+class OrderEvent(db.Model):
+    """Một lần chuyển trạng thái đơn; chỉ thêm, không sửa, để màn hình bếp đọc phần mới theo id."""
+    __tablename__ = 'order_event'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
+    from_status = db.Column(db.String(20), nullable=False)
+    to_status = db.Column(db.String(20), nullable=False)
+    version = db.Column(db.Integer, nullable=False)  # Order.version sau lần chuyển này
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # Người chuyển trạng thái
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Đọc các sự kiện sau một id theo từng nhà hàng
+    __table_args__ = (
+        db.Index('ix_order_event_venue_id', 'venue_id', 'id'),
+    )
+
+
+class VenueSales(db.Model):
+    """Doanh thu tổng hợp sẵn của một nhà hàng theo giờ ('hour') hoặc theo ngày ('day')."""
+    __tablename__ = 'venue_sales'
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), primary_key=True)
+    granularity = db.Column(db.String(4), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)  # Đầu giờ / đầu ngày (giờ địa phương)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class MenuItemSales(db.Model):
+    """Số lượng bán và doanh thu tổng hợp sẵn của một món theo giờ hoặc theo ngày."""
+    __tablename__ = 'menu_item_sales'
+    menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), primary_key=True)
+    granularity = db.Column(db.String(4), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # Bảng xếp hạng món bán chạy theo nhà hàng trong một khoảng thời gian
+    __table_args__ = (
+        db.Index('ix_menu_item_sales_venue_bucket', 'venue_id', 'granularity', 'bucket'),
+    )
+
+
+class Job(db.Model):
+    """Một việc nền (xem jobs.py) chờ worker chạy sau khi request đã trả về."""
+    __tablename__ = 'job'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # Tên task đã đăng ký bằng @task
+    payload = db.Column(db.Text, nullable=False)  # Tham số dạng JSON
+    # Cùng một khóa chỉ được xếp hàng một lần (ví dụ 'analytics:order:42')
+    idempotency_key = db.Column(db.String(150), unique=True)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued / running / done / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Chưa chạy trước thời điểm này (backoff)
+    locked_by = db.Column(db.String(100))  # Worker đang chạy việc
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    # Worker lấy các việc đến hạn theo (status, run_at)
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+
+class TenantShard(db.Model):
+    """Shard chứa dữ liệu các nhà hàng của một chủ (xem sharding.py); chủ không có dòng nào ở đây thì ở primary."""
+    __tablename__ = 'tenant_shard'
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    shard = db.Column(db.String(50), nullable=False)  # Khóa bind 'shard_<n>', hoặc 'moving' trong lúc chuyển
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class IdBlock(db.Model):
+    """Id kế tiếp chưa cấp của một bảng dữ liệu nhà hàng, dùng chung cho mọi shard (xem sharding.IdAllocator)."""
+    __tablename__ = 'id_block'
+    table_name = db.Column(db.String(50), primary_key=True)
+    next_id = db.Column(db.Integer, nullable=False)
+
+
 # Chức năng tạo người dùng, sử dụng bcrypt từ app.py
 def create_user(username, password, bcrypt):
     """Hàm tạo người dùng với mật khẩu đã mã hóa"""
@@ -0,0 +1,220 @@
+# orders.py
+"""Tạo đơn hàng (giá lấy từ MenuItem trên server, ghi Order + OrderItem trong một giao dịch)
+và chuyển trạng thái đơn theo vòng đời ORDER_STATUSES."""
+from datetime import datetime
+
+from sqlalchemy import case, func, insert, select, tuple_, update
+from sqlalchemy.orm import selectinload
+
+from analytics import RECORD_ORDER_TASK, record_order
+from database import db
+from jobs import enqueue, task
+from models import MenuItem, Order, OrderEvent, OrderItem
+from pagination import encode_cursor, keyset_page
+from sharding import allocate_ids, assign_ids, owner_venue_ids
+
+# Các trạng thái đơn hàng theo thứ tự phục vụ; đơn chỉ đi tới (có thể bỏ qua bước), không lùi lại
+ORDER_STATUSES = ('pending', 'preparing', 'served', 'paid', 'closed')
+
+
+class OrderError(Exception):
+    """Giỏ hàng không thể chuyển thành đơn hàng."""
+
+
+class OrderConflict(OrderError):
+    """Đơn đã bị đổi trạng thái ở nơi khác giữa lúc đọc và lúc ghi."""
+
+
+def can_transition(current, new):
+    """Trạng thái `new` có đứng sau `current` trong vòng đời đơn không."""
+    if current not in ORDER_STATUSES or new not in ORDER_STATUSES:
+        return False
+    return ORDER_STATUSES.index(new) > ORDER_STATUSES.index(current)
+
+
+def place_order(customer_id, venue_id, quantities):
+    """Tạo đơn hàng từ {menu_item_id: số lượng} và commit một lần; trả về order_payload của đơn.
+
+    Giá từng món được đọc bằng một truy vấn IN trên MenuItem (không tin giá lưu
+    trong cookie), các OrderItem được chèn bằng một lệnh executemany. Các việc
+    sau đơn được xếp hàng cho worker (jobs.py) trong cùng giao dịch, trên cùng CSDL
+    với đơn, nên không làm chậm request và không bị mất khi đơn đã lưu. Payload
+    trả về được dựng từ dữ liệu đã có trước khi commit, không phải đọc lại đơn.
+    """
+    quantities = {int(item_id): int(qty) for item_id, qty in quantities.items() if int(qty) > 0}
+    if not venue_id or not quantities:
+        raise OrderError("Giỏ hàng của bạn trống.")
+
+    prices, names = {}, {}
+    for item_id, price, name in db.session.execute(
+            select(MenuItem.id, MenuItem.price, MenuItem.name)
+            .where(MenuItem.id.in_(quantities), MenuItem.venue_id == venue_id)):
+        prices[item_id], names[item_id] = price, name
+    if len(prices) != len(quantities):
+        raise OrderError("Một số món trong giỏ hàng không còn trong menu của nhà hàng.")
+
+    # Id (khi có shard) được cấp trước lần ghi đầu tiên của giao dịch, xem sharding.allocate_ids
+    order_id, = allocate_ids(db.session, Order, 1)
+    lines = assign_ids(db.session, OrderItem, [
+        {'menu_item_id': item_id, 'price': prices[item_id], 'quantity': qty} for item_id, qty in quantities.items()])
+    try:
+        order = Order(
+            id=order_id,
+            customer_id=customer_id,
+            venue_id=venue_id,
+            total_price=sum(prices[item_id] * qty for item_id, qty in quantities.items()),
+            status='pending',
+            created_at=datetime.utcnow(),
+        )
+        db.session.add(order)
+        db.session.flush()  # Lấy order.id trong cùng giao dịch, chưa commit
+
+        db.session.execute(insert(OrderItem), [{**line, 'order_id': order.id} for line in lines])
+        # Việc sau đơn (số liệu tổng hợp) được xếp hàng trong cùng giao dịch và chạy ở worker
+        enqueue(db.session, RECORD_ORDER_TASK, {'order_id': order.id, 'venue_id': venue_id},
+                key=f'analytics:order:{venue_id}:{order.id}')
+        payload = order_payload(order, [(names[item_id], qty) for item_id, qty in quantities.items()])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return payload
+
+
+@task(RECORD_ORDER_TASK)
+def record_order_sales(session, payload):
+    """Cộng một đơn đã lưu vào rollup doanh thu (worker commit cùng lúc đánh dấu việc xong).
+
+    Việc nằm cùng CSDL với đơn, và worker chạy việc của mỗi CSDL trong shard_scope của nó.
+    """
+    order = session.get(Order, payload['order_id'])
+    if order is None:
+        return  # Đơn đã bị xóa
+    lines = session.execute(select(OrderItem.menu_item_id, OrderItem.price, OrderItem.quantity)
+                            .where(OrderItem.order_id == order.id)).all()
+    record_order(session, order.venue_id, order.created_at, lines)
+
+
+def change_statuses(owner_id, changes, actor_id=None):
+    """Chuyển trạng thái nhiều đơn của chủ nhà hàng bằng một câu UPDATE và commit một lần.
+
+    `changes` là các bộ (order_id, version đã đọc, trạng thái mới). Đơn không thuộc
+    chủ nhà hàng, sai version hoặc chuyển trạng thái không hợp lệ bị bỏ qua và trả về
+    kèm lý do; các đơn còn lại được cập nhật với điều kiện (id, version) vẫn khớp và
+    mỗi lần chuyển được ghi một dòng OrderEvent. Nếu có đơn bị đổi xen giữa lúc đọc
+    và lúc ghi thì không đơn nào được cập nhật và ném OrderConflict.
+
+    Trả về (các lần chuyển đã ghi dạng dict, [(order_id, lý do)]).
+    """
+    current = {row.id: row for row in db.session.execute(
+        select(Order.id, Order.venue_id, Order.status, Order.version)
+        .where(Order.id.in_({order_id for order_id, _, _ in changes}),
+               Order.venue_id.in_(owner_venue_ids(db.session, owner_id))))}
+    accepted, rejected, seen = [], [], set()
+    for order_id, version, status in changes:
+        row = current.get(order_id)
+        if order_id in seen:
+            rejected.append((order_id, "đơn xuất hiện nhiều lần"))
+        elif row is None:
+            rejected.append((order_id, "không tìm thấy đơn"))
+        elif row.version != version:
+            rejected.append((order_id, "đơn vừa được cập nhật ở nơi khác, hãy tải lại"))
+        elif not can_transition(row.status, status):
+            rejected.append((order_id, f"không thể chuyển từ {row.status} sang {status}"))
+        else:
+            accepted.append((row, status))
+        seen.add(order_id)
+    if not accepted:
+        return [], rejected
+
+    now = datetime.utcnow()
+    events = [{'order_id': row.id, 'venue_id': row.venue_id, 'from_status': row.status, 'to_status': status,
+               'version': row.version + 1, 'actor_id': actor_id, 'created_at': now} for row, status in accepted]
+    assign_ids(db.session, OrderEvent, events)
+    try:
+        result = db.session.execute(
+            update(Order)
+            # id IN để CSDL tìm theo khóa chính (SQLite không dùng chỉ mục cho IN theo bộ giá trị)
+            .where(Order.id.in_([row.id for row, _ in accepted]),
+                   tuple_(Order.id, Order.version).in_([(row.id, row.version) for row, _ in accepted]))
+            .values(status=case({row.id: status for row, status in accepted}, value=Order.id),
+                    version=Order.version + 1)
+            .execution_options(synchronize_session=False))
+        if result.rowcount != len(accepted):
+            raise OrderConflict("Một số đơn vừa được cập nhật ở nơi khác, hãy tải lại và thử lại.")
+        db.session.execute(insert(OrderEvent), events)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return events, rejected
+
+
+def event_payload(event):
+    """Dữ liệu một lần chuyển trạng thái gửi cho màn hình bếp."""
+    return {
+        'id': event.id,
+        'order_id': event.order_id,
+        'from_status': event.from_status,
+        'status': event.to_status,
+        'version': event.version,
+        'created_at': event.created_at.isoformat(),
+    }
+
+
+def order_changes(owner_id, after=0, limit=100):
+    """Các lần chuyển trạng thái sau sự kiện `after` ở các nhà hàng của chủ, tăng dần theo id.
+
+    Trả về (danh sách payload, còn_nữa).
+    """
+    events = db.session.execute(
+        select(OrderEvent)
+        .where(OrderEvent.venue_id.in_(owner_venue_ids(db.session, owner_id)), OrderEvent.id > after)
+        .order_by(OrderEvent.id).limit(limit + 1)
+    ).scalars().all()
+    return [event_payload(event) for event in events[:limit]], len(events) > limit
+
+
+def latest_order_event_id(owner_id):
+    """Id sự kiện mới nhất ở các nhà hàng của chủ (0 nếu chưa có), làm mốc đọc tiếp cho trang đơn."""
+    return db.session.scalar(
+        select(func.max(OrderEvent.id))
+        .where(OrderEvent.venue_id.in_(owner_venue_ids(db.session, owner_id)))) or 0
+
+
+def order_cursor(order):
+    """Con trỏ (created_at, id) của đơn, dùng làm id sự kiện trên luồng đơn hàng."""
+    return encode_cursor((order.created_at, order.id))
+
+
+def order_payload(order, items=None):
+    """Dữ liệu một đơn gửi lên luồng đơn hàng của chủ nhà hàng.
+
+    `items` là [(tên món, số lượng)]; mặc định đọc từ order.order_items (đã được tải trước).
+    """
+    if items is None:
+        items = [(item.menu_item.name, item.quantity) for item in order.order_items]
+    return {
+        'id': order.id,
+        'customer_id': order.customer_id,
+        'venue_id': order.venue_id,
+        'created_at': order.created_at.isoformat(),
+        'total_price': order.total_price,
+        'status': order.status,
+        'version': order.version,
+        'items': [{'name': name, 'quantity': quantity} for name, quantity in items],
+        'cursor': order_cursor(order),
+    }
+
+
+def feed_orders(owner_id, after=None, limit=100):
+    """Đơn hàng của chủ nhà hàng sau con trỏ `after`, tăng dần theo (created_at, id).
+
+    Trả về (danh sách payload, còn_nữa). Chỉ đọc phần chênh lệch nên khi trình
+    duyệt kết nối lại, chi phí tỉ lệ với số đơn mới chứ không phải toàn bộ lịch sử.
+    """
+    query = (Order.query.filter(Order.venue_id.in_(owner_venue_ids(db.session, owner_id)))
+             .options(selectinload(Order.order_items).joinedload(OrderItem.menu_item)))
+    orders, next_cursor = keyset_page(query, (Order.created_at, Order.id), cursor=after, limit=limit,
+                                      descending=False)
+    return [order_payload(order) for order in orders], next_cursor is not None
@@ -0,0 +1,88 @@
+# pagination.py
+"""Phân trang keyset (con trỏ) dùng chung cho các route danh sách.
+
+Thay vì OFFSET (chi phí tăng theo số trang), mỗi trang lọc theo giá trị khóa
+của dòng cuối trang trước, nên chi phí mỗi trang luôn cố định nhờ chỉ mục.
+"""
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import and_, or_, select, union_all
+
+
+def encode_cursor(values):
+    """Chuyển bộ giá trị khóa thành chuỗi con trỏ để đặt lên URL."""
+    if values is None:
+        return None
+    return ','.join(v.isoformat() if isinstance(v, datetime) else str(v) for v in values)
+
+
+def decode_cursor(raw, types):
+    """Giải mã con trỏ theo danh sách kiểu; trả về None nếu con trỏ không hợp lệ."""
+    if not raw:
+        return None
+    parts = raw.split(',')
+    if len(parts) != len(types):
+        return None
+    try:
+        return tuple(
+            datetime.fromisoformat(part) if kind is datetime else kind(part)
+            for part, kind in zip(parts, types)
+        )
+    except ValueError:
+        return None
+
+
+def _after(columns, values, descending):
+    """Điều kiện "đứng sau con trỏ" dạng (a < x) OR (a = x AND b < y) ... để dùng được chỉ mục."""
+    column, value = columns[0], values[0]
+    beyond = column < value if descending else column > value
+    if len(columns) == 1:
+        return beyond
+    return or_(beyond, and_(column == value, _after(columns[1:], values[1:], descending)))
+
+
+def keyset_page(query, columns, cursor=None, limit=20, descending=True):
+    """Lấy một trang từ query, trả về (rows, next_cursor).
+
+    next_cursor là None khi không còn trang sau. Lấy dư một dòng để biết còn
+    trang sau hay không mà không cần COUNT(*).
+    """
+    if cursor is not None:
+        query = query.filter(_after(columns, cursor, descending))
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = tuple(getattr(rows[-1], column.key) for column in columns)
+    return rows, next_cursor
+
+
+def first_page_per_group(session, model, group_column, columns, group_ids, limit=20):
+    """Trang đầu của từng nhóm (vd. bàn của từng nhà hàng) trong một truy vấn: {nhóm: (rows, next_cursor)}.
+
+    Mỗi nhóm là một nhánh UNION ALL với ORDER BY ... LIMIT riêng trên chỉ mục
+    (nhóm, cột sắp xếp), nên chi phí bị chặn bởi số nhóm x limit kể cả khi một
+    nhóm có rất nhiều dòng (selectinload sẽ tải toàn bộ). Trang sau của một nhóm
+    lấy bằng keyset_page với next_cursor tương ứng.
+    """
+    pages = {group_id: ([], None) for group_id in group_ids}
+    if not pages:
+        return pages
+    ordering = [column.asc() for column in columns]
+    branches = [select(model.id).where(group_column == group_id).order_by(*ordering).limit(limit + 1)
+                .subquery().select() for group_id in pages]
+    ids = (union_all(*branches) if len(branches) > 1 else branches[0]).subquery()
+    rows = session.execute(
+        select(model).join(ids, model.id == ids.c.id).order_by(group_column, *ordering)
+    ).scalars()
+    for group_id, group_rows in groupby(rows, key=lambda row: getattr(row, group_column.key)):
+        group_rows = list(group_rows)
+        next_cursor = None
+        if len(group_rows) > limit:
+            group_rows = group_rows[:limit]
+            next_cursor = tuple(getattr(group_rows[-1], column.key) for column in columns)
+        pages[group_id] = (group_rows, next_cursor)
+    return pages
@@ -0,0 +1,92 @@
+# passwords.py
+"""Băm và kiểm tra mật khẩu bcrypt trong một pool tiến trình có giới hạn.
+
+Mỗi lần bcrypt tốn hàng chục ms CPU; chạy trong pool tiến trình riêng giúp luồng
+xử lý request (và các request khác trên cùng worker) không bị chặn. Số yêu cầu
+đang chờ bị giới hạn: khi pool quá tải, request bị từ chối nhanh bằng
+PasswordHasherBusy thay vì xếp hàng vô hạn.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """Pool băm mật khẩu đang quá tải."""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verify(hashed, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:  # Mật khẩu quá 72 byte hoặc chuỗi băm hỏng
+        return False
+
+
+def hash_rounds(hashed):
+    """Hệ số chi phí (cost) của chuỗi băm bcrypt dạng $2b$12$..."""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Băm/kiểm tra mật khẩu qua pool tiến trình; workers=0 thì chạy ngay trên luồng hiện tại."""
+
+    def __init__(self, rounds=12, workers=2, max_pending=16, wait_timeout=2.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(rounds=config['BCRYPT_LOG_ROUNDS'], workers=config['PASSWORD_HASH_WORKERS'],
+                   max_pending=config['PASSWORD_HASH_MAX_PENDING'], wait_timeout=config['PASSWORD_HASH_TIMEOUT'])
+
+    def _executor(self):
+        # Tạo pool lười trong từng worker gunicorn (sau khi fork), dùng 'spawn' để
+        # tiến trình con không thừa hưởng kết nối CSDL hay socket của worker
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise PasswordHasherBusy("Quá nhiều yêu cầu đăng nhập/đăng ký đang chờ xử lý.")
+        try:
+            return self._executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Chuỗi băm bcrypt với hệ số chi phí đang cấu hình (ValueError nếu mật khẩu quá 72 byte)."""
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, hashed, password):
+        return self._run(_verify, hashed, password)
+
+    def needs_rehash(self, hashed):
+        """True nếu chuỗi băm dùng hệ số chi phí khác cấu hình hiện tại."""
+        return hash_rounds(hashed) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
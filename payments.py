@@ -0,0 +1,91 @@
+# payments.py
+"""Mã QR chuyển khoản cho từng đơn theo chuẩn VietQR (EMVCo merchant-presented QR).
+
+Payload chứa ngân hàng và số tài khoản nhận, số tiền của đơn và nội dung chuyển
+khoản "<PAYMENT_REFERENCE_PREFIX> <mã nhà hàng> <mã đơn>" (mã nhà hàng cho biết
+shard chứa đơn, xem sharding.py), nên ứng dụng ngân hàng điền sẵn mọi thứ và
+nhân viên đối chiếu được giao dịch với đơn theo nội dung chuyển khoản.
+Ảnh SVG cần gói tùy chọn `segno`; app lưu ảnh trong cache LRU theo nội dung
+(khóa là `payload_digest`), nên tải lại trang thanh toán không render lại.
+"""
+import hashlib
+import io
+import re
+
+# Mã định danh VietQR (NAPAS) và mã dịch vụ "chuyển nhanh tới tài khoản"
+VIETQR_GUID = 'A000000727'
+SERVICE_TO_ACCOUNT = 'QRIBFTTA'
+CURRENCY_VND = '704'
+COUNTRY = 'VN'
+MAX_REFERENCE_LENGTH = 25  # Độ dài nội dung chuyển khoản các ngân hàng chấp nhận
+
+_CRC_TABLE = []
+for _byte in range(256):
+    _crc = _byte << 8
+    for _ in range(8):
+        _crc = ((_crc << 1) ^ 0x1021) if _crc & 0x8000 else _crc << 1
+    _CRC_TABLE.append(_crc & 0xFFFF)
+
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE (đa thức 0x1021, khởi tạo 0xFFFF) mà EMVCo dùng cho trường 63."""
+    crc = 0xFFFF
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC_TABLE[((crc >> 8) ^ byte) & 0xFF]
+    return crc
+
+
+def _field(tag, value):
+    if len(value) > 99:
+        raise ValueError(f"Trường {tag} dài quá 99 ký tự")
+    return f"{tag}{len(value):02d}{value}"
+
+
+def payment_reference(order_id, prefix='TABLEHUB', venue_id=None):
+    """Nội dung chuyển khoản của một đơn, chỉ gồm chữ, số và khoảng trắng (ví dụ 'TABLEHUB 3 42')."""
+    prefix = re.sub(r'[^A-Za-z0-9 ]', '', prefix).strip().upper()
+    ids = f"{venue_id} {order_id}" if venue_id is not None else f"{order_id}"
+    return f"{prefix} {ids}".strip()[:MAX_REFERENCE_LENGTH]
+
+
+def vietqr_payload(bank_bin, account_number, amount, reference, account_name=None):
+    """Chuỗi VietQR động cho một lần chuyển `amount` đồng tới tài khoản, kèm nội dung `reference`."""
+    amount = round(amount)
+    if amount <= 0:
+        raise ValueError("Số tiền thanh toán phải lớn hơn 0")
+    beneficiary = _field('00', bank_bin) + _field('01', account_number)
+    payload = (
+        _field('00', '01')  # Phiên bản payload
+        + _field('01', '12')  # 12: mã động, dùng cho một giao dịch
+        + _field('38', _field('00', VIETQR_GUID) + _field('01', beneficiary) + _field('02', SERVICE_TO_ACCOUNT))
+        + _field('53', CURRENCY_VND)
+        + _field('54', str(amount))
+        + _field('58', COUNTRY)
+        + (_field('59', account_name[:25]) if account_name else '')
+        + _field('62', _field('08', reference))
+        + '6304'
+    )
+    return payload + f"{crc16(payload.encode('utf-8')):04X}"
+
+
+def order_qr_payload(order, config):
+    """Payload VietQR của một đơn theo tài khoản nhận trong cấu hình PAYMENT_*."""
+    return vietqr_payload(config['PAYMENT_BANK_BIN'], config['PAYMENT_ACCOUNT_NUMBER'], order.total_price,
+                          payment_reference(order.id, config['PAYMENT_REFERENCE_PREFIX'], order.venue_id),
+                          config.get('PAYMENT_ACCOUNT_NAME'))
+
+
+def payload_digest(payload):
+    """Khóa cache theo nội dung: cùng payload luôn cho cùng ảnh."""
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def render_qr_svg(payload, scale=6, border=4):
+    """Ảnh SVG (bytes) của mã QR."""
+    try:
+        import segno
+    except ImportError as e:
+        raise RuntimeError("Tạo mã QR thanh toán cần cài gói 'segno' (pip install segno).") from e
+    out = io.BytesIO()
+    segno.make(payload, error='m', micro=False).save(out, kind='svg', scale=scale, border=border, xmldecl=False)
+    return out.getvalue()
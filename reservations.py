@@ -0,0 +1,81 @@
+# reservations.py
+"""Đặt bàn theo khung giờ, an toàn khi nhiều worker cùng đặt một bàn.
+
+Mỗi lượt đặt chạy trong một giao dịch:
+  1. UPDATE có điều kiện trên hàng `tables` (tăng `version`) -> giữ khóa ghi
+     của bàn đó (row lock trên MySQL/InnoDB, write lock trên SQLite), nên các
+     lượt đặt cùng bàn phải xếp hàng;
+  2. kiểm tra trùng khung giờ bằng SELECT ... FOR UPDATE: trên InnoDB (REPEATABLE
+     READ), SELECT thường đọc theo snapshot chụp từ truy vấn đầu tiên của giao dịch
+     (ví dụ lúc route tải bàn), nên sau khi chờ khóa xong vẫn không thấy lượt đặt
+     worker kia vừa commit; đọc có khóa luôn đọc bản mới nhất;
+  3. chèn Reservation rồi commit, nhả khóa.
+"""
+from sqlalchemy import select, update
+
+from models import Table, Reservation
+from sharding import allocate_ids
+
+
+class BookingError(Exception):
+    """Không thể đặt bàn (bàn không tồn tại, tạm ngưng hoặc khung giờ đã có người đặt)."""
+
+
+def overlaps(start, end):
+    """Điều kiện SQL: Reservation giao với khung giờ [start, end)."""
+    return (Reservation.start_time < end) & (Reservation.end_time > start)
+
+
+def reserve_table(session, table_id, customer_id, start, end):
+    """Đặt bàn `table_id` trong khung [start, end) và commit; lỗi thì rollback và ném BookingError."""
+    if start >= end:
+        raise BookingError("Khung giờ không hợp lệ.")
+
+    # Id (khi có shard) phải cấp trước câu UPDATE giữ khóa, xem sharding.allocate_ids
+    reservation_id, = allocate_ids(session, Reservation, 1)
+    try:
+        locked = session.execute(
+            update(Table)
+            .where(Table.id == table_id, Table.is_available.is_(True))
+            .values(version=Table.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if locked.rowcount == 0:
+            raise BookingError("Bàn không tồn tại hoặc đang tạm ngưng phục vụ.")
+
+        clash = session.execute(
+            select(Reservation.id).where(Reservation.table_id == table_id, overlaps(start, end)).limit(1)
+            .with_for_update()
+        ).first()
+        if clash is not None:
+            raise BookingError("Bàn đã được đặt trong khung giờ này.")
+
+        reservation = Reservation(id=reservation_id, table_id=table_id, customer_id=customer_id,
+                                  start_time=start, end_time=end)
+        session.add(reservation)
+        session.commit()
+        return reservation
+    except Exception:
+        session.rollback()
+        raise
+
+
+def booked_table_ids(session, venue_id, start, end):
+    """Tập id các bàn của venue đã có người đặt giao với khung [start, end) — một truy vấn có chỉ mục."""
+    rows = session.execute(
+        select(Reservation.table_id)
+        .join(Table, Table.id == Reservation.table_id)
+        .where(Table.venue_id == venue_id, overlaps(start, end))
+        .distinct()
+    )
+    return {table_id for (table_id,) in rows}
+
+
+def find_double_bookings(session):
+    """Các cặp Reservation trùng khung giờ trên cùng một bàn (dùng để kiểm tra, kỳ vọng rỗng)."""
+    other = Reservation.__table__.alias('other')
+    return session.execute(
+        select(Reservation.id, other.c.id)
+        .join(other, (other.c.table_id == Reservation.table_id) & (other.c.id > Reservation.id))
+        .where(other.c.start_time < Reservation.end_time, other.c.end_time > Reservation.start_time)
+    ).all()
@@ -0,0 +1,346 @@
+# search.py
+"""Tìm kiếm nhà hàng (tên, địa chỉ) và món ăn (tên) bằng chỉ mục đảo ngược trong tiến trình.
+
+Văn bản được chuẩn hóa bỏ dấu tiếng Việt ("Phở Hà Nội" -> "pho ha noi") nên gõ có
+dấu hay không dấu đều khớp. Từ cuối của câu tìm khớp theo tiền tố (gõ "bu" ra
+"bún", "bún bò"): danh sách từ được giữ đã sắp xếp để tra tiền tố bằng bisect.
+Khi tìm, danh sách tài liệu của mỗi từ được chuyển thành mảng NumPy (giữ lại tới
+lần ghi kế tiếp) để giao, tính điểm và xếp hạng mà không lặp Python trên từng tài liệu.
+
+Các route ghi cập nhật chỉ mục của worker hiện tại ngay; worker khác nhận thay đổi
+khi chỉ mục được dựng lại từ CSDL sau SEARCH_INDEX_TTL. Việc dựng lại chạy trong
+một luồng nền (mỗi worker một luồng một lúc), request vẫn tìm trên bản cũ; chỉ lần
+dựng đầu tiên chạy ngay trong request vì chưa có bản nào để dùng.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+
+from database import db
+from models import MenuItem, Venue
+from sharding import shard_scope, tenant_shards
+
+KINDS = ('venue', 'menu_item')
+
+# Trọng số theo trường: khớp tên quan trọng hơn khớp địa chỉ
+_FIELD_WEIGHTS = {'name': 3, 'location': 1}
+_EXACT_BONUS = 2            # Từ khớp nguyên vẹn (không chỉ khớp tiền tố)
+_FIRST_WORD_BONUS = 5       # Tên bắt đầu bằng từ đầu tiên của câu tìm
+_MIN_PREFIX = 2             # Tiền tố ngắn hơn chỉ khớp nguyên từ, tránh gộp hàng nghìn từ
+_MAX_PREFIX_TERMS = 200
+_RANKED = 100               # Số kết quả đầu được xếp hạng và giữ lại cho các trang kế tiếp
+_RESULT_CACHE_SIZE = 1024   # Số câu tìm gần đây được giữ thứ hạng
+
+_WORD = re.compile(r'\w+')
+_NO_IDS = np.empty(0, dtype=np.int64)
+
+
+def fold(text):
+    """Chữ thường, bỏ dấu tiếng Việt (kể cả đ -> d)."""
+    text = unicodedata.normalize('NFD', text.lower().replace('đ', 'd').replace('Đ', 'd'))
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    return _WORD.findall(fold(text or ''))
+
+
+def _sorted_arrays(mapping):
+    """{số thứ tự: giá trị} -> (mảng số thứ tự tăng dần, mảng giá trị tương ứng)."""
+    ids = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+    values = np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))
+    order = np.argsort(ids)
+    return ids[order], values[order]
+
+
+class _IndexData:
+    """Một bản chỉ mục. Tài liệu được đánh số thứ tự liên tục để làm chỉ số mảng NumPy."""
+
+    def __init__(self):
+        self.ids = {}               # (loại, id) -> số thứ tự
+        self.keys = []              # số thứ tự -> (loại, id)
+        self.docs = {}              # số thứ tự -> dữ liệu trả về cho client
+        self.terms = {}             # số thứ tự -> ({từ: trọng số}, từ đầu tiên của tên)
+        self.kinds = array('b')     # số thứ tự -> vị trí loại trong KINDS
+        self.lengths = array('i')   # số thứ tự -> độ dài tên, để xếp tên ngắn lên trước khi cùng điểm
+        self.postings = {}          # từ -> {số thứ tự: trọng số}
+        self.first_words = {}       # từ -> {số thứ tự} của các tài liệu có tên bắt đầu bằng từ đó
+        self.vocabulary = []        # các từ, đã sắp xếp, để tra tiền tố
+        self.arrays = {}            # (dạng, từ/tiền tố, ...) -> mảng NumPy đã dựng, giữ tới khi từ đó thay đổi
+        self.results = OrderedDict()  # (các từ, loại) -> (tổng, [(khóa, điểm)]) của các câu tìm gần đây
+
+    # --- Ghi ---
+
+    def add(self, key, doc, fields):
+        idx = self.ids.get(key)
+        if idx is None:
+            idx = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.kinds.append(KINDS.index(key[0]))
+            self.lengths.append(0)
+        else:
+            self._unindex(idx)
+        terms = {}
+        for field, text in fields.items():
+            for token in tokenize(text):
+                terms[token] = max(terms.get(token, 0), _FIELD_WEIGHTS[field])
+        for token, weight in terms.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                bisect.insort(self.vocabulary, token)
+            postings[idx] = weight
+        name = tokenize(fields['name'])
+        first_word = name[0] if name else None
+        if first_word is not None:
+            self.first_words.setdefault(first_word, set()).add(idx)
+        self.terms[idx] = (terms, first_word)
+        self.lengths[idx] = len(fold(fields['name']))
+        self.docs[idx] = doc
+        self._invalidate(terms)
+
+    def _unindex(self, idx):
+        terms, first_word = self.terms.pop(idx, ({}, None))
+        self._invalidate(terms)
+        for token in terms:
+            postings = self.postings[token]
+            postings.pop(idx, None)
+            if not postings:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+        if first_word is not None:
+            self.first_words[first_word].discard(idx)
+
+    def remove(self, key):
+        idx = self.ids.pop(key, None)
+        if idx is not None:
+            self._unindex(idx)
+            del self.docs[idx]
+
+    def _invalidate(self, tokens):
+        """Bỏ các mảng NumPy của những từ (và tiền tố của chúng) vừa thêm/gỡ tài liệu; giữ mảng của từ khác."""
+        self.results.clear()
+        if not tokens or not self.arrays:
+            return
+        stale = [key for key in self.arrays if any(token.startswith(key[1]) for token in tokens)]
+        for key in stale:
+            del self.arrays[key]
+
+    # --- Tìm ---
+
+    def _prefix_terms(self, token, limit=_MAX_PREFIX_TERMS):
+        start = bisect.bisect_left(self.vocabulary, token)
+        terms = []
+        for term in self.vocabulary[start:start + limit if limit else None]:
+            if not term.startswith(token):
+                break
+            terms.append(term)
+        return terms
+
+    def _term(self, token):
+        """(số thứ tự, điểm) của các tài liệu chứa đúng từ `token`."""
+        cached = self.arrays.get(('term', token))
+        if cached is None:
+            ids, weights = _sorted_arrays(self.postings.get(token, {}))
+            cached = self.arrays[('term', token)] = (ids, weights + _EXACT_BONUS)
+        return cached
+
+    def _prefix(self, token, limit=_MAX_PREFIX_TERMS):
+        """(số thứ tự, điểm cao nhất) của các tài liệu chứa một từ bắt đầu bằng `token`."""
+        cached = self.arrays.get(('prefix', token, limit))
+        if cached is None:
+            terms = self._prefix_terms(token, limit)
+            if not terms:
+                return _NO_IDS, _NO_IDS
+            parts = [self._term(term) for term in terms]
+            ids = np.concatenate([p[0] for p in parts])
+            scores = np.concatenate([p[1] if term == token else p[1] - _EXACT_BONUS
+                                     for p, term in zip(parts, terms)])
+            # Tài liệu khớp nhiều từ cùng tiền tố chỉ giữ điểm cao nhất
+            order = np.lexsort((-scores, ids))
+            ids, scores = ids[order], scores[order]
+            first = np.ones(len(ids), dtype=bool)
+            first[1:] = ids[1:] != ids[:-1]
+            cached = self.arrays[('prefix', token, limit)] = (ids[first], scores[first])
+        return cached
+
+    def _starting_with(self, token, prefix):
+        """Số thứ tự (tăng dần) của các tài liệu có tên bắt đầu bằng từ `token` (hoặc từ có tiền tố `token`)."""
+        cache_key = ('first', token, prefix)
+        cached = self.arrays.get(cache_key)
+        if cached is None:
+            terms = self._prefix_terms(token) if prefix else [token]
+            ids = set().union(*(self.first_words.get(term, ()) for term in terms))
+            cached = self.arrays[cache_key] = np.sort(np.fromiter(ids, dtype=np.int64, count=len(ids)))
+        return cached
+
+    def rank(self, tokens, kind, limit):
+        """(tổng số kết quả, tối đa `limit` cặp (khóa, điểm) điểm cao nhất) của câu tìm đã tách từ."""
+        last = tokens[-1]
+        # Từ cuối quá ngắn (1 ký tự): không tính điểm, chỉ giữ kết quả có từ bắt đầu bằng nó
+        short_prefix = len(last) < _MIN_PREFIX and len(tokens) > 1
+        words = tokens[:-1] if short_prefix else tokens
+
+        # Mọi từ đều phải khớp (AND); từ cuối khớp theo tiền tố vì người dùng đang gõ dở
+        ids = scores = None
+        for i, token in enumerate(words):
+            prefix = i == len(words) - 1 and not short_prefix and len(token) >= _MIN_PREFIX
+            token_ids, token_scores = self._prefix(token) if prefix else self._term(token)
+            if ids is None:
+                ids, scores = token_ids, token_scores
+            else:
+                ids, a, b = np.intersect1d(ids, token_ids, assume_unique=True, return_indices=True)
+                scores = scores[a] + token_scores[b]
+        if kind:
+            keep = np.frombuffer(self.kinds, dtype=np.int8)[ids] == KINDS.index(kind)
+            ids, scores = ids[keep], scores[keep]
+        if short_prefix:
+            keep = np.isin(ids, self._prefix(last, limit=None)[0], assume_unique=True)
+            ids, scores = ids[keep], scores[keep]
+
+        starts = self._starting_with(tokens[0], prefix=len(tokens) == 1 and len(tokens[0]) >= _MIN_PREFIX)
+        scores = scores + _FIRST_WORD_BONUS * np.isin(ids, starts, assume_unique=True)
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)[ids]
+        # Điểm giảm dần, rồi tên ngắn (sát câu tìm hơn) trước, rồi theo thứ tự thêm vào
+        top = np.lexsort((ids, lengths, -scores))[:limit]
+        return len(ids), [(self.keys[idx], score) for idx, score in zip(ids[top].tolist(), scores[top].tolist())]
+
+
+def _replay(data, change):
+    if change[0] == 'add':
+        data.add(*change[1:])
+    else:
+        data.remove(change[1])
+
+
+class SearchIndex:
+    """Chỉ mục tìm kiếm dùng chung trong worker; khóa tài liệu là (loại, id)."""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.built_at = None
+        self._data = _IndexData()
+        self._lock = threading.RLock()
+        self._rebuilding = False
+        self._pending = None  # Các thay đổi ghi trong lúc dựng lại, áp lên chỉ mục mới trước khi thay
+
+    # --- Ghi ---
+
+    def upsert_venue(self, venue_id, name, location):
+        doc = {'type': 'venue', 'id': venue_id, 'name': name, 'location': location}
+        self._apply(('add', ('venue', venue_id), doc, {'name': name, 'location': location}))
+
+    def upsert_menu_item(self, item_id, name, price, venue_id, venue_name=None):
+        doc = {'type': 'menu_item', 'id': item_id, 'name': name, 'price': price,
+               'venue_id': venue_id, 'venue_name': venue_name}
+        # Khóa gồm cả nhà hàng, như URL của món (nhà hàng chọn shard, xem sharding.py)
+        self._apply(('add', ('menu_item', (venue_id, item_id)), doc, {'name': name}))
+
+    def remove(self, kind, doc_id):
+        self._apply(('remove', (kind, doc_id)))
+
+    def _apply(self, change):
+        with self._lock:
+            _replay(self._data, change)
+            if self._pending is not None:  # Bản đang dựng có thể đã đọc CSDL trước thay đổi này
+                self._pending.append(change)
+
+    # --- Dựng lại từ CSDL ---
+
+    def rebuild(self, session=None):
+        """Dựng chỉ mục mới từ CSDL rồi thay thế chỉ mục cũ (tìm kiếm vẫn chạy trong lúc dựng)."""
+        session = session or db.session
+        with self._lock:
+            if self._pending is None:
+                self._pending = []
+        fresh = _IndexData()
+        venue_names = {}
+        for venue_id, name, location in session.execute(select(Venue.id, Venue.name, Venue.location)):
+            venue_names[venue_id] = name
+            fresh.add(('venue', venue_id), {'type': 'venue', 'id': venue_id, 'name': name, 'location': location},
+                      {'name': name, 'location': location})
+        for shard in tenant_shards():
+            with shard_scope(shard):
+                rows = session.execute(select(MenuItem.id, MenuItem.name, MenuItem.price, MenuItem.venue_id)
+                                       .execution_options(yield_per=5000))
+                for item_id, name, price, venue_id in rows:
+                    fresh.add(('menu_item', (venue_id, item_id)),
+                              {'type': 'menu_item', 'id': item_id, 'name': name, 'price': price,
+                               'venue_id': venue_id, 'venue_name': venue_names.get(venue_id)},
+                              {'name': name})
+        with self._lock:
+            for change in self._pending:
+                _replay(fresh, change)
+            self._pending = None
+            self._data = fresh
+            self.built_at = time.monotonic()
+
+    def ensure_fresh(self, session=None):
+        """Dựng chỉ mục lần đầu (ngay trong request), hoặc bắt đầu dựng lại trong luồng nền khi hết hạn TTL."""
+        if self.built_at is not None and time.monotonic() - self.built_at < self.ttl:
+            return
+        with self._lock:
+            if self._rebuilding or (self.built_at is not None and time.monotonic() - self.built_at < self.ttl):
+                return
+            if self.built_at is None:  # Lần đầu: các luồng khác chờ thay vì trả kết quả rỗng
+                self.rebuild(session)
+                return
+            self._rebuilding = True
+            self._pending = []
+        threading.Thread(target=self._rebuild_in_background, args=(current_app._get_current_object(),),
+                         name='search-index-rebuild', daemon=True).start()
+
+    def _rebuild_in_background(self, app):
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception:
+            app.logger.exception('Dựng lại chỉ mục tìm kiếm thất bại, thử lại sau TTL')
+            with self._lock:
+                self._pending = None
+                self.built_at = time.monotonic()  # Dùng tiếp bản cũ thêm một chu kỳ TTL
+        finally:
+            self._rebuilding = False
+
+    # --- Tìm ---
+
+    def search(self, query, kind=None, page=1, per_page=20):
+        """(tổng số kết quả, các tài liệu của trang `page`) xếp theo điểm giảm dần.
+
+        Thứ hạng của các câu tìm gần đây được giữ lại (xóa khi chỉ mục thay đổi),
+        nên gõ lại hay chuyển trang chỉ tốn một lần tra dict.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return 0, []
+        cache_key = (tuple(tokens), kind)
+        offset = (page - 1) * per_page
+        needed = offset + per_page
+        with self._lock:
+            data = self._data
+            ranked = data.results.get(cache_key)
+            if ranked is not None and (needed <= len(ranked[1]) or ranked[0] == len(ranked[1])):
+                data.results.move_to_end(cache_key)
+            else:
+                ranked = data.rank(tokens, kind, max(_RANKED, needed))
+                if needed <= _RANKED:  # Không giữ thứ hạng của các trang sâu (hiếm gặp)
+                    data.results[cache_key] = ranked
+                    while len(data.results) > _RESULT_CACHE_SIZE:
+                        data.results.popitem(last=False)
+            total, top = ranked
+            return total, [dict(data.docs[data.ids[key]], score=score) for key, score in top[offset:needed]]
+
+    def stats(self):
+        with self._lock:
+            return {'documents': len(self._data.docs), 'terms': len(self._data.vocabulary),
+                    'cached_queries': len(self._data.results),
+                    'age': None if self.built_at is None else round(time.monotonic() - self.built_at, 1),
+                    'ttl': self.ttl}
@@ -0,0 +1,365 @@
+# sharding.py
+"""Chia dữ liệu nhà hàng ra nhiều CSDL (shard) theo chủ nhà hàng.
+
+Bảng dùng chung (user, venue, tenant_shard, id_block) luôn ở primary. Các bảng
+trong database.SHARDED_TABLES (bàn, đặt bàn, menu, đơn, số liệu bán hàng) của mọi
+nhà hàng cùng một chủ nằm chung một shard, nên mỗi trang của chủ nhà hàng chỉ đọc
+một CSDL. Mỗi CSDL có bảng job riêng: việc nền của một đơn được xếp trong cùng
+giao dịch với đơn, và worker.py chạy việc của từng CSDL. Bảng tenant_shard ghi chủ nào ở shard nào; chủ không có dòng nào ở đó thì ở
+primary (như khi chưa chia shard). Mỗi request chọn shard theo venue_id trong URL,
+nếu không có thì theo chủ nhà hàng đang đăng nhập; route còn lại (giỏ hàng) và
+việc nền gọi use_venue_shard. RoutingSession (database.py) gửi câu SQL trên các
+bảng đó tới shard đã chọn.
+
+Khi có shard, id các dòng được IdAllocator cấp từ bảng id_block ở primary nên duy
+nhất trên mọi CSDL: `flask shard-move` chép nguyên các dòng (giữ id) sang shard
+khác, đổi tenant_shard rồi xóa ở shard cũ, nên link thanh toán và nội dung chuyển
+khoản đã phát hành vẫn trỏ đúng đơn. URL của khách vẫn kèm venue_id để chọn shard.
+Id phải được cấp trước lần ghi đầu tiên của giao dịch (allocate_ids / assign_ids,
+hoặc tự động khi flush): với primary SQLite, giao dịch đã ghi giữ khóa cả file nên
+kết nối cấp id riêng sẽ phải chờ chính nó.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_login import current_user
+from sqlalchemy import MetaData, delete, event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from cache import TTLCache
+from database import SHARDED_TABLES, RoutingSession, db, on_primary, shard_keys
+from models import IdBlock, Job, TenantShard, Venue
+
+MOVING = 'moving'  # tenant_shard.shard trong lúc `flask shard-move` chép dữ liệu của chủ nhà hàng
+_UNSET = object()
+
+# Thứ tự chép (bảng cha trước). Bảng không có cột venue_id được chọn theo bảng cha:
+# bảng -> (cột tham chiếu, bảng cha)
+_MOVE_PLAN = {
+    'tables': None,
+    'reservation': ('table_id', 'tables'),
+    'menu_item': None,
+    'order': None,
+    'order_item': ('order_id', 'order'),
+    'order_event': None,
+    'venue_sales': None,
+    'menu_item_sales': None,
+}
+# Các bảng có id tự tăng cần duy nhất trên mọi CSDL (bảng số liệu dùng khóa tự nhiên)
+ID_TABLES = ('tables', 'reservation', 'menu_item', 'order', 'order_item', 'order_event')
+
+
+class ShardUnavailable(Exception):
+    """Dữ liệu của chủ nhà hàng đang được chuyển sang shard khác."""
+
+
+class ShardDirectory:
+    """Chủ nhà hàng / nhà hàng -> khóa bind của shard (None: primary), đọc từ tenant_shard và cache theo TTL.
+
+    Sau `flask shard-move`, các worker khác thấy shard mới khi mục trong cache hết hạn.
+    """
+
+    def __init__(self, maxsize=4096, ttl=30):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def owner_shard(self, owner_id):
+        return self._lookup(('owner', owner_id), lambda: _load_owner_shard(owner_id))
+
+    def venue_shard(self, venue_id):
+        return self._lookup(('venue', venue_id), lambda: _load_venue_shard(venue_id))
+
+    def _lookup(self, key, loader):
+        # Bọc trong tuple để cache được cả None (chủ nhà hàng ở primary)
+        shard, = self._cache.get_or_load(key, lambda: (loader(),))
+        if shard == MOVING:
+            raise ShardUnavailable("Dữ liệu nhà hàng đang được bảo trì, vui lòng thử lại sau ít phút.")
+        return shard
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+@on_primary
+def _load_owner_shard(owner_id):
+    return db.session.scalar(select(TenantShard.shard).where(TenantShard.owner_id == owner_id))
+
+
+@on_primary
+def _load_venue_shard(venue_id):
+    return db.session.scalar(select(TenantShard.shard).join(Venue, Venue.user_id == TenantShard.owner_id)
+                             .where(Venue.id == venue_id))
+
+
+def sharding_enabled():
+    return bool(shard_keys(db.engines))
+
+
+def tenant_shards():
+    """Mọi nơi có thể chứa dữ liệu nhà hàng: primary (None) rồi các shard."""
+    return [None, *shard_keys(db.engines)]
+
+
+def use_shard(shard):
+    """Các câu SQL tiếp theo trên bảng dữ liệu nhà hàng (trong app context hiện tại) đi tới `shard`."""
+    g.db_shard = shard
+
+
+@contextmanager
+def shard_scope(shard):
+    """Tạm chọn `shard` trong khối with (ví dụ khi đọc lần lượt mọi shard), sau đó trả lại lựa chọn cũ."""
+    previous = g.get('db_shard', _UNSET)
+    g.db_shard = shard
+    try:
+        yield
+    finally:
+        if previous is _UNSET:
+            g.pop('db_shard', None)
+        else:
+            g.db_shard = previous
+
+
+class IdAllocator:
+    """Cấp id cho các bảng ID_TABLES, duy nhất trên primary và mọi shard.
+
+    Mỗi tiến trình lấy một khối `block_size` id liên tiếp từ bảng id_block (một câu
+    UPDATE trong giao dịch riêng ở primary) rồi cấp dần trong bộ nhớ; id bỏ dở khi
+    tiến trình dừng chỉ để lại khoảng trống. Lần đầu một bảng được cấp, id bắt đầu
+    sau id lớn nhất của bảng đó trên mọi CSDL.
+    """
+
+    def __init__(self, block_size=100):
+        self.block_size = block_size
+        self._blocks = {}  # tên bảng -> (id kế tiếp, id cuối khối + 1)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def allocate(self, table_name, count):
+        ids = []
+        with self._lock:
+            if self._pid != os.getpid():
+                # Khối lấy trước khi gunicorn fork không được dùng chung giữa các worker
+                self._blocks, self._pid = {}, os.getpid()
+            while len(ids) < count:
+                start, end = self._blocks.get(table_name, (0, 0))
+                if start >= end:
+                    size = max(self.block_size, count - len(ids))
+                    start = _reserve_block(table_name, size)
+                    end = start + size
+                take = min(end - start, count - len(ids))
+                ids.extend(range(start, start + take))
+                self._blocks[table_name] = (start + take, end)
+        return ids
+
+
+def _reserve_block(table_name, size):
+    """Giữ `size` id kế tiếp của bảng trong id_block và commit; trả về id đầu khối."""
+    block = IdBlock.__table__
+    row = block.c.table_name == table_name
+    while True:
+        with db.engine.begin() as conn:
+            if conn.execute(update(block).where(row).values(next_id=block.c.next_id + size)).rowcount:
+                return conn.scalar(select(block.c.next_id).where(row)) - size
+        table = db.metadata.tables[table_name]
+        start = 1
+        for shard in tenant_shards():
+            with db.engines[shard].connect() as conn:
+                start = max(start, (conn.scalar(select(func.max(table.c.id))) or 0) + 1)
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(block).values(table_name=table_name, next_id=start))
+        except IntegrityError:
+            pass  # Tiến trình khác vừa tạo dòng của bảng này
+
+
+def allocate_ids(session, model, count):
+    """`count` id mới cho bảng của `model`, hoặc [None] * count khi id tự tăng là đủ
+    (chưa có shard, hoặc session gắn thẳng một engine như CSDL nháp của stress-booking)."""
+    if session.bind is not None or not sharding_enabled():
+        return [None] * count
+    return current_app.extensions['id_allocator'].allocate(model.__table__.name, count)
+
+
+def assign_ids(session, model, rows):
+    """Điền id cho các dict tham số INSERT `rows` (nếu cần, xem allocate_ids); trả về `rows`."""
+    for row, row_id in zip(rows, allocate_ids(session, model, len(rows))):
+        if row_id is not None:
+            row['id'] = row_id
+    return rows
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _assign_flush_ids(session, flush_context, instances):
+    """Cấp id cho các đối tượng mới (session.add) của ID_TABLES chưa có id."""
+    pending = {}
+    for obj in session.new:
+        table_name = getattr(obj, '__tablename__', None)
+        if table_name in ID_TABLES and obj.id is None:
+            pending.setdefault(type(obj), []).append(obj)
+    for model, objs in pending.items():
+        for obj, obj_id in zip(objs, allocate_ids(session, model, len(objs))):
+            obj.id = obj_id
+
+
+def use_owner_shard(owner_id):
+    use_shard(current_app.extensions['shard_directory'].owner_shard(owner_id) if sharding_enabled() else None)
+
+
+def use_venue_shard(venue_id):
+    use_shard(current_app.extensions['shard_directory'].venue_shard(venue_id) if sharding_enabled() else None)
+
+
+def owner_venue_ids(session, owner_id):
+    """Id các nhà hàng của chủ (bảng venue ở primary nên không JOIN được với bảng trên shard)."""
+    return session.scalars(select(Venue.id).where(Venue.user_id == owner_id).order_by(Venue.id)).all()
+
+
+def init_sharding(app):
+    """Chọn shard cho mỗi request; dữ liệu của chủ nhà hàng đang được chuyển thì trả 503."""
+    app.extensions['shard_directory'] = ShardDirectory(ttl=app.config['SHARD_DIRECTORY_TTL'])
+    app.extensions['id_allocator'] = IdAllocator(block_size=app.config['SHARD_ID_BLOCK_SIZE'])
+
+    @app.before_request
+    def select_shard():
+        if not sharding_enabled():
+            return
+        venue_id = (request.view_args or {}).get('venue_id')
+        if venue_id is not None:
+            use_venue_shard(venue_id)
+        elif current_user.is_authenticated and current_user.is_owner:
+            use_owner_shard(current_user.id)
+
+    @app.errorhandler(ShardUnavailable)
+    def shard_unavailable(error):
+        return str(error), 503, {'Retry-After': str(app.config['SHARD_DIRECTORY_TTL'])}
+
+
+def shard_metadata():
+    """Các bảng SHARDED_TABLES để tạo trên shard, bỏ khóa ngoại tới bảng dùng chung (nằm ở primary)."""
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        if table.name not in SHARDED_TABLES:
+            continue
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split('.')[0] not in SHARDED_TABLES:
+                copy.constraints.discard(constraint)
+                for element in constraint.elements:
+                    copy.foreign_keys.discard(element)
+                    element.parent.foreign_keys.discard(element)
+    return metadata
+
+
+def create_shard_schemas():
+    """Tạo các bảng còn thiếu trên mọi shard (primary do db.create_all / migration lo)."""
+    metadata = shard_metadata()
+    for shard in shard_keys(db.engines):
+        metadata.create_all(db.engines[shard])
+
+
+def _tenant_rows(table, venue_ids):
+    """Điều kiện chọn các dòng của các nhà hàng `venue_ids` trong một bảng trên shard."""
+    if 'venue_id' in table.c:
+        return table.c.venue_id.in_(venue_ids)
+    column, parent = _MOVE_PLAN[table.name]
+    parent = db.metadata.tables[parent]
+    return table.c[column].in_(select(parent.c.id).where(parent.c.venue_id.in_(venue_ids)))
+
+
+def copy_tenant(source, target, venue_ids, batch_size=1000):
+    """Chép nguyên (giữ id) dữ liệu các nhà hàng `venue_ids` từ engine `source` sang `target`
+    trong một giao dịch; trả về {tên bảng: số dòng đã chép}.
+
+    Id do IdAllocator cấp không trùng giữa các CSDL; nếu vẫn trùng (dòng chèn bởi tiến
+    trình chạy thiếu DATABASE_SHARD_URLS), INSERT lỗi khóa chính và không gì được ghi.
+    """
+    tables = [db.metadata.tables[name] for name in _MOVE_PLAN]
+    counts = {}
+    with source.connect() as src, target.begin() as dst:
+        for table in tables:
+            if dst.scalar(select(func.count()).select_from(table).where(_tenant_rows(table, venue_ids))):
+                raise ValueError(f"Shard đích đã có dữ liệu của các nhà hàng này (bảng {table.name}).")
+        for table in tables:
+            counts[table.name] = 0
+            rows = src.execute(select(table).where(_tenant_rows(table, venue_ids))
+                               .order_by(*table.primary_key.columns).execution_options(yield_per=batch_size))
+            for batch in rows.partitions():
+                dst.execute(insert(table), [dict(row._mapping) for row in batch])
+                counts[table.name] += len(batch)
+    return counts
+
+
+def delete_tenant(engine, venue_ids):
+    """Xóa dữ liệu các nhà hàng `venue_ids` khỏi một shard (bảng con trước) trong một giao dịch."""
+    with engine.begin() as conn:
+        for name in reversed(_MOVE_PLAN):
+            table = db.metadata.tables[name]
+            conn.execute(delete(table).where(_tenant_rows(table, venue_ids)))
+
+
+def set_owner_shard(session, owner_id, shard):
+    """Ghi shard của chủ nhà hàng (None: primary) vào tenant_shard và commit."""
+    row = session.get(TenantShard, owner_id)
+    if shard is None:
+        if row is not None:
+            session.delete(row)
+    elif row is None:
+        session.add(TenantShard(owner_id=owner_id, shard=shard))
+    else:
+        row.shard = shard
+        row.updated_at = datetime.utcnow()
+    session.commit()
+
+
+def _pending_job_venues(session, shard):
+    """Các nhà hàng còn việc nền chưa chạy xong trong hàng đợi của `shard` (việc không được chép theo)."""
+    with shard_scope(shard):
+        payloads = session.scalars(select(Job.payload).where(Job.status.in_(('queued', 'running')))).all()
+        session.commit()
+    return {json.loads(payload).get('venue_id') for payload in payloads}
+
+
+def move_tenant(owner_id, target, wait=0, batch_size=1000):
+    """Chuyển dữ liệu các nhà hàng của chủ `owner_id` sang shard `target` (None: primary).
+
+    tenant_shard của chủ được đặt MOVING trước, nên request tới các nhà hàng của chủ
+    nhận 503 trong lúc chuyển; chờ `wait` giây để mọi worker hết cache thư mục cũ
+    rồi mới chép. Lỗi giữa chừng thì bỏ bản chép và trả chủ về shard cũ.
+    Trả về {tên bảng: số dòng đã chuyển}.
+    """
+    session = db.session
+    if target is not None and target not in shard_keys(db.engines):
+        raise ValueError(f"Không có shard {target!r} (xem DATABASE_SHARD_URLS).")
+    source = session.scalar(select(TenantShard.shard).where(TenantShard.owner_id == owner_id))
+    if source == MOVING:
+        raise ValueError("Chủ nhà hàng đang được chuyển shard. Nếu lần chuyển trước bị dừng giữa chừng, "
+                         "sửa dòng tenant_shard của chủ về shard cũ (dữ liệu vẫn ở đó) rồi chạy lại.")
+    if source == target:
+        raise ValueError("Dữ liệu của chủ nhà hàng đã ở shard này.")
+    venue_ids = owner_venue_ids(session, owner_id)
+    pending = "Còn việc nền chưa chạy của các nhà hàng này; chạy `python worker.py --once` rồi thử lại."
+    if _pending_job_venues(session, source) & set(venue_ids):
+        raise ValueError(pending)
+
+    set_owner_shard(session, owner_id, MOVING)
+    try:
+        time.sleep(wait)
+        # Đơn đặt trong lúc chờ worker hết cache thư mục vẫn có thể xếp việc mới
+        if _pending_job_venues(session, source) & set(venue_ids):
+            raise ValueError(pending)
+        counts = copy_tenant(db.engines[source], db.engines[target], venue_ids, batch_size)
+    except BaseException:
+        session.rollback()
+        set_owner_shard(session, owner_id, source)
+        raise
+    set_owner_shard(session, owner_id, target)
+    delete_tenant(db.engines[source], venue_ids)
+    current_app.extensions['shard_directory'].clear()
+    return counts
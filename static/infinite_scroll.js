@@ -0,0 +1,47 @@
+// Cuộn vô hạn: khi phần tử .load-more hiện ra, tải trang kế tiếp (?partial=1 chỉ trả phần danh sách)
+// và chèn vào đúng chỗ của nó. Không có JavaScript thì .load-more vẫn là liên kết sang trang kế tiếp.
+(function () {
+    function load(sentinel) {
+        if (sentinel.dataset.loading) return;
+        sentinel.dataset.loading = '1';
+        var href = sentinel.querySelector('a').href;
+        fetch(href + (href.indexOf('?') < 0 ? '?' : '&') + 'partial=1', {credentials: 'same-origin'})
+            .then(function (r) {
+                if (!r.ok) throw new Error(r.status);
+                return r.text();
+            })
+            .then(function (html) {
+                var parent = sentinel.parentNode;
+                var marker = sentinel.previousSibling;
+                sentinel.insertAdjacentHTML('beforebegin', html);
+                sentinel.remove();
+                // Theo dõi các .load-more mới (trang sau của danh sách, hoặc của từng nhà hàng)
+                var node = marker ? marker.nextSibling : parent.firstChild;
+                for (; node; node = node.nextSibling) {
+                    if (node.nodeType !== 1) continue;
+                    if (node.classList.contains('load-more')) watch(node);
+                    node.querySelectorAll('.load-more').forEach(watch);
+                }
+            })
+            .catch(function () { delete sentinel.dataset.loading; });
+    }
+
+    var observer = window.IntersectionObserver && new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                load(entry.target);
+            }
+        });
+    }, {rootMargin: '200px'});
+
+    function watch(sentinel) {
+        if (observer) observer.observe(sentinel);
+        sentinel.querySelector('a').addEventListener('click', function (e) {
+            e.preventDefault();
+            load(sentinel);
+        });
+    }
+
+    document.querySelectorAll('.load-more').forEach(watch);
+})();
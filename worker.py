@@ -0,0 +1,76 @@
+# worker.py
+"""Tiến trình chạy việc nền của jobs.py (dòng `worker` trong Procfile).
+
+    python worker.py           # chạy liên tục, hỏi việc mới mỗi JOBS_POLL_INTERVAL giây
+    python worker.py --once    # chạy hết các việc đến hạn rồi thoát (cron, kiểm tra thủ công)
+
+Có thể chạy nhiều worker cùng lúc; SIGTERM/SIGINT dừng sau việc đang chạy.
+Mỗi CSDL (primary và từng shard, xem sharding.py) có hàng đợi riêng; worker lần
+lượt chạy việc của từng CSDL.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app import app
+from database import db
+from jobs import drain, job_counts, purge_finished
+from sharding import shard_scope, tenant_shards
+
+logger = logging.getLogger('worker')
+
+PURGE_INTERVAL = 3600  # Giây giữa hai lần xóa việc đã xong
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='Chạy hết việc đến hạn rồi thoát.')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    config = app.config
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    with app.app_context():
+        for shard in tenant_shards():
+            with shard_scope(shard):
+                logger.info("Worker %s bắt đầu; hàng đợi %s: %s", worker_id, shard or 'primary',
+                            job_counts(db.session))
+        last_purge = 0.0
+        while not stopping.is_set():
+            done = failed = 0
+            for shard in tenant_shards():
+                with shard_scope(shard):
+                    shard_done, shard_failed = drain(db.session, worker_id, batch_size=config['JOBS_BATCH_SIZE'],
+                                                     lock_timeout=config['JOBS_LOCK_TIMEOUT'],
+                                                     retry_delay=config['JOBS_RETRY_DELAY'], stop=stopping.is_set)
+                done, failed = done + shard_done, failed + shard_failed
+            if done or failed:
+                logger.info("Đã chạy %d việc, %d việc lỗi", done, failed)
+            if time.monotonic() - last_purge > PURGE_INTERVAL:
+                purged = 0
+                for shard in tenant_shards():
+                    with shard_scope(shard):
+                        purged += purge_finished(db.session,
+                                                 datetime.utcnow() - timedelta(days=config['JOBS_KEEP_DAYS']))
+                if purged:
+                    logger.info("Đã xóa %d việc đã xong", purged)
+                last_purge = time.monotonic()
+            if args.once:
+                break
+            if not done and not failed:
+                stopping.wait(config['JOBS_POLL_INTERVAL'])
+        db.session.remove()
+    logger.info("Worker %s dừng", worker_id)
+
+
+if __name__ == '__main__':
+    main()